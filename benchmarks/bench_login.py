@@ -0,0 +1,109 @@
+"""
+登入 API 基準測試 (需要先啟動 API 服務)
+
+    python -m benchmarks.bench_login [--base-url http://localhost:5000] [--concurrency 32] [--duration 20]
+
+1. 建立 (或沿用) 一個測試帳號
+2. 以 concurrency 個併發連線在 duration 秒內不斷呼叫 POST /api/auth/login
+3. 回報每秒成功登入數、換算成每個 CPU 核心的登入數、延遲 p50/p95/p99 與 503 (bcrypt 佇列已滿) 次數
+另外在本機量測單一執行緒每秒可做幾次 bcrypt 驗證，作為「每核心理論上限」的參考值。
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import bcrypt
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def bcrypt_checks_per_sec(rounds, seconds=2.0):
+    hashed = bcrypt.hashpw(b'benchmark-password', bcrypt.gensalt(rounds))
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        bcrypt.checkpw(b'benchmark-password', hashed)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def run_load(base_url, username, password, concurrency, duration):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        local_latencies, local_statuses = [], {}
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = session.post(f"{base_url}/api/auth/login",
+                                      json={'username': username, 'password': password}, timeout=30).status_code
+            except requests.RequestException:
+                status = 'error'
+            elapsed = time.perf_counter() - started
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status == 200:
+                local_latencies.append(elapsed)
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--cores', type=int, default=os.cpu_count() or 1,
+                        help='伺服器可用的 CPU 核心數 (預設為本機核心數)')
+    parser.add_argument('--rounds', type=int, default=int(os.getenv('BCRYPT_LOG_ROUNDS', 12)),
+                        help='伺服器的 BCRYPT_LOG_ROUNDS，用來量測每核心理論上限')
+    parser.add_argument('--username', default='bench_login_user')
+    parser.add_argument('--password', default='bench-login-password')
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url.rstrip('/')
+    response = requests.post(f"{base_url}/api/auth/register", json={
+        'username': args.username, 'email': f"{args.username}@bench.invalid", 'password': args.password})
+    if response.status_code not in (201, 409):
+        print(f"無法建立測試帳號: {response.status_code} {response.text}")
+        return 1
+
+    ceiling = bcrypt_checks_per_sec(args.rounds)
+    print(f"bcrypt (rounds={args.rounds}) 單執行緒: {ceiling:.1f} 次/秒 (每核心理論上限)")
+
+    latencies, statuses, elapsed = run_load(base_url, args.username, args.password, args.concurrency, args.duration)
+    ok = statuses.get(200, 0)
+    rate = ok / elapsed
+    print(f"併發 {args.concurrency}，{elapsed:.1f}s，回應狀態: {dict(sorted(statuses.items(), key=str))}")
+    print(f"成功登入: {rate:.1f} 次/秒，每核心 {rate / args.cores:.1f} 次/秒 ({args.cores} 核心)")
+    if latencies:
+        print(f"延遲 (成功): p50 {percentile(latencies, 50) * 1000:.0f}ms  "
+              f"p95 {percentile(latencies, 95) * 1000:.0f}ms  p99 {percentile(latencies, 99) * 1000:.0f}ms  "
+              f"平均 {statistics.mean(latencies) * 1000:.0f}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+"""
+東華 OPAC 結果頁解析器基準測試
+
+    python -m benchmarks.bench_parser [--rounds 200]
+
+以 benchmarks/fixtures/ndhu/ 內存下來的結果頁為輸入：
+1. 先確認 parse_results (BeautifulSoup 完整樹) 與 parse_results_fast 輸出完全相同
+2. 再分別量測每秒可解析頁數 (pages/sec) 與 tracemalloc 記錄的記憶體峰值
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from project.services.ndhu_parser import parse_results, parse_results_fast
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures' / 'ndhu'
+PARSERS = [('full (bs4 html.parser)', parse_results), ('fast (lxml pull)', parse_results_fast)]
+
+
+def load_pages():
+    return [(path.name, path.read_text(encoding='utf-8')) for path in sorted(FIXTURE_DIR.glob('*.html'))]
+
+
+def check_same_output(pages):
+    ok = True
+    for name, html in pages:
+        expected = parse_results(html, 1)
+        actual = parse_results_fast(html, 1)
+        if expected != actual:
+            ok = False
+            print(f"[不一致] {name}: full={len(expected)} 筆, fast={len(actual)} 筆")
+    return ok
+
+
+def measure(parse, pages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, html in pages:
+            parse(html, 1)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _, html in pages:
+        parse(html, 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rounds * len(pages) / elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    pages = load_pages()
+    if not pages:
+        print(f"找不到測試頁面: {FIXTURE_DIR}")
+        return 1
+    if not check_same_output(pages):
+        return 1
+    print(f"{len(pages)} 個 fixture 頁面，兩種解析器輸出一致\n")
+
+    print(f"{'parser':<24}{'pages/sec':>12}{'peak KiB':>12}")
+    for name, parse in PARSERS:
+        pages_per_sec, peak = measure(parse, pages, args.rounds)
+        print(f"{name:<24}{pages_per_sec:>12.1f}{peak / 1024:>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+API 負載測試情境 (需要先啟動 API、N8N 替身、OPAC 替身並匯入種子資料，見 README)
+
+    python -m benchmarks.load [--base-url http://localhost:5000] [--concurrency 16] [--duration 15]
+                              [--scenario login --scenario my_loans ...] [--output results.json] [--compare baseline.json]
+
+每個情境以固定併發數持續 duration 秒，情境之間依序執行；mixed 情境會依權重隨機混合所有端點。
+輸出每個端點的 RPS、p50/p95/p99、錯誤數，並把結果寫成 JSON (預設 benchmarks/results/)，
+指定 --compare 時會列出與上次結果的差異。
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+PASSWORD = 'bench-password'
+QUERIES = ['Python', 'C語言', '資料結構', '演算法', '機器學習', '資料庫', '作業系統', '統計學']
+
+
+class Client:
+    """一個模擬使用者：自己的 keep-alive 連線與 JWT"""
+
+    def __init__(self, base_url, username, token):
+        self.base_url = base_url
+        self.username = username
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def call(self, method, path, **kwargs):
+        return self.session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+
+
+def login(client):
+    # 登入不帶 JWT，另外開一個請求
+    return 'POST /api/auth/login', requests.post(f"{client.base_url}/api/auth/login", timeout=60,
+                                                json={'username': client.username, 'password': PASSWORD})
+
+
+def create_loan(client):
+    return 'POST /api/loans/', client.call('POST', '/api/loans/', json={
+        'book_title': f"{random.choice(QUERIES)} 基準測試借閱", 'book_isbn': '9789860000009'})
+
+
+def my_loans(client):
+    return 'GET /api/loans/my', client.call('GET', '/api/loans/my', params={'limit': 20})
+
+
+def search_basic(client):
+    return 'POST /api/search/basic', client.call('POST', '/api/search/basic', json={'query': random.choice(QUERIES)})
+
+
+def search_advanced(client):
+    return 'POST /api/search/advanced', client.call('POST', '/api/search/advanced', json={'query': random.choice(QUERIES)})
+
+
+def recommend(client):
+    return 'POST /api/recommend/', client.call('POST', '/api/recommend/')
+
+
+def scrape(client):
+    return 'GET /api/scraper/scrape', client.call('GET', '/api/scraper/scrape', params={'q': random.choice(QUERIES), 'pages': 3})
+
+
+SCENARIOS = {
+    'login': login,
+    'create_loan': create_loan,
+    'my_loans': my_loans,
+    'search_basic': search_basic,
+    'search_advanced': search_advanced,
+    'recommend': recommend,
+    'scrape': scrape,
+}
+# mixed 情境的權重：大致模擬一般使用時的流量比例
+MIX_WEIGHTS = {'login': 1, 'create_loan': 2, 'my_loans': 6, 'search_basic': 8, 'search_advanced': 3,
+               'recommend': 2, 'scrape': 1}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples, elapsed):
+    """samples: {endpoint: [(latency 秒, status), ...]}"""
+    summary = {}
+    for endpoint, results in sorted(samples.items()):
+        latencies = [latency for latency, _ in results]
+        statuses = {}
+        for _, status in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+        summary[endpoint] = {
+            'requests': len(results),
+            'rps': round(len(results) / elapsed, 2),
+            'errors': errors,
+            'statuses': statuses,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        }
+    return summary
+
+
+def run_scenario(clients, actions, concurrency, duration):
+    samples = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        client = clients[index % len(clients)]
+        local = {}
+        while time.perf_counter() < deadline:
+            action = random.choice(actions)
+            started = time.perf_counter()
+            try:
+                endpoint, response = action(client)
+                status = response.status_code
+            except requests.RequestException as e:
+                endpoint, status = action.__name__, type(e).__name__
+            local.setdefault(endpoint, []).append((time.perf_counter() - started, status))
+        with lock:
+            for endpoint, results in local.items():
+                samples.setdefault(endpoint, []).extend(results)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+def login_clients(base_url, count):
+    clients = []
+    for i in range(count):
+        username = f"bench_user_{i}"
+        response = requests.post(f"{base_url}/api/auth/login", json={'username': username, 'password': PASSWORD}, timeout=60)
+        if response.status_code != 200:
+            raise SystemExit(f"{username} 無法登入 ({response.status_code})，請先執行 python -m benchmarks.seed")
+        clients.append(Client(base_url, username, response.json()['access_token']))
+    return clients
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(name, summary, baseline=None):
+    print(f"\n== {name} ==")
+    print(f"{'endpoint':<28}{'req':>7}{'rps':>9}{'err':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for endpoint, row in summary.items():
+        line = (f"{endpoint:<28}{row['requests']:>7}{row['rps']:>9.1f}{row['errors']:>6}"
+                f"{row['p50_ms']:>8.0f}ms{row['p95_ms']:>7.0f}ms{row['p99_ms']:>7.0f}ms")
+        old = (baseline or {}).get(endpoint)
+        if old:
+            rps_delta = (row['rps'] - old['rps']) / old['rps'] * 100 if old['rps'] else 0.0
+            p95_delta = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+            line += f"   (rps {rps_delta:+.0f}%, p95 {p95_delta:+.0f}%)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15, help='每個情境持續秒數')
+    parser.add_argument('--users', type=int, default=50, help='預先登入的種子使用者數 (最多 seed 的 --users)')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS) + ['mixed'],
+                        help='要執行的情境，可重複指定；預設全部單獨執行一次再跑 mixed')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='結果 JSON 路徑 (預設 benchmarks/results/run-<時間>.json)')
+    parser.add_argument('--compare', help='上一次的結果 JSON，用來列出差異')
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    base_url = args.base_url.rstrip('/')
+    scenarios = args.scenario or sorted(SCENARIOS) + ['mixed']
+    baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))['scenarios'] if args.compare else {}
+    clients = login_clients(base_url, args.users)
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'base_url': base_url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'cpu_count': os.cpu_count(),
+        'scenarios': {},
+    }
+    for name in scenarios:
+        if name == 'mixed':
+            actions = [SCENARIOS[key] for key, weight in MIX_WEIGHTS.items() for _ in range(weight)]
+        else:
+            actions = [SCENARIOS[name]]
+        summary = run_scenario(clients, actions, args.concurrency, args.duration)
+        results['scenarios'][name] = summary
+        print_table(name, summary, baseline.get(name))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"run-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\n結果已寫入 {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
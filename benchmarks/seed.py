@@ -0,0 +1,102 @@
+"""
+基準測試用的 Postgres 種子資料產生器
+
+    APP_ENV=development python -m benchmarks.seed [--users 200] [--loans-per-user 50] [--books 5000] [--seed 42]
+
+依目前的資料庫設定 (POSTGRES_* / DB_HOST) 寫入：
+- 使用者 bench_user_0 ... bench_user_{N-1}，密碼都是 bench-password (已存在的帳號會沿用)
+- 每位使用者 loans-per-user 筆借閱紀錄，書名依熱門度 (Zipf 分佈) 從書名池抽出
+- books 本館藏目錄書目 (同一個書名池)，讓 /search/basic 的本地檢索有資料
+同一個 --seed 每次產生相同的資料，不同次執行的結果才能互相比較。
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from project import create_app
+from project.extensions import bcrypt, db
+from project.models import User
+from project.services.catalog import upsert_books
+from project.services.loan_import import import_loans
+
+PASSWORD = 'bench-password'
+SUBJECTS = ['Python', 'C語言', '資料結構', '演算法', '機器學習', '深度學習', '資料庫', '作業系統',
+            '計算機網路', '線性代數', '統計學', '經濟學', '台灣史', '花蓮', '日本文學', '心理學']
+FORMS = ['入門', '實戰', '程式設計', '原理與實作', '教科書', '導論', '從零開始', '精要']
+
+
+def isbn13(body12):
+    """補上 ISBN-13 檢查碼"""
+    total = sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(body12))
+    return body12 + str((10 - total % 10) % 10)
+
+
+def title_pool(rng, size):
+    return [f"{rng.choice(SUBJECTS)}{rng.choice(FORMS)} 第{i % 7 + 1}版 #{i}" for i in range(size)]
+
+
+def seed_users(count):
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    rows = [{'username': f"bench_user_{i}", 'email': f"bench_user_{i}@bench.invalid",
+             'password_hash': password_hash} for i in range(count)]
+    db.session.execute(insert(User).values(rows).on_conflict_do_nothing())
+    db.session.commit()
+    return db.session.execute(
+        select(User.id).where(User.username.in_([row['username'] for row in rows])).order_by(User.id)
+    ).scalars().all()
+
+
+def loan_records(rng, user_ids, loans_per_user, titles):
+    # Zipf 分佈：少數熱門書被大量借閱
+    weights = [1 / (rank + 1) for rank in range(len(titles))]
+    start = datetime(2018, 1, 1)
+    line_no = 0
+    for user_id in user_ids:
+        picks = rng.choices(range(len(titles)), weights=weights, k=loans_per_user)
+        for index in picks:
+            line_no += 1
+            loan_date = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 7))
+            returned = loan_date + timedelta(days=rng.randint(1, 60)) if rng.random() < 0.9 else None
+            yield line_no, (user_id, titles[index], isbn13(f"978986{index:06d}"),
+                            loan_date.isoformat(), returned.isoformat() if returned else None)
+
+
+def seed_books(titles, count):
+    rows = [{'isbn': isbn13(f"978986{i:06d}"), 'name': titles[i], 'author': f"作者 {i % 97}",
+             'cover_image_url': None,
+             'holdings': [('總圖書館', 2, i % 3), ('花蓮縣文化局圖書館', 1, i % 2)]}
+            for i in range(min(count, len(titles)))]
+    written = 0
+    for offset in range(0, len(rows), 1000):
+        written += upsert_books(rows[offset:offset + 1000])
+        db.session.commit()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--loans-per-user', type=int, default=50)
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    titles = title_pool(rng, max(args.books, 1000))
+    app = create_app()
+    with app.app_context():
+        started = time.monotonic()
+        user_ids = seed_users(args.users)
+        print(f"使用者: {len(user_ids)} 位 (密碼 {PASSWORD})")
+        print(f"書目: {seed_books(titles, args.books)} 本")
+        report = import_loans(loan_records(rng, user_ids, args.loans_per_user, titles))
+        print(f"借閱紀錄: {report['imported']} 筆 (拒絕 {report['rejected']} 筆)")
+        print(f"完成 ({time.monotonic() - started:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
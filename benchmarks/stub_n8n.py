@@ -0,0 +1,94 @@
+"""
+本機的 N8N 替身 (給基準測試用)
+
+    python -m benchmarks.stub_n8n [--port 8766] [--latency 0.3] [--jitter 0.1] [--error-rate 0.0]
+
+任何路徑的 POST 都會在 latency ± jitter 秒後回應：
+- 路徑含 recommend：回傳依借閱書名產生的推薦清單
+- 其他路徑 (搜尋)：回傳依查詢字串產生的書籍清單
+error-rate 的比例會回 500，用來觀察重試、斷路器與錯誤率。
+GET /stats 回傳目前為止收到的請求數。
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_books(seed_text, count=10):
+    digest = hashlib.sha256(seed_text.encode('utf-8')).hexdigest()
+    return [{'title': f"{seed_text} 相關書籍 {i + 1}", 'author': f"作者 {digest[i:i + 4]}",
+             'isbn': f"978986{int(digest[i:i + 7], 16) % 10 ** 7:07d}"} for i in range(count)]
+
+
+class StubN8N(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, jitter, error_rate):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.counts = {'requests': 0, 'errors': 0}
+        self.lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with self.server.lock:
+            self._send(200, dict(self.server.counts))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            payload = {}
+        server = self.server
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        failed = random.random() < server.error_rate
+        with server.lock:
+            server.counts['requests'] += 1
+            server.counts['errors'] += failed
+        if failed:
+            self._send(500, {'error': 'stub failure'})
+        elif 'recommend' in self.path:
+            history = payload.get('loan_history') or []
+            self._send(200, {'user_id': payload.get('user_id'),
+                             'recommendations': fake_books(' '.join(history[:3]) or 'empty', 5)})
+        else:
+            self._send(200, {'query': payload.get('query'), 'results': fake_books(str(payload.get('query')))})
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.3, help='平均回應時間 (秒)')
+    parser.add_argument('--jitter', type=float, default=0.1, help='回應時間的隨機變動範圍 (秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回 500 的比例 (0~1)')
+    args = parser.parse_args(argv)
+
+    server = StubN8N((args.host, args.port), args.latency, args.jitter, args.error_rate)
+    print(f"N8N 替身: http://{args.host}:{args.port} (latency {args.latency}s ± {args.jitter}s, error rate {args.error_rate})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+本機的東華 OPAC 替身 (給基準測試用)
+
+    python -m benchmarks.stub_opac [--port 8765] [--latency 0.2] [--no-validators]
+
+GET /toread/opac/search?...&start=N 回傳 benchmarks/fixtures/ndhu/search_start_N.html
+(依 OPAC 結果頁的 HTML 結構重建的測試頁，不是實際錄下的回應)；沒有對應檔案的 start 回傳空結果頁，
+爬蟲會在那裡停止。
+回應帶 ETag，收到相符的 If-None-Match 時回 304；--no-validators 時不帶 ETag，
+並在每次回應加上不同的時間戳記註解，模擬沒有驗證資訊、每次內容都略有不同的 OPAC。
+API 以 NDHU_OPAC_BASE_URL=http://127.0.0.1:8765 指向這個替身。
+"""
+import argparse
+import hashlib
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures' / 'ndhu'
+EMPTY_PAGE = '<html><body><div id="results"></div></body></html>'
+
+
+class StubOPAC(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, validators=True):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.validators = validators
+        self.pages = {int(path.stem.rsplit('_', 1)[1]): path.read_bytes()
+                      for path in FIXTURE_DIR.glob('search_start_*.html')}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/toread/opac/search':
+            self.send_error(404)
+            return
+        try:
+            start = int(urllib.parse.parse_qs(url.query).get('start', ['0'])[0])
+        except ValueError:
+            start = 0
+        time.sleep(self.server.latency)
+        body = self.server.pages.get(start, EMPTY_PAGE.encode('utf-8'))
+        if self.server.validators:
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        else:
+            etag = None
+            body += f'<!-- generated {time.time()} -->'.encode('utf-8')
+        self.send_response(200)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='每頁回應時間 (秒)')
+    parser.add_argument('--no-validators', action='store_true', help='不送 ETag、每次回應內容都略有不同')
+    args = parser.parse_args(argv)
+
+    server = StubOPAC((args.host, args.port), args.latency, validators=not args.no_validators)
+    print(f"OPAC 替身: http://{args.host}:{args.port} ({len(server.pages)} 個結果頁，latency {args.latency}s)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
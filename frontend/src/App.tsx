@@ -2418,6 +2418,7 @@ type AccountPageProps = {
   user: AuthUser | null;
   token: string | null;
   loans: Loan[];
+  hasMoreLoans: boolean;
   onLogin: (email: string, password: string) => Promise<void>;
   onRegister: (
     email: string,
@@ -2425,16 +2426,19 @@ type AccountPageProps = {
   ) => Promise<void>;
   onLogout: () => void;
   onRefreshLoans: () => Promise<void>;
+  onLoadMoreLoans: () => Promise<void>;
 };
 
 function AccountPage({
   user,
   token,
   loans,
+  hasMoreLoans,
   onLogin,
   onRegister,
   onLogout,
   onRefreshLoans,
+  onLoadMoreLoans,
 }: AccountPageProps) {
   const [email, setEmail] = useState("");
   const [pass, setPass] = useState("");
@@ -2689,6 +2693,15 @@ function AccountPage({
                 ))}
               </div>
             )}
+
+            {hasMoreLoans && (
+              <button
+                className="w-full px-3 py-2 rounded-xl border border-gray-300 text-xs hover:bg-gray-50"
+                onClick={onLoadMoreLoans}
+              >
+                載入更多借閱紀錄
+              </button>
+            )}
           </div>
         )}
 
@@ -2735,6 +2748,7 @@ function AccountPage({
 // ------------------------------
 export default function App() {
   const [loans, setLoans] = useState<Loan[]>([]);
+  const [loansNext, setLoansNext] = useState<string | null>(null);
   const [route, setRoute] = useState<{
     name: string;
     [k: string]: any;
@@ -2895,7 +2909,7 @@ export default function App() {
 	    id:`ndhu-scraped-${Date.now()}-${index}`,
 	    title:b.title,
 	    author:b.author,
-	    isbn:b.isbn !== "無ISBN"?b.isbn:"",
+	    isbn:b.isbn ?? "",
 	    year:new Date().getFullYear(),
 	    language:"繁體中文",
 	    format:"紙本",
@@ -2926,7 +2940,21 @@ export default function App() {
     try {
       if (!token) return;
       const data = await getMyLoans(token);
-      setLoans(Array.isArray(data) ? data : []);
+      // /loans/my 回傳 { items, next } 分頁格式，其餘頁面由「載入更多」依 next 取得
+      setLoans(Array.isArray(data?.items) ? data.items : []);
+      setLoansNext(data?.next ?? null);
+    } catch (err) {
+      console.error("載入借閱資料失敗", err);
+    }
+  };
+
+  const loadMoreLoans = async () => {
+    try {
+      if (!token || !loansNext) return;
+      const data = await getMyLoans(token, loansNext);
+      const items: Loan[] = Array.isArray(data?.items) ? data.items : [];
+      setLoans((prev) => [...prev, ...items]);
+      setLoansNext(data?.next ?? null);
     } catch (err) {
       console.error("載入借閱資料失敗", err);
     }
@@ -2962,6 +2990,7 @@ export default function App() {
     setUser(null);
     setToken(null);
     setLoans([]);
+    setLoansNext(null);
     goHome();
   };
 
@@ -3048,10 +3077,12 @@ export default function App() {
           user={user}
           token={token}
           loans={loans}
+          hasMoreLoans={loansNext !== null}
           onLogin={login}
           onRegister={register}
           onLogout={logout}
           onRefreshLoans={refreshLoans}
+          onLoadMoreLoans={loadMoreLoans}
         />
       )}
 
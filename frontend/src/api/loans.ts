@@ -1,7 +1,9 @@
 const API_BASE = "/api";
 
-export async function getMyLoans(token: string) {
-  const res = await fetch(`${API_BASE}/loans/me`, {
+// 游標分頁：回傳 { items, next }，next 不為 null 時帶入 cursor 取得下一頁
+export async function getMyLoans(token: string, cursor?: string | null) {
+  const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const res = await fetch(`${API_BASE}/loans/my${params}`, {
     method: "GET",
     headers: {
       "Content-Type": "application/json",
@@ -5,7 +5,8 @@ interface Book {
   title: string;
   author: string;
   image_url: string;
-  isbn: string;
+  isbn: string | null;  // 正規化的 ISBN-13，沒有時為 null
+  isbns?: string[];
   availability: string;
   source_page?: number;
 }
@@ -27,20 +28,41 @@ const LibraryScraper: React.FC = () => {
     setBooks([]);
 
     try {
-      // 呼叫你剛剛寫好的 Python 爬蟲 API (注意路徑是否正確)
-      const response = await fetch(`/api/scraper/scrape?q=${encodeURIComponent(keyword)}&pages=${pages}`);
-      const data = await response.json();
+      // 使用串流模式 (NDJSON)：每抓完一頁後端就先送過來，不必等全部頁面爬完
+      const response = await fetch(`/api/scraper/scrape?q=${encodeURIComponent(keyword)}&pages=${pages}&stream=1`);
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        setMessage(data.message || '後端回傳錯誤');
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let received = 0;
 
-      if (response.ok && data.status === 'success') {
-        if (data.data.length > 0) {
-          setBooks(data.data);
-          setMessage(`抓取成功！共找到 ${data.data.length} 本書 🎉`);
-        } else {
-          setMessage(data.message || '找不到相關書籍。');
+      // 逐行解析：page 紀錄直接加到畫面上，最後的 summary / error 更新提示訊息
+      const handleRecord = (record: any) => {
+        if (record.type === 'page') {
+          received += record.data.length;
+          setBooks((prev) => [...prev, ...record.data]);
+          setMessage(`已收到第 ${record.page} 頁，共 ${received} 本書，繼續抓取中...`);
+        } else if (record.type === 'summary') {
+          setMessage(record.count > 0 ? `抓取成功！共找到 ${record.count} 本書 🎉` : '找不到相關書籍。');
+        } else if (record.type === 'error') {
+          setMessage(record.message || '後端回傳錯誤');
         }
-      } else {
-        setMessage(data.message || '後端回傳錯誤');
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        lines.filter((line) => line.trim()).forEach((line) => handleRecord(JSON.parse(line)));
       }
+      if (buffer.trim()) handleRecord(JSON.parse(buffer));
     } catch (error) {
       console.error(error);
       setMessage('無法連線到後端 API，請確認 Docker 是否有啟動！');
@@ -113,7 +135,7 @@ const LibraryScraper: React.FC = () => {
             {/* 書籍資訊 */}
             <h4 style={{ margin: '0 0 10px 0', fontSize: '16px', color: '#333', lineHeight: '1.4' }}>{book.title}</h4>
             <p style={{ margin: '0 0 5px 0', fontSize: '14px', color: '#666' }}><strong>作者：</strong>{book.author}</p>
-            <p style={{ margin: '0 0 5px 0', fontSize: '12px', color: '#888' }}><strong>ISBN：</strong>{book.isbn}</p>
+            <p style={{ margin: '0 0 5px 0', fontSize: '12px', color: '#888' }}><strong>ISBN：</strong>{book.isbn ?? '—'}</p>
             
             <div style={{ marginTop: 'auto', paddingTop: '10px', borderTop: '1px dashed #eee' }}>
               <p style={{ margin: '0', fontSize: '13px', color: book.availability.includes('0 本館藏 可借閱') ? '#dc3545' : '#28a745', fontWeight: 'bold' }}>
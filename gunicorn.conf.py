@@ -0,0 +1,92 @@
+"""
+正式環境的 gunicorn 設定：
+
+    gunicorn -c gunicorn.conf.py run:app
+
+- worker 類型預設 gevent (協作式 I/O，等待 N8N / OPAC 時不佔住 worker)，也可改用 gthread
+- worker 數量依容器可用的 CPU 數計算
+- preload_app：master 先載入應用程式再 fork，worker 以 copy-on-write 共用記憶體
+- max_requests + jitter：worker 處理一定數量的請求後輪流優雅重啟，避免記憶體緩慢成長
+- keepalive 比 nginx upstream 的 keepalive_timeout 長，連線一律由 nginx 端關閉
+- 所有 worker 啟動後寫出就緒檔 (GUNICORN_READY_FILE)
+"""
+import os
+import shutil
+
+# 多個 worker 行程的 Prometheus 指標寫在共用目錄，/metrics 輸出時合併；
+# 必須在預載應用程式 (匯入 prometheus_client) 之前設定，並清掉上次執行留下的檔案
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus-multiproc')
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+
+if worker_class == 'gevent':
+    # preload_app 會在 master 內匯入應用程式，必須在匯入 requests / psycopg2 / project 之前 patch，
+    # 標準函式庫的 socket 等才會是協作式版本 (psycopg2 透過 psycogreen 在等待資料庫時讓出控制權)
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_cpus = _cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+if worker_class == 'gevent':
+    # 每個 worker 本身就能同時處理大量連線，一個 CPU 一個 worker 即可
+    workers = int(os.getenv('GUNICORN_WORKERS', _cpus))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+else:
+    workers = int(os.getenv('GUNICORN_WORKERS', _cpus * 2 + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+preload_app = True
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# nginx upstream keepalive_timeout 為 60 秒
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 75))
+# 心跳檔放在記憶體檔案系統，避免容器的 overlay 磁碟 I/O 卡住 worker
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '*')
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-')
+
+ready_file = os.getenv('GUNICORN_READY_FILE', '/tmp/gunicorn.ready')
+
+
+def on_starting(server):
+    if os.path.exists(ready_file):
+        os.remove(ready_file)
+
+
+def when_ready(server):
+    with open(ready_file, 'w') as f:
+        f.write(str(os.getpid()))
+    server.log.info("gunicorn 就緒：%s 個 %s worker，就緒檔 %s", workers, worker_class, ready_file)
+
+
+def post_fork(server, worker):
+    # master 預載時建立的連線池不能跨行程共用，每個 worker 改用自己的連線
+    from project.extensions import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if os.path.exists(ready_file):
+        os.remove(ready_file)
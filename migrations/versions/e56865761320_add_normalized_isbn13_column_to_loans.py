@@ -0,0 +1,97 @@
+"""Add normalized isbn13 column to loans and backfill it
+
+Revision ID: e56865761320
+Revises: 1ab7e12fc78d
+Create Date: 2026-10-18 19:57:23.400911
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e56865761320'
+down_revision = '1ab7e12fc78d'
+branch_labels = None
+depends_on = None
+
+# 回填用的 ISBN 正規化，規則與撰寫時的 project/services/isbn.py 相同
+# (migration 不引用應用程式程式碼，之後修改應用程式不會改變這個 migration 的結果)
+_GROUP = re.compile(r'[0-9Xx]+(?:-[0-9Xx]+)*')
+
+
+def _check13(body12):
+    return str((10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body12)) % 10) % 10)
+
+
+def _to_isbn13(digits):
+    if len(digits) == 13:
+        ok = digits.isdigit() and digits[:3] in ('978', '979') and digits[12] == _check13(digits[:12])
+        return digits if ok else None
+    if len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] == 'X'):
+        values = [int(d) for d in digits[:9]] + [10 if digits[9] == 'X' else int(digits[9])]
+        if sum((10 - i) * v for i, v in enumerate(values)) % 11 == 0:
+            return '978' + digits[:9] + _check13('978' + digits[:9])
+    return None
+
+
+def _normalize(raw):
+    text = unicodedata.normalize('NFKC', raw or '')
+    pending, pending_end = '', None
+    for match in _GROUP.finditer(text):
+        digits = match.group().replace('-', '').upper()
+        joined = pending + digits if pending and not text[pending_end:match.start()].strip() else ''
+        isbn = _to_isbn13(digits) or (_to_isbn13(joined) if joined else None)
+        if isbn:
+            return isbn
+        pending = joined if joined and len(joined) < 13 else digits
+        pending_end = match.end()
+    return None
+
+
+def _load_mapping(conn, table, column):
+    """把某欄所有不同的原始值對應到 ISBN-13，寫進暫存表 isbn_map(raw, isbn13)"""
+    conn.execute(sa.text("CREATE TEMP TABLE IF NOT EXISTS isbn_map (raw text PRIMARY KEY, isbn13 varchar(13)) ON COMMIT DROP"))
+    conn.execute(sa.text("TRUNCATE isbn_map"))
+    raws = conn.execute(sa.text(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL")).scalars().all()
+    mapping = [{'raw': raw, 'isbn13': _normalize(raw)} for raw in raws]
+    mapping = [row for row in mapping if row['isbn13']]
+    for offset in range(0, len(mapping), 5000):
+        conn.execute(sa.text("INSERT INTO isbn_map (raw, isbn13) VALUES (:raw, :isbn13)"), mapping[offset:offset + 5000])
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('book_isbn13', sa.String(length=13), nullable=True))
+
+    # ### end Alembic commands ###
+    conn = op.get_bind()
+
+    # 既有借閱紀錄：依不同的 book_isbn 原始值計算一次，再以一個 UPDATE ... FROM 回填 (先回填再建索引)
+    _load_mapping(conn, 'loans', 'book_isbn')
+    conn.execute(sa.text("UPDATE loans SET book_isbn13 = m.isbn13 FROM isbn_map m WHERE loans.book_isbn = m.raw"))
+    op.create_index(op.f('ix_loans_book_isbn13'), 'loans', ['book_isbn13'], unique=False)
+
+    # 館藏目錄：舊資料可能存了 ISBN-10，轉成 ISBN-13 (已經有同一本 ISBN-13 書目的保留原樣，由爬蟲更新)
+    _load_mapping(conn, 'books', 'isbn')
+    conn.execute(sa.text(
+        "UPDATE books SET isbn = m.isbn13 FROM isbn_map m "
+        "WHERE books.isbn = m.raw AND books.isbn <> m.isbn13 "
+        "AND NOT EXISTS (SELECT 1 FROM books other WHERE other.isbn = m.isbn13)"))
+
+    # 借閱統計的書籍鍵改成 ISBN-13，清空讓 flask analytics refresh 從頭重算
+    conn.execute(sa.text("DELETE FROM loan_daily_counts"))
+    conn.execute(sa.text("DELETE FROM analytics_watermarks WHERE name = 'loan_daily_counts'"))
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_loans_book_isbn13'))
+        batch_op.drop_column('book_isbn13')
+
+    # ### end Alembic commands ###
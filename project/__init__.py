@@ -1,8 +1,13 @@
 from flask import Flask
-from .config import Config
+from .config import get_config
 from .extensions import db, migrate,bcrypt, jwt
 from flask_restx import Api
 from .api import register_routes
+from .commands import register_commands
+from .services.query_stats import init_query_stats
+from .services.metrics import init_metrics
+from .services.compression import init_compression
+from .services.rate_limit import init_rate_limit
 from . import models
 
 authorizations = {
@@ -14,9 +19,11 @@ authorizations = {
     }
 }
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    # 沒有指定時依 APP_ENV 選擇 DevelopmentConfig / ProductionConfig
+    app.config.from_object(config_class or get_config())
+    init_query_stats(app)
     db.init_app(app)
     migrate.init_app(app,db)
     bcrypt.init_app(app)
@@ -32,4 +39,8 @@ def create_app(config_class=Config):
             prefix='/api'
     )
     register_routes(api)
+    init_metrics(app)
+    init_rate_limit(app)
+    init_compression(app)
+    register_commands(app)
     return app
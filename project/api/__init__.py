@@ -4,6 +4,10 @@ from .loans import loan_ns
 from .recommend import recommend_ns
 from .search import search_ns
 from .scraper import scraper_ns
+from .catalog import catalog_ns
+from .health import health_ns
+from .analytics import analytics_ns
+from .covers import covers_ns
 
 def register_routes(api: Api):
     api.add_namespace(auth_ns)
@@ -11,3 +15,7 @@ def register_routes(api: Api):
     api.add_namespace(recommend_ns)
     api.add_namespace(search_ns)
     api.add_namespace(scraper_ns)
+    api.add_namespace(catalog_ns)
+    api.add_namespace(health_ns)
+    api.add_namespace(analytics_ns)
+    api.add_namespace(covers_ns)
@@ -0,0 +1,68 @@
+from flask import request, current_app
+from flask_restx import Resource, Namespace, fields
+from ..services.analytics import book_key, get_analytics
+
+analytics_ns = Namespace('analytics', description='借閱統計 (熱門書籍、借閱趨勢)，由定期彙總的資料表提供')
+
+PERIODS = {'week': 7, 'month': 30}
+
+popular_item_model = analytics_ns.model('PopularBook', {
+    'book_key': fields.String(description='彙總鍵 (正規化 ISBN，沒有 ISBN 時為正規化書名)'),
+    'title': fields.String(description='書名'),
+    'isbn': fields.String(description='ISBN'),
+    'count': fields.Integer(description='期間內借閱次數'),
+})
+
+popular_model = analytics_ns.model('PopularBooks', {
+    'days': fields.Integer(description='統計天數'),
+    'as_of': fields.DateTime(description='彙總資料最後更新時間'),
+    'items': fields.List(fields.Nested(popular_item_model)),
+})
+
+series_model = analytics_ns.model('LoanSeries', {
+    'book_key': fields.String(description='彙總鍵'),
+    'title': fields.String(description='書名'),
+    'as_of': fields.DateTime(description='彙總資料最後更新時間'),
+    'points': fields.List(fields.Nested(analytics_ns.model('LoanSeriesPoint', {
+        'date': fields.Date(description='日期 (UTC)'),
+        'count': fields.Integer(description='借閱次數'),
+    }))),
+})
+
+
+def _days(default):
+    period = request.args.get('period')
+    if period:
+        if period not in PERIODS:
+            analytics_ns.abort(400, "period 只能是 week 或 month")
+        return PERIODS[period]
+    return max(1, min(request.args.get('days', default, type=int), 365))
+
+
+@analytics_ns.route('/popular')
+class PopularBooks(Resource):
+    @analytics_ns.doc('popular_books', params={
+        'period': 'week (7 天) 或 month (30 天)', 'days': '或直接指定天數 (預設 7，最多 365)',
+        'limit': '筆數 (預設 10，最多 100)'})
+    @analytics_ns.response(400, '無效的 period')
+    @analytics_ns.marshal_with(popular_model)
+    def get(self):
+        """最近一段期間借閱次數最多的書"""
+        days = _days(7)
+        limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+        return get_analytics(current_app.config).popular(days, limit)
+
+
+@analytics_ns.route('/series')
+class LoanSeries(Resource):
+    @analytics_ns.doc('loan_series', params={
+        'isbn': 'ISBN (可含連字號)', 'title': '或書名 (沒有 ISBN 的書)', 'key': '或 /popular 回傳的 book_key',
+        'period': 'week 或 month', 'days': '或直接指定天數 (預設 30，最多 365)'})
+    @analytics_ns.response(400, '需要 isbn、title 或 key')
+    @analytics_ns.marshal_with(series_model)
+    def get(self):
+        """某本書每天的借閱次數"""
+        key = request.args.get('key') or book_key(request.args.get('title') or '', request.args.get('isbn'))
+        if not key:
+            analytics_ns.abort(400, "需要 isbn、title 或 key")
+        return get_analytics(current_app.config).series(key, _days(30))
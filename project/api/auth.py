@@ -1,7 +1,9 @@
-from flask import request
-from flask_restx import Resource, Namespace, fields
+from flask import request, current_app
+from flask_restx import Resource, Namespace, fields, marshal
+from sqlalchemy.exc import IntegrityError
 from ..models import User
-from ..extensions import db, bcrypt
+from ..extensions import db
+from ..services.password_hasher import get_password_hasher, HasherBusy
 from flask_jwt_extended import create_access_token
 
 auth_ns = Namespace('auth', description='使用者驗證 (註冊與登入)')
@@ -25,26 +27,36 @@ login_success = auth_ns.model('LoginSuccess', {
     'access_token': fields.String(description='JWT 存取令牌')
 })
 
+# 違反哪個唯一限制 -> 回傳的錯誤訊息
+DUPLICATE_ERRORS = {
+    'users_username_key': "使用者名稱已被註冊",
+    'users_email_key': "電子郵件已被註冊",
+}
+
+def busy(e):
+    """bcrypt 佇列已滿時的快速失敗回應"""
+    return {"error": "登入人數過多，請稍後再試", "message": str(e)}, 503, {'Retry-After': '1'}
+
 @auth_ns.route('/register')
 class Register(Resource):
     @auth_ns.doc('register_user')
     @auth_ns.expect(register_payload, validate=True)
     @auth_ns.response(201, '使用者建立成功')
+    @auth_ns.response(409, '使用者名稱或電子郵件已被註冊')
+    @auth_ns.response(503, '密碼雜湊佇列已滿')
     def post(self):
         """建立一個新使用者"""
         data = request.get_json()
         username = data['username']
         email = data['email']
 
-        # 檢查使用者或 email 是否已存在
-        if User.query.filter_by(username=username).first():
-            return {"error": "使用者名稱已被註冊"}, 409
-        if User.query.filter_by(email=email).first():
-            return {"error": "電子郵件已被註冊"}, 409
-
-        # 【關鍵】使用 bcrypt 雜湊密碼
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        # 【關鍵】使用 bcrypt 雜湊密碼 (在獨立的執行緒池計算)
+        try:
+            hashed_password = get_password_hasher(current_app.config).hash(data['password'])
+        except HasherBusy as e:
+            return busy(e)
 
+        # 直接 INSERT，重複與否交給 username / email 的唯一限制判斷 (一次來回，也沒有先查再寫的競爭)
         try:
             new_user = User(
                 username=username,
@@ -54,6 +66,12 @@ class Register(Resource):
             db.session.add(new_user)
             db.session.commit()
             return {"message": "使用者建立成功"}, 201
+        except IntegrityError as e:
+            db.session.rollback()
+            constraint = getattr(getattr(e.orig, 'diag', None), 'constraint_name', None)
+            if constraint in DUPLICATE_ERRORS:
+                return {"error": DUPLICATE_ERRORS[constraint]}, 409
+            return {"error": "無法註冊使用者", "message": str(e.orig)}, 409
         except Exception as e:
             db.session.rollback()
             return {"error": "無法註冊使用者", "message": str(e)}, 500
@@ -62,16 +80,36 @@ class Register(Resource):
 class Login(Resource):
     @auth_ns.doc('login_user')
     @auth_ns.expect(login_payload, validate=True)
-    @auth_ns.marshal_with(login_success)
+    @auth_ns.response(200, '登入成功', login_success)
+    @auth_ns.response(401, '使用者名稱或密碼錯誤')
+    @auth_ns.response(503, '密碼驗證佇列已滿')
     def post(self):
         """使用者登入並獲取 JWT 令牌"""
         data = request.get_json()
         user = User.query.filter_by(username=data['username']).first()
-
-        # 【關鍵】使用 bcrypt 檢查密碼
-        if user and bcrypt.check_password_hash(user.password_hash, data['password']):
-            # 密碼正確，產生 JWT 令牌
-            access_token = create_access_token(identity=str(user.id))
-            return {"message": "登入成功", "access_token": access_token}, 200
-        else:
+        if not user:
             return {"error": "使用者名稱或密碼錯誤"}, 401
+        user_id, password_hash = user.id, user.password_hash
+        # bcrypt 要算上百毫秒，先把資料庫連線還回連線池
+        db.session.close()
+
+        hasher = get_password_hasher(current_app.config)
+        try:
+            # 【關鍵】使用 bcrypt 檢查密碼 (在獨立的執行緒池計算，佇列滿了就快速失敗)
+            if not hasher.check(password_hash, data['password']):
+                return {"error": "使用者名稱或密碼錯誤"}, 401
+        except HasherBusy as e:
+            return busy(e)
+        if hasher.needs_rehash(password_hash):
+            # 工作因子調整過：趁有明文密碼時換成新的雜湊；佇列滿了就等下次登入再換，密碼已經驗證過，照常發令牌
+            try:
+                new_hash = hasher.hash(data['password'])
+            except HasherBusy:
+                new_hash = None
+            if new_hash is not None:
+                User.query.filter_by(id=user_id, password_hash=password_hash).update({'password_hash': new_hash})
+                db.session.commit()
+
+        # 密碼正確，產生 JWT 令牌
+        access_token = create_access_token(identity=str(user_id))
+        return marshal({"message": "登入成功", "access_token": access_token}, login_success), 200
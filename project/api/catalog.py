@@ -0,0 +1,60 @@
+from flask import request
+from flask_restx import Resource, Namespace, fields
+from sqlalchemy import func
+from ..extensions import db
+from ..models import Book, Loan
+from ..services.isbn import normalize_isbn
+from .covers import CoverUrl
+
+catalog_ns = Namespace('catalog', description='本地館藏目錄查詢 (由背景爬蟲定期更新)')
+
+availability_model = catalog_ns.model('Availability', {
+    'library': fields.String(attribute='library.name', description='館別'),
+    'total_copies': fields.Integer(description='館藏數'),
+    'available_copies': fields.Integer(description='可借閱數'),
+    'checked_at': fields.DateTime(description='最後確認時間'),
+})
+
+book_model = catalog_ns.model('CatalogBook', {
+    'isbn': fields.String(description='正規化 ISBN'),
+    'title': fields.String(attribute='name', description='書名'),
+    'author': fields.String(description='作者'),
+    'image_url': CoverUrl(attribute='cover_image_url', description='封面 (經過封面代理)'),
+    'updated_at': fields.DateTime(description='最後更新時間'),
+    'availability': fields.List(fields.Nested(availability_model)),
+})
+
+book_detail_model = catalog_ns.clone('CatalogBookDetail', book_model, {
+    'loan_count': fields.Integer(description='借閱紀錄中這本書 (同一個 ISBN-13) 被借閱的次數'),
+})
+
+@catalog_ns.route('/books/<string:isbn>')
+@catalog_ns.param('isbn', 'ISBN (可含連字號)')
+class CatalogBook(Resource):
+    @catalog_ns.doc('get_catalog_book')
+    @catalog_ns.response(404, '目錄中沒有這本書')
+    @catalog_ns.marshal_with(book_detail_model)
+    def get(self, isbn):
+        """依 ISBN (ISBN-10 或 ISBN-13) 查詢館藏目錄"""
+        book = Book.query.filter_by(isbn=normalize_isbn(isbn)).first()
+        if not book:
+            catalog_ns.abort(404, "目錄中沒有這本書")
+        # 借閱紀錄與目錄都存正規化的 ISBN-13，直接以索引做完全相等比對
+        book.loan_count = db.session.execute(
+            func.count(Loan.id).select().where(Loan.book_isbn13 == book.isbn)).scalar()
+        return book
+
+@catalog_ns.route('/books')
+class CatalogBookList(Resource):
+    @catalog_ns.doc('list_catalog_books', params={'q': '書名關鍵字', 'limit': '筆數上限 (預設 20，最多 100)'})
+    @catalog_ns.marshal_list_with(book_model)
+    def get(self):
+        """依書名關鍵字查詢館藏目錄"""
+        keyword = request.args.get('q', '').strip()
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        query = Book.query
+        if keyword:
+            # 關鍵字裡的 % 與 _ 是字面字元，不是 LIKE 萬用字元
+            pattern = keyword.replace('\\', '\\\\').replace('%', r'\%').replace('_', r'\_')
+            query = query.filter(Book.name.ilike(f"%{pattern}%", escape='\\'))
+        return query.order_by(Book.updated_at.desc()).limit(limit).all()
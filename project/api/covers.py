@@ -0,0 +1,47 @@
+from flask import request, current_app, send_file
+from flask_restx import Resource, Namespace, fields
+from ..services.cover_cache import CoverRejected, CoverUnavailable, THUMB_SIZES, get_cover_cache, proxied_cover_url
+
+covers_ns = Namespace('covers', description='封面圖片代理 (磁碟快取與縮圖)')
+
+
+class CoverUrl(fields.String):
+    """封面網址欄位：允許代理的主機改寫成 /api/covers/ 的網址"""
+
+    def format(self, value):
+        return proxied_cover_url(value, current_app.config)
+
+
+def present_books(books):
+    """爬蟲結果給前端前改寫 image_url (複製一份，不修改快取裡的資料)"""
+    config = current_app.config
+    return [dict(book, image_url=proxied_cover_url(book.get('image_url'), config)) for book in books]
+
+
+@covers_ns.route('/')
+class Cover(Resource):
+    @covers_ns.doc('get_cover', params={
+        'url': '原始封面網址 (必須是 COVER_PROXY_HOSTS 內的主機)',
+        'size': f"縮圖尺寸 {'、'.join(f'{k} ({w}x{h})' for k, (w, h) in THUMB_SIZES.items())}，或 orig (原圖)；預設 m"})
+    @covers_ns.response(400, '不允許的網址或尺寸')
+    @covers_ns.response(502, '無法取得封面')
+    def get(self):
+        """取得封面圖片 (第一次從遠端下載並快取，之後直接從磁碟提供)"""
+        config = current_app.config
+        url, size = request.args.get('url', ''), request.args.get('size', 'm')
+        for attempt in range(2):
+            try:
+                path, mimetype, etag = get_cover_cache(config).get(url, size)
+                # send_file 透過 wsgi.file_wrapper (gunicorn 會用 sendfile) 送出，並處理 If-None-Match / Range
+                response = send_file(path, mimetype=mimetype, etag=etag, max_age=config['COVER_MAX_AGE'], conditional=True)
+                break
+            except CoverRejected as e:
+                covers_ns.abort(400, str(e))
+            except CoverUnavailable as e:
+                covers_ns.abort(502, str(e))
+            except FileNotFoundError:
+                # 檔案剛好被其他行程的容量淘汰刪掉，重新下載一次
+                if attempt:
+                    raise
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
@@ -0,0 +1,37 @@
+from functools import wraps
+from flask import current_app
+from flask_restx.utils import unpack
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..services.http_cache import etag_matches, not_modified
+
+
+def admin_required(fn):
+    """只允許 Config.ADMIN_USER_IDS 內的使用者呼叫 (必須先登入)"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if get_jwt_identity() not in current_app.config['ADMIN_USER_IDS']:
+            return {"error": "需要管理員權限"}, 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def conditional(etag_for):
+    """
+    條件式 GET：etag_for() 在執行 view 之前算出 ETag (例如由版本號組成)，
+    與 If-None-Match 相符時直接回 304，不查詢也不序列化本文；否則在回應加上 ETag。
+    要放在 marshal_with 的外層 (上面)。
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            tag = etag_for()
+            if etag_matches(tag):
+                return not_modified(tag)
+            data, code, headers = unpack(fn(*args, **kwargs))
+            headers = dict(headers or {})
+            headers['ETag'] = f'"{tag}"'
+            headers['Cache-Control'] = 'private, no-cache'
+            return data, code, headers
+        return wrapper
+    return decorator
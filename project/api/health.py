@@ -0,0 +1,42 @@
+from flask_restx import Resource, Namespace
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from ..extensions import db
+from ..services.query_stats import endpoint_stats, pool_status, pool_waits
+from .decorators import admin_required
+
+health_ns = Namespace('health', description='健康檢查 (給 nginx / docker healthcheck 使用)')
+
+@health_ns.route('')
+class Liveness(Resource):
+    @health_ns.doc('liveness', security=None)
+    def get(self):
+        """行程存活檢查：不碰資料庫，只要 worker 能回應就是 200"""
+        return {'status': 'ok'}, 200
+
+@health_ns.route('/ready')
+class Readiness(Resource):
+    @health_ns.doc('readiness', security=None)
+    @health_ns.response(503, '資料庫無法連線')
+    def get(self):
+        """就緒檢查：確認資料庫可以連線，才開始接收流量"""
+        try:
+            db.session.execute(text('SELECT 1'))
+        except SQLAlchemyError:
+            db.session.rollback()
+            return {'status': 'unavailable', 'database': 'down'}, 503
+        finally:
+            db.session.close()
+        return {'status': 'ready', 'database': 'ok'}, 200
+
+@health_ns.route('/db')
+class DatabaseStats(Resource):
+    @health_ns.doc('database_stats', description='本副本的連線池狀態與各端點的查詢統計 (需要管理員)')
+    @health_ns.response(403, '需要管理員權限')
+    @admin_required
+    def get(self):
+        """連線池狀態、取用連線的等待時間，以及各端點的查詢次數與資料庫時間"""
+        return {
+            'pool': dict(pool_status(db.engine), **pool_waits.stats()),
+            'endpoints': endpoint_stats.stats(),
+        }, 200
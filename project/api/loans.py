@@ -1,7 +1,14 @@
-from flask import request
+from flask import request, current_app
 from flask_restx import Resource, Namespace, fields
+from sqlalchemy import select, tuple_, update
 from ..models import Loan, User
 from ..extensions import db
+from ..services.gateway import get_gateway
+from ..services.http_cache import make_etag
+from ..services.isbn import normalize_isbn
+from ..services.pagination import encode_cursor, decode_cursor
+from ..services.loan_import import FORMATS, guess_format, import_loans, iter_records
+from .decorators import admin_required, conditional
 # 【關鍵】 匯入 JWT 工具來「保護」API
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -17,9 +24,16 @@ loan_payload = loan_ns.model('LoanPayload', {
 loan_model = loan_ns.clone('LoanModel', loan_payload, {
     'id': fields.Integer(readonly=True),
     'user_id': fields.Integer(readonly=True),
+    'isbn13': fields.String(attribute='book_isbn13', readonly=True, description='正規化 ISBN-13 (可直接查館藏目錄)'),
     'loan_date': fields.DateTime(readonly=True)
 })
 
+# (輸出) 一頁借閱紀錄 + 下一頁的游標
+loan_page_model = loan_ns.model('LoanPage', {
+    'items': fields.List(fields.Nested(loan_model)),
+    'next': fields.String(description='下一頁的游標 (沒有下一頁時為 null)')
+})
+
 @loan_ns.route('/')
 class LoanList(Resource):
 
@@ -38,23 +52,80 @@ class LoanList(Resource):
         new_loan = Loan(
             user_id=current_user_id,
             book_title=data['book_title'],
-            book_isbn=data.get('book_isbn')
+            book_isbn=data.get('book_isbn'),
+            book_isbn13=normalize_isbn(data.get('book_isbn'))
         )
         db.session.add(new_loan)
+        db.session.execute(update(User).where(User.id == current_user_id).values(loans_version=User.loans_version + 1))
         db.session.commit()
+        # 借閱歷史改變了，舊的推薦結果作廢：其他副本 (與批次匯入) 靠推薦快取鍵中的 loans_version 不再命中，
+        # 這裡只是立即釋放本行程的舊快取
+        get_gateway('recommend', current_app.config).invalidate(current_user_id)
         return new_loan, 201
 
+def my_loans_etag():
+    """使用者 id + 借閱版本號 + 查詢參數 (limit / cursor)：只需要一次主鍵查詢"""
+    current_user_id = int(get_jwt_identity())
+    version = db.session.execute(select(User.loans_version).where(User.id == current_user_id)).scalar()
+    return make_etag('loans', current_user_id, version, request.query_string.decode('latin-1'))
+
+
 @loan_ns.route('/my')
 class MyLoans(Resource):
 
-    @loan_ns.doc('get_my_loans', description='獲取我所有的借閱歷史 (需要登入)')
-    @loan_ns.marshal_list_with(loan_model)
+    @loan_ns.doc('get_my_loans', description='分頁獲取我的借閱歷史，新的在前 (需要登入)',
+                 params={'limit': '每頁筆數 (預設 20，最多 100)', 'cursor': '上一頁回傳的 next'})
+    @loan_ns.response(400, '無效的游標')
+    @loan_ns.response(304, '借閱紀錄沒有變動 (If-None-Match 與 ETag 相符)')
     @jwt_required() # <-- 【關鍵】 加上這個「保護罩」
+    @conditional(my_loans_etag)
+    @loan_ns.marshal_with(loan_page_model)
     def get(self):
-        """獲取當前登入者的所有借閱紀錄"""
+        """獲取當前登入者的借閱紀錄 (游標分頁，依借閱時間由新到舊)"""
 
         # 【關鍵】 從 JWT 令牌中獲取當前登入者的 ID
         current_user_id = int(get_jwt_identity())
 
-        my_loans = Loan.query.filter_by(user_id=current_user_id).all()
-        return my_loans
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        # keyset 分頁：用上一頁最後一筆的 (loan_date, id) 接續，不論翻到第幾頁都只讀一頁的索引範圍
+        query = Loan.query.filter_by(user_id=current_user_id)
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                loan_date, loan_id = decode_cursor(cursor)
+            except ValueError as e:
+                loan_ns.abort(400, str(e))
+            query = query.filter(tuple_(Loan.loan_date, Loan.id) < tuple_(loan_date, loan_id))
+
+        loans = query.order_by(Loan.loan_date.desc(), Loan.id.desc()).limit(limit + 1).all()
+        items = loans[:limit]
+        has_more = len(loans) > limit
+        return {'items': items, 'next': encode_cursor(items[-1].loan_date, items[-1].id) if has_more else None}
+
+
+@loan_ns.route('/import')
+class LoanImport(Resource):
+
+    @loan_ns.doc('import_loans', description=(
+        '批次匯入借閱紀錄 (需要管理員)。請求本文直接放 CSV / NDJSON 檔 (Content-Type: text/csv 或 application/x-ndjson)，'
+        '或以 multipart 上傳欄位 file。欄位：user_id, book_title, book_isbn, loan_date, return_date (時間為 ISO 8601)'),
+        params={'format': 'csv 或 ndjson；預設依 Content-Type / 檔名判斷'})
+    @loan_ns.response(400, '無法判斷檔案格式')
+    @loan_ns.response(403, '需要管理員權限')
+    @admin_required
+    def post(self):
+        """串流讀取上傳的檔案，分批驗證並寫入借閱紀錄，回傳匯入 / 拒絕筆數"""
+        upload = request.files.get('file')
+        if upload is not None:
+            stream, fmt = upload.stream, guess_format(upload.filename, upload.mimetype)
+        else:
+            # 直接讀取原始請求本文，不經過 request.data 整份載入記憶體
+            stream, fmt = request.stream, guess_format(content_type=request.content_type)
+        fmt = request.args.get('format') or fmt
+        if fmt not in FORMATS:
+            return {"error": "無法判斷檔案格式，請指定 format=csv 或 format=ndjson"}, 400
+
+        config = current_app.config
+        report = import_loans(iter_records(stream, fmt), chunk_size=config['LOAN_IMPORT_CHUNK_SIZE'],
+                              commit_rows=config['LOAN_IMPORT_COMMIT_ROWS'])
+        return report, 200
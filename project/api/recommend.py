@@ -1,21 +1,62 @@
 import os
 import requests
-from flask import jsonify
+from flask import current_app, request
+from sqlalchemy import select
 from flask_restx import Resource, Namespace
 # 匯入 JWT 工具 Loan 模型
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import Loan
+from ..models import Loan, User
 from ..extensions import db
+from ..services.co_borrow import get_recommender, RecommenderUnavailable
+from ..services.gateway import get_gateway
+from ..services.scrape_cache import normalize_keyword
+from ..services.upstream import get_upstream_client, UpstreamUnavailable
 
 # 1. 建立 Namespace
 recommend_ns = Namespace('recommend', description='個人化 RAG 推薦閘道')
 
+MODES = ('n8n', 'local', 'blend', 'fallback')
+
+
+def local_recommendations(history):
+    """本地共同借閱模型的推薦；模型不能用時回傳 None"""
+    try:
+        return get_recommender(current_app.config).recommend(history, current_app.config['RECOMMEND_LOCAL_LIMIT'])
+    except RecommenderUnavailable:
+        return None
+
+
+def local_response(user_id, recommendations, degraded=False):
+    body = {"user_id": user_id, "source": "local", "recommendations": recommendations}
+    if degraded:
+        body["degraded"] = True
+    return body, 200
+
+
+def blend(body, local):
+    """N8N 與本地推薦交錯合併 (依書名去重)；N8N 回應不是推薦清單時，本地結果放在 local_recommendations"""
+    if not isinstance(body, dict) or not isinstance(body.get('recommendations'), list):
+        return {**body, "local_recommendations": local} if isinstance(body, dict) else body
+    merged, titles = [], set()
+    remote = body['recommendations']
+    for i in range(max(len(remote), len(local))):
+        for item in (remote[i:i + 1] + local[i:i + 1]):
+            title = normalize_keyword(str(item.get('title', ''))) if isinstance(item, dict) else None
+            if title not in titles:
+                merged.append(item)
+                if title is not None:
+                    titles.add(title)
+    return {**body, "source": "blend", "recommendations": merged}
+
+
 # 2. 建立「資源 (Resource)」
 @recommend_ns.route('/')
 class RecommendationGateway(Resource):
     
     @recommend_ns.doc('get_recommendations', 
-                      description='獲取個人化的書籍推薦 (必須登入)')
+                      description='獲取個人化的書籍推薦 (必須登入)',
+                      params={'mode': 'n8n / local / blend / fallback (預設依 RECOMMEND_MODE)'})
+    @recommend_ns.response(400, '無效的 mode')
     @recommend_ns.response(401, '未經授權 (JWT 令牌無效或未提供)')
     @recommend_ns.response(503, 'N8N 推薦模組無回應')
     @jwt_required()
@@ -23,7 +64,13 @@ class RecommendationGateway(Resource):
         """
         獲取 RAG 推薦。
         此 API 會查詢您的借閱歷史，並轉發給 N8N 推薦模組。
+        借閱歷史沒有改變時直接回傳快取的推薦結果，不會呼叫 N8N。
+        mode=local 直接用本地共同借閱模型 (幾毫秒)、blend 兩者合併、fallback 在 N8N 失敗或逾時時改用本地結果。
         """
+        config = current_app.config
+        mode = request.args.get('mode') or config['RECOMMEND_MODE']
+        if mode not in MODES:
+            return {"error": f"mode 只能是 {', '.join(MODES)}"}, 400
         
         # 3. 獲取當前登入者的 ID (來自 JWT)
         try:
@@ -33,20 +80,35 @@ class RecommendationGateway(Resource):
 
         # 4. 【核心邏輯 1】 查詢「自己」的 PostgreSQL 資料庫
         try:
-            my_loans = Loan.query.filter_by(user_id=current_user_id).order_by(Loan.loan_date.desc()).limit(20).all()
+            # 加上 id 讓同一時間的借閱順序固定，借閱書名指紋才會穩定
+            my_loans = Loan.query.filter_by(user_id=current_user_id).order_by(Loan.loan_date.desc(), Loan.id.desc()).limit(20).all()
             
             # 將借閱歷史格式化為一個簡單的列表
             loan_history_titles = [loan.book_title for loan in my_loans]
+            history = [(loan.book_title, loan.book_isbn13) for loan in my_loans]
             
             if not loan_history_titles:
                 return {"message": "您還沒有借閱紀錄，無法進行推薦"}, 200
+            loans_version = db.session.execute(select(User.loans_version).where(User.id == current_user_id)).scalar()
+
+            # 查完就把連線還給連線池，等待 N8N (最久數秒) 的期間不佔用資料庫連線
+            db.session.close()
 
         except Exception as e:
             return {"error": "查詢借閱紀錄時發生錯誤", "message": str(e)}, 500
 
+        if mode == 'local':
+            local = local_recommendations(history)
+            if local is None:
+                return {"error": "本地推薦模型尚未建立"}, 503
+            return local_response(current_user_id, local)
+
         # 5. 獲取 N8N 服務的 URL (來自 .env)
         n8n_url = os.getenv('N8N_RECOMMEND_URL')
         if not n8n_url:
+            local = local_recommendations(history) if mode != 'n8n' else None
+            if local is not None:
+                return local_response(current_user_id, local, degraded=True)
             return {"error": "N8N 推薦模組未設定"}, 503 # 503 Service Unavailable
             
         # 6. 【核心邏輯 2】 轉發請求給 N8N
@@ -54,19 +116,50 @@ class RecommendationGateway(Resource):
             "user_id": current_user_id,
             "loan_history": loan_history_titles
         }
+        # 有本地結果可以替代時，不必等 N8N 等到預設的讀取逾時 (這種逾時不算 N8N 失敗，不會打開斷路器)
+        timeout = (config['UPSTREAM_CONNECT_TIMEOUT'], config['RECOMMEND_N8N_TIMEOUT']) if mode != 'n8n' else None
 
         try:
-            response = requests.post(n8n_url, json=n8n_payload, timeout=10)
-            response.raise_for_status() # 檢查 N8N 是否回傳錯誤
-            
+            # 共用連線池 + 斷路器；RAG 呼叫成本高，只有連線沒建立時才重試
+            client = get_upstream_client(config)
+            # 快取鍵 = (使用者, 送出的借閱書名指紋 + 借閱版本號)；過期後先回舊結果並在背景重新推薦。
+            # 版本號在新增借閱或批次匯入時加 1，所有副本的舊快取都不會再命中
+            # 背景重新推薦沒有人在等，使用一般的讀取逾時
+            gateway = get_gateway('recommend', config)
+            cache_payload = dict(n8n_payload, loans_version=loans_version)
+            body, status = gateway.call(
+                cache_payload, lambda: client.post_json(n8n_url, n8n_payload, timeout=timeout), scope=current_user_id,
+                revalidate=lambda: client.post_json(n8n_url, n8n_payload))
+
+            if mode == 'blend':
+                local = local_recommendations(history)
+                if local is not None:
+                    body = blend(body, local)
             # 7. 【成功】將 N8N 的「完整 JSON 回應」直接回傳給前端
-            return response.json(), response.status_code
-
-        except requests.exceptions.Timeout:
-            return {"error": "N8N 推薦模組回應超時"}, 504 # 504 Gateway Timeout
-        except requests.exceptions.ConnectionError:
-            return {"error": "無法連接至 N8N 推薦模組"}, 504
-        except requests.exceptions.HTTPError as e:
-            return {"error": "N8N 推薦模組回報錯誤", "n8n_response": e.response.text}, e.response.status_code
+            return body, status
+
+        except (UpstreamUnavailable, requests.exceptions.RequestException) as e:
+            if (mode != 'n8n' and isinstance(e, requests.exceptions.ReadTimeout)
+                    and config['RECOMMEND_N8N_TIMEOUT'] < config['UPSTREAM_READ_TIMEOUT']):
+                # 只是等不及：在背景用一般的讀取逾時把這次推薦做完並放進快取，下一次請求就能拿到 N8N 的結果
+                gateway.warm(cache_payload, lambda: client.post_json(n8n_url, n8n_payload), scope=current_user_id)
+            if mode != 'n8n':
+                local = local_recommendations(history)
+                if local is not None:
+                    return local_response(current_user_id, local, degraded=True)
+            return n8n_error(e)
         except Exception as e:
             return {"error": "閘道發生未知錯誤", "message": str(e)}, 500
+
+
+def n8n_error(e):
+    if isinstance(e, UpstreamUnavailable):
+        # N8N 近期持續失敗：快速失敗，不再佔住 worker 等待逾時
+        return {"error": "N8N 推薦模組暫時無法使用", "message": str(e), "degraded": True}, 503, {'Retry-After': str(int(e.retry_after) + 1)}
+    if isinstance(e, requests.exceptions.Timeout):
+        return {"error": "N8N 推薦模組回應超時"}, 504 # 504 Gateway Timeout
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return {"error": "無法連接至 N8N 推薦模組"}, 504
+    if isinstance(e, requests.exceptions.HTTPError):
+        return {"error": "N8N 推薦模組回報錯誤", "n8n_response": e.response.text}, e.response.status_code
+    return {"error": "閘道發生未知錯誤", "message": str(e)}, 500
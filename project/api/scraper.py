@@ -1,93 +1,226 @@
-import requests
-from bs4 import BeautifulSoup
-import urllib.parse
-import time # 導入時間模組，翻頁時稍作停頓以免被封鎖
-from flask import request
-from flask_restx import Resource, Namespace
+import json
+from flask import request, current_app, Response, stream_with_context
+from flask_restx import Resource, Namespace, fields
+from ..extensions import db
+from ..models import ScrapeJob
+from ..services.http_cache import etag_matches, make_etag, not_modified
+from ..services.ndhu_fetcher import get_fetcher
+from ..services.scrape_cache import get_scrape_cache, normalize_keyword
+from ..services.scrape_jobs import FAILED, SUCCEEDED, job_pages, submit_job
+from .covers import present_books
+from .decorators import admin_required
 
 scraper_ns = Namespace('scraper', description='東華圖書館翻頁爬蟲 API')
 
+job_payload = scraper_ns.model('ScrapeJobPayload', {
+    'q': fields.String(required=True, description='搜尋關鍵字'),
+    'pages': fields.Integer(description='要抓取的頁數 (預設 3，最多 SCRAPE_MAX_PAGES)'),
+})
+
+job_model = scraper_ns.model('ScrapeJob', {
+    'job_id': fields.String(description='工作 ID'),
+    'status': fields.String(description='queued / running / succeeded / failed'),
+    'query': fields.String(description='搜尋關鍵字'),
+    'pages': fields.Integer(description='要抓取的頁數'),
+    'pages_done': fields.Integer(description='已完成的頁數 (遇到空頁會提早結束)'),
+    'count': fields.Integer(description='目前抓到的書籍數'),
+    'error': fields.String(description='失敗原因'),
+    'deduplicated': fields.Boolean(description='是否沿用相同的進行中工作 (只在建立工作時回傳)'),
+    'created_at': fields.DateTime(),
+    'started_at': fields.DateTime(),
+    'finished_at': fields.DateTime(),
+})
+
+job_results_model = scraper_ns.model('ScrapeJobResults', {
+    'job_id': fields.String(description='工作 ID'),
+    'status': fields.String(description='工作狀態'),
+    'results': fields.List(fields.Nested(scraper_ns.model('ScrapeJobPage', {
+        'page': fields.Integer(description='頁碼'),
+        'count': fields.Integer(description='該頁書籍數'),
+        'data': fields.Raw(description='該頁的書籍列表'),
+    }))),
+    'next_after': fields.Integer(description='下一次查詢帶入的 after'),
+    'done': fields.Boolean(description='工作已結束且沒有更多頁面'),
+})
+
+
+def parse_pages(raw, default=3):
+    """頁數參數：1 到 SCRAPE_MAX_PAGES 的整數，否則回 400"""
+    max_pages = current_app.config['SCRAPE_MAX_PAGES']
+    try:
+        pages = int(raw if raw is not None else default)
+    except (TypeError, ValueError):
+        pages = 0
+    if not 1 <= pages <= max_pages:
+        scraper_ns.abort(400, f"pages 必須是 1 到 {max_pages} 之間的整數")
+    return pages
+
+
+def job_dict(job, **extra):
+    return dict({
+        'job_id': job.id, 'status': job.status, 'query': job.query, 'pages': job.pages,
+        'pages_done': job.pages_done, 'count': job.book_count, 'error': job.error,
+        'created_at': job.created_at, 'started_at': job.started_at, 'finished_at': job.finished_at,
+    }, **extra)
+
+
+def accepted(query, pages):
+    """排入工作並回 202，Location 指向查詢進度的網址"""
+    job, created = submit_job(query, pages)
+    location = scraper_ns.apis[0].url_for(ScrapeJobStatus, job_id=job.id)
+    return scraper_ns.marshal(job_dict(job, deduplicated=not created), job_model), 202, {'Location': location}
+
+
+# --- 串流模式的產生器管線：抓取頁面 -> 轉成紀錄 -> 編碼成 NDJSON / SSE ---
+
+def scrape_records(keyword, pages):
+    """每解析完一頁就產出一筆 page 紀錄，最後產出 summary (失敗時產出 error)"""
+    count = 0
+    pages_done = 0
+    try:
+        fetcher = get_fetcher(current_app.config)
+        for page_no, books in fetcher.iter_pages(keyword, pages, cache=get_scrape_cache(current_app.config)):
+            count += len(books)
+            pages_done += 1
+            yield {"type": "page", "page": page_no, "count": len(books), "data": present_books(books)}
+    except Exception as e:
+        yield {"type": "error", "status": "error", "message": f"爬蟲翻頁失敗: {str(e)}", "count": count, "pages": pages_done}
+        return
+    yield {"type": "summary", "status": "success", "count": count, "pages": pages_done}
+
+
+def encode_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def encode_sse(records):
+    for record in records:
+        yield f"event: {record['type']}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+
+
+STREAM_FORMATS = {
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+    'sse': (encode_sse, 'text/event-stream'),
+}
+
+
 @scraper_ns.route('/scrape')
 class ScrapeNDHU(Resource):
-    @scraper_ns.doc('scrape_ndhu_multi_page')
+    @scraper_ns.doc('scrape_ndhu_multi_page', params={
+        'q': '搜尋關鍵字 (預設 C語言)',
+        'pages': '要抓取的頁數 (預設 3，最多 SCRAPE_MAX_PAGES)；非串流模式超過 SCRAPE_SYNC_MAX_PAGES 頁時改排入工作佇列並回 202',
+        'stream': '串流模式：1 或 ndjson 逐頁回傳 NDJSON，sse 為 Server-Sent Events',
+    })
+    @scraper_ns.response(202, '頁數較多，已排入工作佇列 (見 /scraper/jobs)', job_model)
+    @scraper_ns.response(400, '無效的 pages')
     def get(self):
         """爬取多頁東華大學圖書館館藏"""
         # 1. 取得搜尋關鍵字與要抓取的總頁數
         keyword = request.args.get('q', 'C語言')
-        total_pages_to_fetch = int(request.args.get('pages', 3)) # 預設抓 3 頁
-        encoded_keyword = urllib.parse.quote(keyword)
-        
-        all_books = []
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
+        total_pages_to_fetch = parse_pages(request.args.get('pages')) # 預設抓 3 頁
+
+        # 串流模式：每抓完一頁就先送給前端，不在伺服器累積全部結果
+        stream = request.args.get('stream')
+        if stream:
+            encode, mimetype = STREAM_FORMATS.get(stream, STREAM_FORMATS['ndjson'])
+            body = encode(scrape_records(keyword, total_pages_to_fetch))
+            # X-Accel-Buffering 讓 nginx 不要緩衝，資料才會即時送達
+            return Response(stream_with_context(body), mimetype=mimetype,
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        # 頁數多的請求不佔住連線，改由背景 worker 執行，前端輪詢進度與分段結果
+        if total_pages_to_fetch > current_app.config['SCRAPE_SYNC_MAX_PAGES']:
+            return accepted(keyword, total_pages_to_fetch)
 
         try:
-            # 2. 開始翻頁迴圈
-            for page in range(total_pages_to_fetch):
-                start_index = page * 10 # 每一頁跳 10 筆
-                
-                # 構造帶有 start 參數的 URL
-                url = f"https://books-lib.ndhu.edu.tw/toread/opac/search?q={encoded_keyword}&max=&view=CONTENT&level=all&material_type=all&location=&start={start_index}"
-                
-                print(f"正在爬取第 {page + 1} 頁: {url}")
-                
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                items = soup.find_all('li', class_='is_img')
-                
-                # 如果這一頁沒資料了，就提早跳出迴圈
-                if not items:
-                    break
-
-                for item in items:
-                    # --- 萃取邏輯 (維持不變) ---
-                    title_container = item.find('li', class_='reslt_item_head')
-                    title = title_container.find('a').text.strip() if title_container and title_container.find('a') else "未知書名"
-                    
-                    author_tag = item.find('span', class_='crs_author')
-                    author = author_tag.text.strip() if author_tag else "未知作者"
-                
-                    img_container = item.find('div', class_='img_reslt')
-                    img_tag = img_container.find('img') if img_container else None
-                    if img_tag and img_tag.has_attr('src'):
-                        raw_url = img_tag['src']
-                        # 如果是相對路徑，補上東華大學的網域
-                        if raw_url.startswith('/'):
-                            image_url = f"https://books-lib.ndhu.edu.tw{raw_url}"
-                        else:
-                            image_url = raw_url
-                    else:
-                        image_url = ""                    # ISBN 處理
-                    
-                    isbn = "無 ISBN"
-                    isbn_span = item.find('span', class_='crs_isbn')
-                    if isbn_span and isbn_span.parent:
-                        isbn = isbn_span.parent.text.replace(isbn_span.text, '').strip()
-
-                    # 館藏狀態處理
-                    avail_container = item.find('li', class_='avail_inf')
-                    availability = " | ".join([a.text.strip() for a in avail_container.find_all('a')]) if avail_container else "未知狀態"
-                
-                    all_books.append({
-                        "title": title,
-                        "author": author,
-                        "image_url": image_url,
-                        "isbn": isbn,
-                        "availability": availability,
-                        "source_page": page + 1 # 標記這是第幾頁抓到的
-                    })
-                
-                # 💡 重要：翻頁之間停頓 0.5 秒，避免學校伺服器覺得你在攻擊它
-                time.sleep(0.5)
+            # 2. 平行抓取各頁 (共用連線、限制對東華的同時連線數)，結果依頁碼排序
+            #    遇到沒有資料的頁面就提早停止；快取命中的頁面不會連到東華
+            cache = get_scrape_cache(current_app.config)
+            results = list(get_fetcher(current_app.config).iter_pages(keyword, total_pages_to_fetch, cache=cache))
+
+            # 3. ETag = 快取鍵 + 各頁內容雜湊 (第一層快取已算好)，相符時不組本文直接回 304
+            tag = make_etag('scrape', normalize_keyword(keyword), total_pages_to_fetch,
+                            ','.join(current_app.config['COVER_PROXY_HOSTS']),
+                            *(cache.digest(keyword, page_no, books) for page_no, books in results))
+            if etag_matches(tag):
+                return not_modified(tag)
+            all_books = [book for _, books in results for book in present_books(books)]
 
             return {
                 "status": "success", 
                 "count": len(all_books), 
                 "data": all_books
-            }, 200        
+            }, 200, {'ETag': f'"{tag}"', 'Cache-Control': 'no-cache'}
             
         except Exception as e:
             return {"status": "error", "message": f"爬蟲翻頁失敗: {str(e)}"}, 500
+
+@scraper_ns.route('/cache')
+class ScrapeCacheAdmin(Resource):
+    @scraper_ns.doc('scrape_cache_stats', description='查看本副本的爬蟲快取命中統計')
+    def get(self):
+        """爬蟲快取命中統計"""
+        return get_scrape_cache(current_app.config).stats(), 200
+
+    @scraper_ns.doc('scrape_cache_invalidate', description='手動清除某個關鍵字的快取 (需要管理員)',
+                    params={'q': '要清除的關鍵字'})
+    @scraper_ns.response(403, '需要管理員權限')
+    @admin_required
+    def delete(self):
+        """清除某個關鍵字的爬蟲快取"""
+        keyword = request.args.get('q')
+        if not keyword:
+            return {"error": "請提供關鍵字 q"}, 400
+        deleted = get_scrape_cache(current_app.config).invalidate(keyword)
+        return {"message": "快取已清除", "keyword": keyword, "deleted_pages": deleted}, 200
+
+
+@scraper_ns.route('/jobs')
+class ScrapeJobs(Resource):
+    @scraper_ns.doc('submit_scrape_job')
+    @scraper_ns.expect(job_payload, validate=True)
+    @scraper_ns.response(202, '已排入工作佇列 (相同的進行中工作會直接沿用)', job_model)
+    @scraper_ns.response(400, '無效的 pages')
+    def post(self):
+        """建立非同步爬蟲工作，立即回傳工作 ID"""
+        data = request.get_json()
+        query = data['q'].strip()
+        if not query:
+            scraper_ns.abort(400, "請提供關鍵字 q")
+        return accepted(query, parse_pages(data.get('pages')))
+
+
+@scraper_ns.route('/jobs/<string:job_id>')
+class ScrapeJobStatus(Resource):
+    @scraper_ns.doc('scrape_job_status')
+    @scraper_ns.response(404, '找不到工作')
+    @scraper_ns.marshal_with(job_model, skip_none=True)
+    def get(self, job_id):
+        """查詢爬蟲工作的狀態與進度"""
+        job = db.session.get(ScrapeJob, job_id) or scraper_ns.abort(404, "找不到工作")
+        return job_dict(job)
+
+
+@scraper_ns.route('/jobs/<string:job_id>/results')
+class ScrapeJobResults(Resource):
+    @scraper_ns.doc('scrape_job_results', params={
+        'after': '只回傳頁碼大於 after 的頁面 (預設 0；帶入上一次回應的 next_after)',
+        'limit': '最多回傳幾頁 (預設 10，最多 50)'})
+    @scraper_ns.response(404, '找不到工作')
+    @scraper_ns.marshal_with(job_results_model)
+    def get(self, job_id):
+        """分段讀取爬蟲工作已完成的頁面 (工作執行中也可以讀取)"""
+        job = db.session.get(ScrapeJob, job_id) or scraper_ns.abort(404, "找不到工作")
+        # 先讀狀態再讀頁面：狀態是已結束時，頁面一定都已寫入
+        finished = job.status in (SUCCEEDED, FAILED)
+        after = max(0, request.args.get('after', 0, type=int))
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        rows = job_pages(job_id, after, limit)
+        return {
+            'job_id': job.id,
+            'status': job.status,
+            'results': [{'page': page, 'count': len(books), 'data': present_books(books)} for page, books in rows],
+            'next_after': rows[-1].page if rows else after,
+            'done': finished and len(rows) < limit,
+        }
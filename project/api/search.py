@@ -1,9 +1,12 @@
 # project/api/search.py
 
 import os
-import requests
-from flask import request
-from flask_restx import Resource, fields, Namespace
+from flask import request, current_app
+from flask_restx import Resource, fields, Namespace, marshal
+from ..services.search_index import search_books
+from ..services.gateway import get_gateway, gateway_stats
+from ..services.upstream import get_upstream_client, UpstreamUnavailable
+from .covers import CoverUrl
 
 search_ns = Namespace('search', description='整合搜尋閘道')
 
@@ -12,22 +15,60 @@ search_payload = search_ns.model('SearchPayload', {
     'query': fields.String(required=True, description='使用者的查詢字串')
 })
 
+# 基本搜尋多了本地檢索用的選填欄位
+basic_search_payload = search_ns.clone('BasicSearchPayload', search_payload, {
+    'mode': fields.String(enum=['local', 'n8n'], description='local: 本地館藏目錄全文檢索 (預設)；n8n: 轉發給 N8N'),
+    'page': fields.Integer(min=1, description='頁碼 (預設 1)'),
+    'per_page': fields.Integer(min=1, description='每頁筆數 (預設 20)')
+})
+
+def n8n_post(n8n_url, data):
+    """回傳一個呼叫 N8N 的函式，交給閘道決定要不要真的執行 (快取命中或合併請求時不會執行)"""
+    client = get_upstream_client(current_app.config)
+    # 搜尋是唯讀查詢，失敗時可以安全重試
+    return lambda: client.post_json(n8n_url, data, idempotent=True)
+
+def unavailable(error, e):
+    """N8N 斷路器開啟時的快速失敗回應，附上 Retry-After"""
+    return {"error": error, "message": str(e), "degraded": True}, 503, {'Retry-After': str(int(e.retry_after) + 1)}
+
+search_book = search_ns.model('SearchBook', {
+    'isbn': fields.String(description='正規化 ISBN'),
+    'title': fields.String(attribute='name', description='書名'),
+    'author': fields.String(description='作者'),
+    'image_url': CoverUrl(attribute='cover_image_url', description='封面 (經過封面代理)')
+})
+
 @search_ns.route('/basic')
 class BasicSearch(Resource):
     @search_ns.doc('basic_search')
-    @search_ns.expect(search_payload, validate=True)
+    @search_ns.expect(basic_search_payload, validate=True)
     def post(self):
         """
-        接收「基本搜尋」請求，並轉發至 N8N 基本搜尋模組
+        接收「基本搜尋」請求：預設在本地館藏目錄做全文檢索，mode=n8n 時轉發至 N8N 基本搜尋模組
         """
         data = request.get_json()
+        config = current_app.config
+        if data.get('mode', config['SEARCH_BASIC_DEFAULT_MODE']) == 'local':
+            page = data.get('page') or 1
+            per_page = min(data.get('per_page') or 20, config['SEARCH_MAX_PER_PAGE'])
+            books, has_more = search_books(data['query'], page, per_page, config['SEARCH_MAX_CANDIDATES'])
+            return {
+                "source": "local",
+                "query": data['query'],
+                "page": page,
+                "per_page": per_page,
+                "has_more": has_more,
+                "results": marshal(books, search_book)
+            }, 200
+
         n8n_url = os.getenv('N8N_BASIC_SEARCH_URL')
 
         try:
-            # API 閘道邏輯：轉發請求
-            response = requests.post(n8n_url, json=data, timeout=10)
-            response.raise_for_status()
-            return response.json(), response.status_code
+            # API 閘道邏輯：轉發請求 (相同查詢會合併成一次上游呼叫，並依 TTL 快取)
+            return get_gateway('search_basic', config).call(data, n8n_post(n8n_url, data))
+        except UpstreamUnavailable as e:
+            return unavailable("N8N 基本搜尋模組暫時無法使用", e)
         except Exception as e:
             # 錯誤處理：N8N 服務連線失敗
             return {"error": "N8N 基本搜尋模組無回應", "message": str(e)}, 503
@@ -44,9 +85,19 @@ class AdvancedSearch(Resource):
         n8n_url = os.getenv('N8N_ADVANCED_SEARCH_URL')
 
         try:
-            # API 閘道邏輯：轉發請求
-            response = requests.post(n8n_url, json=data, timeout=10)
-            response.raise_for_status()
-            return response.json(), response.status_code
+            # API 閘道邏輯：轉發請求 (RAG 搜尋成本高，快取時間較長)
+            return get_gateway('search_advanced', current_app.config).call(data, n8n_post(n8n_url, data))
+        except UpstreamUnavailable as e:
+            return unavailable("N8N RAG 搜尋模組暫時無法使用", e)
         except Exception as e:
             return {"error": "N8N RAG 搜尋模組無回應", "message": str(e)}, 503
+
+@search_ns.route('/gateway-stats')
+class GatewayStats(Resource):
+    @search_ns.doc('gateway_stats', description='本副本 N8N 閘道的快取命中、合併請求、上游呼叫次數與斷路器狀態')
+    def get(self):
+        """N8N 閘道統計"""
+        return {
+            "gateways": gateway_stats(),
+            "circuit_breakers": get_upstream_client(current_app.config).stats()
+        }, 200
@@ -0,0 +1,165 @@
+import csv
+import json
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .services.analytics import rebuild_daily_counts, refresh_daily_counts
+from .services.catalog import crawl_keywords
+from .services.co_borrow import CoBorrowBuilder
+from .services.loan_import import FORMATS, guess_format, import_loans, iter_records
+from .services.ndhu_fetcher import get_fetcher
+from .services.scrape_cache import get_scrape_cache
+from .services.scrape_jobs import ScrapeWorker, purge_finished
+from .services.search_index import reindex_books
+
+scrape_cache_cli = AppGroup('scrape-cache', help='爬蟲結果快取管理')
+
+
+@scrape_cache_cli.command('invalidate')
+@click.argument('keyword')
+def invalidate_scrape_cache(keyword):
+    """清除某個關鍵字的所有快取頁面"""
+    deleted = get_scrape_cache(current_app.config).invalidate(keyword)
+    click.echo(f"已清除「{keyword}」共 {deleted} 頁快取")
+
+
+@scrape_cache_cli.command('purge')
+def purge_scrape_cache():
+    """刪除共用快取中已過期的資料"""
+    deleted = get_scrape_cache(current_app.config).purge_expired()
+    click.echo(f"已刪除 {deleted} 筆過期快取")
+
+
+scrape_jobs_cli = AppGroup('scrape-jobs', help='非同步爬蟲工作佇列')
+
+
+@scrape_jobs_cli.command('worker')
+@click.option('--concurrency', type=int, default=None, help='同時執行的工作數；預設為 SCRAPE_WORKER_CONCURRENCY')
+def scrape_worker(concurrency):
+    """常駐執行排入佇列的爬蟲工作 (可同時執行多個 worker，各副本共用佇列)"""
+    concurrency = concurrency or current_app.config['SCRAPE_WORKER_CONCURRENCY']
+    click.echo(f"爬蟲工作 worker 啟動 (同時 {concurrency} 個工作)")
+    ScrapeWorker(current_app._get_current_object(), concurrency).run()
+
+
+@scrape_jobs_cli.command('purge')
+def purge_scrape_jobs():
+    """刪除完成超過 SCRAPE_JOB_RETENTION 秒的工作與結果"""
+    deleted = purge_finished(current_app.config['SCRAPE_JOB_RETENTION'])
+    click.echo(f"已刪除 {deleted} 個過期工作")
+
+
+catalog_cli = AppGroup('catalog', help='館藏目錄 (本地 Postgres) 管理')
+
+
+@catalog_cli.command('crawl')
+@click.option('--keyword', '-k', 'keywords', multiple=True, help='要爬的關鍵字，可重複指定；預設為 CATALOG_CRAWL_KEYWORDS')
+@click.option('--pages', type=int, default=None, help='每個關鍵字抓幾頁；預設為 CATALOG_CRAWL_PAGES')
+@click.option('--interval', type=int, default=None, help='大於 0 時會常駐並每隔幾秒重跑一次 (給背景服務用)')
+@click.option('--full', is_flag=True, help='忽略上次的頁面驗證資訊，每一頁都重新解析並寫入')
+def crawl_catalog(keywords, pages, interval, full):
+    """爬取東華 OPAC 並依 ISBN 批次 upsert 到館藏目錄 (沒變動的結果頁會略過)"""
+    config = current_app.config
+    keywords = list(keywords) or config['CATALOG_CRAWL_KEYWORDS']
+    pages = pages or config['CATALOG_CRAWL_PAGES']
+    while True:
+        results = crawl_keywords(get_fetcher(config), keywords, pages, full=full)
+        total = {field: sum(result[field] for result in results.values()) for field in ('books', 'changed', 'unchanged')}
+        click.echo(f"館藏目錄更新完成：{total['books']} 本 ({len(results)} 個關鍵字，"
+                   f"{total['changed']} 頁有變動、{total['unchanged']} 頁未變動)")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@catalog_cli.command('reindex')
+def reindex_catalog():
+    """重新計算所有書目的全文檢索索引 (search_vector)"""
+    total = reindex_books()
+    click.echo(f"已重建 {total} 本書的檢索索引")
+
+
+loans_cli = AppGroup('loans', help='借閱紀錄管理')
+
+
+@loans_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None, help='檔案格式；預設依副檔名判斷')
+@click.option('--rejects', type=click.File('w', encoding='utf-8'), default=None, help='把被拒絕的資料列與原因寫到這個 CSV 檔')
+def import_loans_command(source, fmt, rejects):
+    """從 CSV / NDJSON 檔批次匯入借閱紀錄 (SOURCE 可用 - 代表 stdin)"""
+    fmt = fmt or guess_format(source.name)
+    if fmt is None:
+        raise click.UsageError("無法從檔名判斷格式，請指定 --format")
+    on_reject = None
+    if rejects is not None:
+        writer = csv.writer(rejects)
+        writer.writerow(['line', 'error', 'record'])
+
+        def on_reject(line_no, record, error):
+            writer.writerow([line_no, error, json.dumps(record, ensure_ascii=False, default=str)])
+
+    config = current_app.config
+    started = time.monotonic()
+    report = import_loans(iter_records(source, fmt), chunk_size=config['LOAN_IMPORT_CHUNK_SIZE'],
+                          commit_rows=config['LOAN_IMPORT_COMMIT_ROWS'], on_reject=on_reject)
+    elapsed = time.monotonic() - started
+    click.echo(f"匯入 {report['imported']} 筆、拒絕 {report['rejected']} 筆 "
+               f"({elapsed:.1f}s，{report['imported'] / elapsed if elapsed else 0:,.0f} 筆/秒)")
+    for rejection in report['rejections'][:10]:
+        click.echo(f"  第 {rejection['line']} 行：{rejection['error']}")
+
+
+analytics_cli = AppGroup('analytics', help='借閱統計彙總')
+
+
+@analytics_cli.command('refresh')
+@click.option('--interval', type=int, default=None, help='大於 0 時會常駐並每隔幾秒更新一次 (給背景服務用)')
+@click.option('--rebuild', is_flag=True, help='先清空彙總表再從頭重算')
+def refresh_analytics(interval, rebuild):
+    """把新增的借閱紀錄累加到每日借閱統計"""
+    config = current_app.config
+    batch_size, lock_timeout = config['ANALYTICS_BATCH_SIZE'], config['ANALYTICS_LOCK_TIMEOUT_MS']
+    if rebuild:
+        click.echo(f"已重算 {rebuild_daily_counts(batch_size, lock_timeout)} 筆借閱紀錄")
+    while True:
+        processed = refresh_daily_counts(batch_size, lock_timeout)
+        if processed or not interval:
+            click.echo(f"借閱統計已更新：{processed} 筆新借閱紀錄")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+recommender_cli = AppGroup('recommender', help='本地共同借閱推薦模型')
+
+
+@recommender_cli.command('build')
+@click.option('--interval', type=int, default=None, help='大於 0 時會常駐，每隔幾秒讀入新的借閱紀錄並更新模型檔 (給背景服務用)')
+def build_recommender(interval):
+    """從借閱紀錄建立共同借閱相似度模型，寫到 RECOMMENDER_MODEL_PATH"""
+    config = current_app.config
+    builder = CoBorrowBuilder(neighbors=config['RECOMMENDER_NEIGHBORS'], min_co_count=config['RECOMMENDER_MIN_CO_COUNT'],
+                              max_user_items=config['RECOMMENDER_MAX_USER_ITEMS'])
+    first = True
+    while True:
+        started = time.monotonic()
+        added = builder.update(config['ANALYTICS_LOCK_TIMEOUT_MS'])
+        if added or first:
+            neighbors = builder.save(config['RECOMMENDER_MODEL_PATH'])
+            click.echo(f"推薦模型已更新：{len(builder.keys)} 本書、{neighbors} 組相似書 "
+                       f"(新增 {added} 組借閱，{time.monotonic() - started:.1f}s)")
+        first = False
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+def register_commands(app):
+    app.cli.add_command(scrape_cache_cli)
+    app.cli.add_command(scrape_jobs_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(loans_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(recommender_cli)
@@ -1,4 +1,25 @@
 import os
+
+
+def engine_options(pool_size, max_overflow, statement_timeout_ms):
+    """SQLAlchemy 連線池設定；環境變數 DB_POOL_SIZE 等可覆寫各環境的預設值"""
+    timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', statement_timeout_ms))
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+        # 連線池用完時最多等幾秒，超過就拋錯而不是讓請求無限期排隊
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        # 避開防火牆 / Postgres 閒置斷線，定期換新連線，取用前先 ping
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+        'connect_args': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            'application_name': os.getenv('DB_APPLICATION_NAME', 'library-api'),
+            'options': f'-c statement_timeout={timeout_ms}',
+        },
+    }
+
+
 class Config:
     DB_USER = os.getenv('POSTGRES_USER','user')
     DB_PASS = os.getenv('POSTGRES_PASSWORD','password')
@@ -7,3 +28,170 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'default-fallback-key')
     SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=10, statement_timeout_ms=30000)
+
+    # 每個請求的查詢統計：超過這個時間 (毫秒) 的語句記錄警告；同一語句在一個請求內執行超過 N 次視為 N+1
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))
+    DB_NPLUS1_THRESHOLD = int(os.getenv('DB_NPLUS1_THRESHOLD', 5))
+
+    # 東華 OPAC 爬蟲：對同一主機的最大平行連線數與禮貌間隔 (秒)
+    NDHU_OPAC_BASE_URL = os.getenv('NDHU_OPAC_BASE_URL', 'https://books-lib.ndhu.edu.tw')
+    SCRAPER_MAX_CONCURRENCY = int(os.getenv('SCRAPER_MAX_CONCURRENCY', 4))
+    SCRAPER_MIN_DELAY = float(os.getenv('SCRAPER_MIN_DELAY', 0.1))
+    SCRAPER_MAX_DELAY = float(os.getenv('SCRAPER_MAX_DELAY', 5.0))
+    SCRAPER_TIMEOUT = float(os.getenv('SCRAPER_TIMEOUT', 10))
+
+    # 爬蟲結果快取：行程內 LRU (第一層) 與 Postgres 共用表 (第二層)
+    # 第一層 TTL 較短，手動清除快取後，其他副本最慢在 SCRAPE_CACHE_LOCAL_TTL 秒內生效
+    SCRAPE_CACHE_TTL = int(os.getenv('SCRAPE_CACHE_TTL', 3600))
+    SCRAPE_CACHE_LOCAL_TTL = int(os.getenv('SCRAPE_CACHE_LOCAL_TTL', 60))
+    SCRAPE_CACHE_MAXSIZE = int(os.getenv('SCRAPE_CACHE_MAXSIZE', 2048))
+
+    # 爬蟲頁數上限；超過 SCRAPE_SYNC_MAX_PAGES 頁的非串流請求改排入工作佇列 (flask scrape-jobs worker 執行) 並回 202
+    SCRAPE_MAX_PAGES = int(os.getenv('SCRAPE_MAX_PAGES', 50))
+    SCRAPE_SYNC_MAX_PAGES = int(os.getenv('SCRAPE_SYNC_MAX_PAGES', 5))
+    # 每個 worker 行程同時執行的工作數、沒有工作時的輪詢間隔 (秒)
+    SCRAPE_WORKER_CONCURRENCY = int(os.getenv('SCRAPE_WORKER_CONCURRENCY', 2))
+    SCRAPE_JOB_POLL_INTERVAL = float(os.getenv('SCRAPE_JOB_POLL_INTERVAL', 1.0))
+    # 執行中的工作超過這麼久 (秒) 沒有進度視為 worker 已中斷，交給其他 worker 重試，最多執行 SCRAPE_JOB_MAX_ATTEMPTS 次
+    SCRAPE_JOB_STALE_AFTER = int(os.getenv('SCRAPE_JOB_STALE_AFTER', 120))
+    SCRAPE_JOB_MAX_ATTEMPTS = int(os.getenv('SCRAPE_JOB_MAX_ATTEMPTS', 3))
+    # 完成的工作與結果保留秒數
+    SCRAPE_JOB_RETENTION = int(os.getenv('SCRAPE_JOB_RETENTION', 24 * 3600))
+
+    # 館藏目錄背景爬蟲 (flask catalog crawl)：要爬的關鍵字、每個關鍵字的頁數、重複執行的間隔 (秒)
+    CATALOG_CRAWL_KEYWORDS = [kw.strip() for kw in os.getenv('CATALOG_CRAWL_KEYWORDS', 'C語言,Python,資料結構,演算法,機器學習').split(',') if kw.strip()]
+    CATALOG_CRAWL_PAGES = int(os.getenv('CATALOG_CRAWL_PAGES', 10))
+    CATALOG_CRAWL_INTERVAL = int(os.getenv('CATALOG_CRAWL_INTERVAL', 6 * 3600))
+
+    # 基本搜尋：預設在本地館藏目錄做全文檢索 (local)，payload 指定 mode=n8n 才轉發給 N8N
+    SEARCH_BASIC_DEFAULT_MODE = os.getenv('SEARCH_BASIC_DEFAULT_MODE', 'local')
+    SEARCH_MAX_PER_PAGE = int(os.getenv('SEARCH_MAX_PER_PAGE', 50))
+    SEARCH_MAX_CANDIDATES = int(os.getenv('SEARCH_MAX_CANDIDATES', 2000))
+
+    # N8N 閘道的回應快取 (秒)：ttl 內直接回傳，過期後 stale_ttl 內先回舊資料並在背景更新
+    GATEWAY_ROUTES = {
+        'search_basic': {
+            'ttl': int(os.getenv('SEARCH_BASIC_CACHE_TTL', 300)),
+            'stale_ttl': int(os.getenv('SEARCH_BASIC_STALE_TTL', 600)),
+        },
+        'search_advanced': {
+            'ttl': int(os.getenv('SEARCH_ADVANCED_CACHE_TTL', 1800)),
+            'stale_ttl': int(os.getenv('SEARCH_ADVANCED_STALE_TTL', 3600)),
+        },
+        # 個人化推薦：以 (使用者, 借閱書名指紋) 為鍵，新增借閱時清除該使用者的快取
+        'recommend': {
+            'ttl': int(os.getenv('RECOMMEND_CACHE_TTL', 1800)),
+            'stale_ttl': int(os.getenv('RECOMMEND_STALE_TTL', 6 * 3600)),
+            'maxsize': int(os.getenv('RECOMMEND_CACHE_MAXSIZE', 10000)),
+        },
+    }
+
+    # 上游 (N8N) 共用用戶端：連線 / 讀取逾時 (秒)、重試次數、斷路器門檻與冷卻時間
+    UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 2))
+    UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', 10))
+    UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 1))
+    UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', 0.2))
+    UPSTREAM_BREAKER_THRESHOLD = int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', 5))
+    UPSTREAM_BREAKER_RESET = float(os.getenv('UPSTREAM_BREAKER_RESET', 30))
+    UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 20))
+
+    # 借閱紀錄批次匯入 (POST /api/loans/import、flask loans import)：每次驗證 / COPY 的筆數與每個交易的筆數
+    LOAN_IMPORT_CHUNK_SIZE = int(os.getenv('LOAN_IMPORT_CHUNK_SIZE', 10000))
+    LOAN_IMPORT_COMMIT_ROWS = int(os.getenv('LOAN_IMPORT_COMMIT_ROWS', 200000))
+
+    # 密碼雜湊：bcrypt 工作因子 (調整後，舊雜湊會在使用者下次登入時重新雜湊)、
+    # 同時計算的執行緒數 (0 = CPU 數) 與最多排隊數，超過就回 503
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    AUTH_HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', 0))
+    AUTH_HASH_QUEUE = int(os.getenv('AUTH_HASH_QUEUE', 16))
+
+    # 借閱統計 (flask analytics refresh)：定期更新的間隔 (秒)、每批處理的 loans.id 範圍、
+    # 等待進行中寫入交易的上限 (毫秒)，以及熱門書籍 / 趨勢查詢結果的快取時間 (秒)
+    ANALYTICS_REFRESH_INTERVAL = int(os.getenv('ANALYTICS_REFRESH_INTERVAL', 60))
+    ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', 50000))
+    ANALYTICS_LOCK_TIMEOUT_MS = int(os.getenv('ANALYTICS_LOCK_TIMEOUT_MS', 500))
+    ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 60))
+
+    # 推薦模式：n8n (只用 N8N)、local (只用本地共同借閱模型)、blend (兩者混合)、
+    # fallback (預設，N8N 失敗或超過 RECOMMEND_N8N_TIMEOUT 秒沒回應時改用本地模型)
+    RECOMMEND_MODE = os.getenv('RECOMMEND_MODE', 'fallback')
+    RECOMMEND_N8N_TIMEOUT = float(os.getenv('RECOMMEND_N8N_TIMEOUT', 3))
+    RECOMMEND_LOCAL_LIMIT = int(os.getenv('RECOMMEND_LOCAL_LIMIT', 10))
+    # 本地共同借閱模型 (flask recommender build)：模型檔路徑、每本書保留的相似書數、最少共同借閱人數、
+    # 借閱超過幾本書的帳號不列入計算、背景更新間隔 (秒) 與 API 檢查模型檔更新的間隔 (秒)
+    RECOMMENDER_MODEL_PATH = os.getenv('RECOMMENDER_MODEL_PATH', '/tmp/library-recommender.npz')
+    RECOMMENDER_NEIGHBORS = int(os.getenv('RECOMMENDER_NEIGHBORS', 50))
+    RECOMMENDER_MIN_CO_COUNT = int(os.getenv('RECOMMENDER_MIN_CO_COUNT', 2))
+    RECOMMENDER_MAX_USER_ITEMS = int(os.getenv('RECOMMENDER_MAX_USER_ITEMS', 500))
+    RECOMMENDER_REFRESH_INTERVAL = int(os.getenv('RECOMMENDER_REFRESH_INTERVAL', 300))
+    RECOMMENDER_RELOAD_INTERVAL = int(os.getenv('RECOMMENDER_RELOAD_INTERVAL', 30))
+
+    # 封面圖片代理 (/api/covers/)：允許代理的主機 (爬蟲與目錄的 image_url 會改寫成代理網址，留空則不改寫)、
+    # 磁碟快取目錄與大小上限 (位元組)、下載逾時 (秒)、單張原圖大小上限，以及回應的快取時間 (秒)
+    COVER_PROXY_HOSTS = [host.strip() for host in os.getenv('COVER_PROXY_HOSTS', 'books-lib.ndhu.edu.tw').split(',') if host.strip()]
+    COVER_CACHE_DIR = os.getenv('COVER_CACHE_DIR', '/tmp/library-covers')
+    COVER_CACHE_MAX_BYTES = int(os.getenv('COVER_CACHE_MAX_BYTES', 512 << 20))
+    COVER_FETCH_TIMEOUT = float(os.getenv('COVER_FETCH_TIMEOUT', 10))
+    COVER_MAX_IMAGE_BYTES = int(os.getenv('COVER_MAX_IMAGE_BYTES', 5 << 20))
+    COVER_MAX_AGE = int(os.getenv('COVER_MAX_AGE', 30 * 24 * 3600))
+
+    # 應用層請求頻率限制：每個使用者 (沒有 JWT 時以 IP) 一個 token bucket，容量 RATE_LIMIT_BURST、每秒補充 RATE_LIMIT_RATE 個，
+    # 每個請求依路由扣除 RATE_LIMIT_COSTS 的成本 (沒列出的路由為 RATE_LIMIT_DEFAULT_COST，0 表示不限制)，
+    # 爬蟲路由每頁再加 RATE_LIMIT_PAGE_COSTS。有設定 RATE_LIMIT_REDIS_URL 時所有副本共用 bucket，否則各行程自己計算
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', '')
+    RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv('RATE_LIMIT_REDIS_TIMEOUT', 0.1))
+    RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', 2))
+    RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 60))
+    RATE_LIMIT_DEFAULT_COST = 1
+    RATE_LIMIT_COSTS = {
+        'POST /api/auth/login': 5,
+        'POST /api/auth/register': 5,
+        'POST /api/loans/': 2,
+        'POST /api/loans/import': 20,
+        'POST /api/search/basic': 2,
+        'POST /api/search/advanced': 5,
+        'POST /api/recommend/': 10,
+        'GET /api/scraper/scrape': 3,
+        'POST /api/scraper/jobs': 3,
+        # 封面由 nginx 的 coverlimit 另外限制；健康檢查給負載平衡器與 compose 使用
+        'GET /api/covers/': 0,
+        'GET /api/health': 0,
+        'GET /api/health/ready': 0,
+    }
+    RATE_LIMIT_PAGE_COSTS = {
+        'GET /api/scraper/scrape': 1,
+        'POST /api/scraper/jobs': 1,
+    }
+
+    # 回應壓縮：超過這個大小 (位元組) 的 JSON / 文字回應依 Accept-Encoding 以 brotli 或 gzip 壓縮
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+
+    # 管理員 (以逗號分隔的使用者 id)，可使用快取管理等 API
+    ADMIN_USER_IDS = {uid.strip() for uid in os.getenv('ADMIN_USER_IDS', '').split(',') if uid.strip()}
+
+
+class DevelopmentConfig(Config):
+    # 本機開發：小連線池，慢查詢門檻較低，及早發現問題
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=3, statement_timeout_ms=10000)
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 50))
+
+
+class ProductionConfig(Config):
+    # gevent worker 同時有大量請求，但大多在等上游而不佔連線；
+    # 兩個副本 x worker 數 x (pool_size + max_overflow) 要小於 Postgres 的 max_connections (預設 100)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=5, statement_timeout_ms=30000)
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config():
+    """依 APP_ENV 環境變數 (development / production，預設 production) 選擇設定類別"""
+    return config_by_name.get(os.getenv('APP_ENV', 'production'), ProductionConfig)
@@ -1,5 +1,6 @@
 from  .extensions import db
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import TSVECTOR
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -7,6 +8,8 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(100),unique=True,nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
+    # 借閱紀錄每次新增 (API 或批次匯入) 就加 1，/loans/my 的 ETag 由它組成
+    loans_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     def __repr__(self):
         return f'<User {self.username}>' 
 class Loan(db.Model):
@@ -15,7 +18,119 @@ class Loan(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     book_title=db.Column(db.String(255),nullable=False)
     book_isbn=db.Column(db.String(20))
+    # 由 book_isbn 正規化的 ISBN-13 (services/isbn.py)，與館藏目錄 / 爬蟲結果以完全相等比對
+    book_isbn13 = db.Column(db.String(13), index=True)
     loan_date=db.Column(db.DateTime,nullable=False,default=datetime.utcnow)
     return_date=db.Column(db.DateTime)
     user = db.relationship('User',backref=db.backref('loans',lazy=True))
+    __table_args__ = (
+        # /loans/my 分頁與推薦都是「某使用者依 loan_date DESC, id DESC」，Postgres 可反向掃描這個索引
+        db.Index('ix_loans_user_id_loan_date_id', 'user_id', 'loan_date', 'id'),
+    )
 
+class ScrapeCacheEntry(db.Model):
+    # 爬蟲結果的共用快取 (第二層)，api-1 / api-2 都讀寫這張表
+    __tablename__ = 'scrape_cache'
+    keyword = db.Column(db.String(255), primary_key=True)  # 正規化後的關鍵字
+    page = db.Column(db.Integer, primary_key=True)
+    books = db.Column(db.JSON, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+class ScrapeJob(db.Model):
+    # 非同步爬蟲工作佇列 (由 flask scrape-jobs worker 以 FOR UPDATE SKIP LOCKED 領取)，各副本共用
+    __tablename__ = 'scrape_jobs'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    keyword = db.Column(db.String(255), nullable=False)  # 正規化後的關鍵字 (相同的進行中工作只會有一個)
+    query = db.Column(db.String(255), nullable=False)  # 使用者輸入的關鍵字 (送給 OPAC)
+    pages = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued / running / succeeded / failed
+    pages_done = db.Column(db.Integer, nullable=False, default=0)
+    book_count = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('uq_scrape_jobs_active_keyword_pages', 'keyword', 'pages', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'running')")),
+        db.Index('ix_scrape_jobs_status_created_at', 'status', 'created_at'),
+    )
+class ScrapeJobPage(db.Model):
+    # 工作已完成的頁面 (進行中也可以分段讀取)
+    __tablename__ = 'scrape_job_pages'
+    job_id = db.Column(db.String(32), db.ForeignKey('scrape_jobs.id', ondelete='CASCADE'), primary_key=True)
+    page = db.Column(db.Integer, primary_key=True)
+    books = db.Column(db.JSON, nullable=False)
+class ScrapePageState(db.Model):
+    # 館藏目錄爬蟲每個結果頁上次的驗證資訊，重新爬取時發條件式請求，沒變的頁面不解析也不寫入
+    __tablename__ = 'scrape_page_states'
+    keyword = db.Column(db.String(255), primary_key=True)  # 正規化後的關鍵字
+    start = db.Column(db.Integer, primary_key=True)  # OPAC 的 start 參數 ((頁碼 - 1) * 10)
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    content_hash = db.Column(db.String(64), nullable=False)  # 正規化後 HTML 的 SHA-256
+    book_count = db.Column(db.Integer, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# --- 館藏目錄 (由背景爬蟲 flask catalog crawl 寫入) ---
+class Library(db.Model):
+    __tablename__ = 'libraries'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    address = db.Column(db.String(255))
+    phone = db.Column(db.String(20))
+    def __repr__(self):
+        return f'<Library {self.name}>'
+class Book(db.Model):
+    __tablename__ = 'books'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    isbn = db.Column(db.String(13), unique=True, nullable=False)  # 正規化後的 ISBN (只有數字與 X)
+    author = db.Column(db.String(100), nullable=False)
+    publication_date = db.Column(db.Date)
+    publisher = db.Column(db.String(100))
+    description = db.Column(db.Text)
+    category = db.Column(db.String(50))
+    language = db.Column(db.String(30))
+    cover_image_url = db.Column(db.String(265))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # 全文檢索用：CJK bigram 斷詞後的 tsvector (見 services/search_index.py)
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    availability = db.relationship('BookAvailability', backref='book', lazy='selectin')
+    __table_args__ = (
+        db.Index('ix_books_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_books_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+    def __repr__(self):
+        return f'<Book {self.isbn} {self.name}>'
+class BookAvailability(db.Model):
+    # 每本書在各館的館藏數 / 可借數 (來自 OPAC 搜尋結果的館藏狀態)
+    __tablename__ = 'book_availability'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    library_id = db.Column(db.Integer, db.ForeignKey('libraries.id'), primary_key=True)
+    total_copies = db.Column(db.Integer, nullable=False)
+    available_copies = db.Column(db.Integer, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    library = db.relationship('Library', lazy='joined')
+
+# --- 借閱統計彙總 (由 flask analytics refresh 依 loans.id 水位增量更新) ---
+class LoanDailyCount(db.Model):
+    # 每天每本書 (正規化 ISBN，沒有 ISBN 時用正規化書名) 的借閱次數
+    __tablename__ = 'loan_daily_counts'
+    day = db.Column(db.Date, primary_key=True)
+    book_key = db.Column(db.String(255), primary_key=True)
+    book_title = db.Column(db.String(255), nullable=False)  # 顯示用：最近一次看到的書名
+    book_isbn = db.Column(db.String(13))
+    count = db.Column(db.Integer, nullable=False)
+    __table_args__ = (
+        # 單本書的時間序列
+        db.Index('ix_loan_daily_counts_book_key_day', 'book_key', 'day'),
+    )
+class AnalyticsWatermark(db.Model):
+    # 各彙總表已處理到的 loans.id
+    __tablename__ = 'analytics_watermarks'
+    name = db.Column(db.String(50), primary_key=True)
+    last_loan_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1 @@
+# 共用服務層：放置與 HTTP 資源 (Resource) 無關、可被多個 API 或 CLI 重複使用的邏輯
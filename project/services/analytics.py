@@ -0,0 +1,187 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError
+
+from ..extensions import db
+from ..models import AnalyticsWatermark, Loan, LoanDailyCount
+from .isbn import normalize_isbn
+from .scrape_cache import normalize_keyword
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'loan_daily_counts'
+# 每個 INSERT ... ON CONFLICT 的資料列數 (5 個欄位，遠低於 65535 個參數的上限)
+_UPSERT_ROWS = 5000
+
+
+def title_key(title):
+    """沒有 ISBN 的書用正規化書名 (全形轉半形、合併空白、不分大小寫) 當作鍵"""
+    return normalize_keyword(title)[:255]
+
+
+def book_key(title, isbn):
+    """彙總用的書籍鍵：有 ISBN 用正規化 ISBN-13，否則用正規化書名 (isbn 可以是未正規化的使用者輸入)"""
+    return normalize_isbn(isbn) or title_key(title)
+
+
+def committed_loan_upper_bound(lock_timeout_ms):
+    """
+    回傳目前可以安全彙總到的 loans.id：取得 SHARE 鎖會等進行中的寫入交易 (新增借閱、批次匯入) 結束，
+    因此這個 max(id) 以下的資料都已提交，之後新增的 id 一定更大，不會漏算。
+    鎖只持有到讀完 max(id) 為止；等太久 (lock_timeout) 就拋 OperationalError，下一輪再試。
+    """
+    with db.engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+        conn.execute(text("LOCK TABLE loans IN SHARE MODE"))
+        return conn.execute(select(func.max(Loan.id))).scalar() or 0
+
+
+def _lock_watermark():
+    db.session.execute(insert(AnalyticsWatermark).values(
+        name=WATERMARK, last_loan_id=0, updated_at=datetime.utcnow()).on_conflict_do_nothing())
+    # 同時只會有一個 refresh 處理同一段 id (例如兩個副本都排了定期工作)
+    return db.session.execute(
+        select(AnalyticsWatermark).where(AnalyticsWatermark.name == WATERMARK).with_for_update()
+    ).scalar_one()
+
+
+def _upsert_counts(counts):
+    rows = [{'day': day, 'book_key': key, 'book_title': title[:255], 'book_isbn': isbn, 'count': count}
+            for (day, key), (count, title, isbn) in counts.items()]
+    for offset in range(0, len(rows), _UPSERT_ROWS):
+        stmt = insert(LoanDailyCount).values(rows[offset:offset + _UPSERT_ROWS])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[LoanDailyCount.day, LoanDailyCount.book_key],
+            set_={
+                'count': LoanDailyCount.count + stmt.excluded.count,
+                'book_title': stmt.excluded.book_title,
+                'book_isbn': func.coalesce(stmt.excluded.book_isbn, LoanDailyCount.book_isbn),
+            },
+        ))
+
+
+def refresh_daily_counts(batch_size=50000, lock_timeout_ms=500):
+    """
+    把水位之後新增的借閱紀錄累加進 loan_daily_counts，回傳處理的借閱筆數。
+    每批 (batch_size 個 id) 的累加與水位前進在同一個交易，中斷後重跑不會重複計算。
+    """
+    try:
+        upper = committed_loan_upper_bound(lock_timeout_ms)
+    except OperationalError:
+        logger.warning("等待 loans 寫入交易逾時，這一輪略過借閱統計更新")
+        return 0
+
+    processed = 0
+    while True:
+        watermark = _lock_watermark()
+        start = watermark.last_loan_id
+        if start >= upper:
+            db.session.commit()
+            return processed
+        end = min(start + batch_size, upper)
+        rows = db.session.execute(
+            select(Loan.loan_date, Loan.book_title, Loan.book_isbn13).where(Loan.id > start, Loan.id <= end)
+        ).all()
+
+        counts = {}
+        for loan_date, title, isbn in rows:
+            key = (loan_date.date(), isbn or title_key(title))
+            count, _, seen_isbn = counts.get(key, (0, None, None))
+            counts[key] = (count + 1, ' '.join(title.split()), isbn or seen_isbn)
+        _upsert_counts(counts)
+
+        watermark.last_loan_id = end
+        watermark.updated_at = datetime.utcnow()
+        db.session.commit()
+        processed += len(rows)
+
+
+def rebuild_daily_counts(batch_size=50000, lock_timeout_ms=500):
+    """清空彙總表並從頭重算 (修正資料或第一次部署時使用)"""
+    _lock_watermark()
+    db.session.execute(delete(LoanDailyCount))
+    db.session.execute(delete(AnalyticsWatermark).where(AnalyticsWatermark.name == WATERMARK))
+    db.session.commit()
+    return refresh_daily_counts(batch_size, lock_timeout_ms)
+
+
+class CirculationAnalytics:
+    """
+    從彙總表讀取熱門書籍與借閱趨勢。彙總表只在定期更新時改變，
+    查詢結果在行程內快取 cache_ttl 秒，熱門頁面不會每次都掃描彙總表。
+    日期以 UTC 計算 (loan_date 以 UTC 儲存)。
+    """
+
+    def __init__(self, cache_ttl):
+        self.cache = TTLCache(maxsize=256, ttl=cache_ttl)
+
+    @staticmethod
+    def _as_of():
+        return db.session.execute(
+            select(AnalyticsWatermark.updated_at).where(AnalyticsWatermark.name == WATERMARK)
+        ).scalar()
+
+    def popular(self, days, limit):
+        """最近 days 天 (含今天) 借閱次數最多的 limit 本書"""
+        cache_key = ('popular', days, limit)
+        result = self.cache.get(cache_key)
+        if result is None:
+            since = datetime.utcnow().date() - timedelta(days=days - 1)
+            total = func.sum(LoanDailyCount.count).label('total')
+            rows = db.session.execute(
+                select(LoanDailyCount.book_key, func.max(LoanDailyCount.book_title),
+                       func.max(LoanDailyCount.book_isbn), total)
+                .where(LoanDailyCount.day >= since)
+                .group_by(LoanDailyCount.book_key)
+                .order_by(total.desc(), LoanDailyCount.book_key)
+                .limit(limit)
+            ).all()
+            result = {
+                'days': days,
+                'as_of': self._as_of(),
+                'items': [{'book_key': key, 'title': title, 'isbn': isbn, 'count': int(count)}
+                          for key, title, isbn, count in rows],
+            }
+            self.cache.set(cache_key, result)
+        return result
+
+    def series(self, key, days):
+        """某本書最近 days 天每天的借閱次數 (沒有借閱的日子補 0)"""
+        cache_key = ('series', key, days)
+        result = self.cache.get(cache_key)
+        if result is None:
+            today = datetime.utcnow().date()
+            since = today - timedelta(days=days - 1)
+            rows = db.session.execute(
+                select(LoanDailyCount.day, LoanDailyCount.count, LoanDailyCount.book_title)
+                .where(LoanDailyCount.book_key == key, LoanDailyCount.day >= since)
+                .order_by(LoanDailyCount.day)
+            ).all()
+            by_day = {day: count for day, count, _ in rows}
+            result = {
+                'book_key': key,
+                'title': rows[-1].book_title if rows else None,
+                'as_of': self._as_of(),
+                'points': [{'date': since + timedelta(days=i), 'count': by_day.get(since + timedelta(days=i), 0)}
+                           for i in range(days)],
+            }
+            self.cache.set(cache_key, result)
+        return result
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics(config):
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = CirculationAnalytics(cache_ttl=config['ANALYTICS_CACHE_TTL'])
+    return _analytics
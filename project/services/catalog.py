@@ -0,0 +1,173 @@
+import logging
+import re
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from ..extensions import db
+from ..models import Book, BookAvailability, Library, ScrapePageState
+from .isbn import normalize_isbn
+from .ndhu_fetcher import PAGE_SIZE
+from .scrape_cache import normalize_keyword
+from .search_index import search_vector_expr
+
+logger = logging.getLogger(__name__)
+
+# 例如「總圖書館 3 本館藏 1 可借閱」或「總圖書館 : 3 本館藏 1 可借閱」
+_AVAILABILITY = re.compile(r'^(?P<library>.*?)\s*[:：]?\s*(?P<total>\d+)\s*本館藏\s*(?P<available>\d+)\s*可借閱')
+
+
+def parse_availability(text):
+    """把爬蟲的館藏狀態字串拆成 [(館名, 館藏數, 可借數), ...]"""
+    holdings = []
+    for part in (text or '').split('|'):
+        match = _AVAILABILITY.match(part.strip())
+        if match and match.group('library'):
+            holdings.append((match.group('library')[:100], int(match.group('total')), int(match.group('available'))))
+    return holdings
+
+
+def to_catalog_rows(records):
+    """
+    把爬蟲紀錄轉成以正規化 ISBN 為鍵的書目資料，同一批內重複的 ISBN 只保留最後一筆。
+    沒有 ISBN 的紀錄無法對應目錄，直接略過。
+    """
+    books = {}
+    for record in records:
+        isbn = normalize_isbn(record.get('isbn'))
+        if not isbn:
+            continue
+        books[isbn] = {
+            'isbn': isbn,
+            'name': record['title'][:255],
+            'author': record['author'][:100],
+            'cover_image_url': (record.get('image_url') or None) and record['image_url'][:265],
+            'holdings': parse_availability(record.get('availability')),
+        }
+    return list(books.values())
+
+
+def upsert_books(rows):
+    """
+    批次 upsert 書目與各館可借狀態，回傳寫入的書籍數。呼叫端負責 commit。
+    這批書在 OPAC 上已經沒有列出的館藏 (例如某館的複本全部移除) 會刪除對應的可借狀態。
+    """
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+
+    # 1. 圖書館：不存在才新增，再一次查回所有 id
+    library_names = sorted({name for row in rows for name, _, _ in row['holdings']})
+    library_ids = {}
+    if library_names:
+        db.session.execute(
+            insert(Library).values([{'name': name} for name in library_names]).on_conflict_do_nothing(index_elements=['name'])
+        )
+        library_ids = dict(db.session.execute(
+            select(Library.name, Library.id).where(Library.name.in_(library_names))
+        ).all())
+
+    # 2. 書目：依 ISBN upsert，並取回 book id
+    stmt = insert(Book).values([
+        {'isbn': row['isbn'], 'name': row['name'], 'author': row['author'],
+         'cover_image_url': row['cover_image_url'], 'updated_at': now,
+         'search_vector': search_vector_expr(row['name'], row['author'], row['isbn'])}
+        for row in rows
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['isbn'],
+        set_={'name': stmt.excluded.name, 'author': stmt.excluded.author,
+              'cover_image_url': stmt.excluded.cover_image_url, 'updated_at': stmt.excluded.updated_at,
+              'search_vector': stmt.excluded.search_vector},
+    ).returning(Book.isbn, Book.id)
+    book_ids = dict(db.session.execute(stmt).all())
+
+    # 3. 各館館藏數 / 可借數
+    availability = {}
+    for row in rows:
+        for name, total, available in row['holdings']:
+            availability[(book_ids[row['isbn']], library_ids[name])] = (total, available)
+    if availability:
+        stmt = insert(BookAvailability).values([
+            {'book_id': book_id, 'library_id': library_id, 'total_copies': total,
+             'available_copies': available, 'checked_at': now}
+            for (book_id, library_id), (total, available) in availability.items()
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['book_id', 'library_id'],
+            set_={'total_copies': stmt.excluded.total_copies,
+                  'available_copies': stmt.excluded.available_copies,
+                  'checked_at': stmt.excluded.checked_at},
+        ))
+    # 館藏狀態解析不出任何一館的書 (格式改變等) 不動，避免把還在的館藏清掉
+    seen_books = {book_id for book_id, _ in availability}
+    if seen_books:
+        db.session.execute(delete(BookAvailability).where(
+            BookAvailability.book_id.in_(seen_books),
+            tuple_(BookAvailability.book_id, BookAvailability.library_id).not_in(list(availability))))
+    return len(book_ids)
+
+
+def _load_page_states(keyword):
+    rows = db.session.execute(
+        select(ScrapePageState).where(ScrapePageState.keyword == keyword)
+    ).scalars().all()
+    return {row.start // PAGE_SIZE + 1: {'etag': row.etag, 'last_modified': row.last_modified,
+                                         'content_hash': row.content_hash, 'book_count': row.book_count}
+            for row in rows}
+
+
+def _save_page_states(keyword, states, changed):
+    """states: [(page_no, validators)]；changed 為 True 時一併更新 changed_at"""
+    if not states:
+        return
+    now = datetime.utcnow()
+    stmt = insert(ScrapePageState).values([
+        {'keyword': keyword, 'start': (page_no - 1) * PAGE_SIZE, 'etag': (v['etag'] or '')[:255] or None,
+         'last_modified': (v['last_modified'] or '')[:64] or None, 'content_hash': v['content_hash'],
+         'book_count': v['book_count'], 'checked_at': now, 'changed_at': now}
+        for page_no, v in states
+    ])
+    columns = ['etag', 'last_modified', 'content_hash', 'book_count', 'checked_at'] + (['changed_at'] if changed else [])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[ScrapePageState.keyword, ScrapePageState.start],
+        set_={column: stmt.excluded[column] for column in columns},
+    ))
+
+
+def crawl_keywords(fetcher, keywords, pages, full=False):
+    """
+    依序爬取每個關鍵字的前 pages 頁。每一頁都發條件式請求 (見 NDHUFetcher.fetch_page_if_changed)，
+    內容沒變的頁面不解析也不寫入，有變的頁面 upsert 一批並和該頁的驗證資訊在同一個交易 commit，
+    重新爬取的成本大致只和實際變動的頁數成正比。full 為 True 時忽略上次的驗證資訊，全部重新寫入。
+    單一關鍵字失敗不會中斷整個工作。回傳 {keyword: {'books': 寫入書籍數, 'changed': 頁數, 'unchanged': 頁數}}。
+    """
+    results = {}
+    for keyword in keywords:
+        key = normalize_keyword(keyword)[:255]
+        result = {'books': 0, 'changed': 0, 'unchanged': 0}
+        unchanged = []
+        started = time.monotonic()
+        try:
+            known = {} if full else _load_page_states(key)
+            db.session.commit()
+            for page_no, records, validators in fetcher.iter_page_changes(keyword, pages, known):
+                if records is None:
+                    unchanged.append((page_no, validators))
+                    result['unchanged'] += 1
+                    continue
+                result['books'] += upsert_books(to_catalog_rows(records))
+                _save_page_states(key, [(page_no, validators)], changed=True)
+                db.session.commit()
+                result['changed'] += 1
+            _save_page_states(key, unchanged, changed=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("館藏目錄爬取失敗: %s", keyword)
+        results[keyword] = result
+        logger.info("館藏目錄爬取 %s: %s 本，%s 頁有變動、%s 頁未變動 (%.1fs)", keyword, result['books'],
+                    result['changed'], result['unchanged'], time.monotonic() - started)
+    return results
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from ..extensions import db
+from ..models import Loan
+from .analytics import committed_loan_upper_bound, title_key
+from .isbn import normalize_isbn
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # 沒有 numpy / scipy 時只能使用 N8N 推薦
+    np = sparse = None
+
+logger = logging.getLogger(__name__)
+
+
+class RecommenderUnavailable(Exception):
+    """本地推薦模型不能用 (沒有安裝 numpy / scipy，或模型檔還沒建立)"""
+
+
+class CoBorrowBuilder:
+    """
+    從 loans 建立「共同借閱」的書籍相似度 (item-to-item)：
+    - 使用者 x 書籍的 0/1 稀疏矩陣 X，共同借閱次數 C = X^T X (對角線是每本書的借閱人數)
+    - 相似度 = C[i, j] / sqrt(C[i, i] * C[j, j]) (cosine)，每本書只保留最相似的 neighbors 本
+    常駐時只讀水位之後的新借閱，用受影響使用者的新舊借閱集合差量更新 C，不必重讀整張表。
+    借過超過 max_user_items 本書的帳號 (例如館員、測試或批次匯入用帳號) 不列入計算：
+    共同借閱組合數是借閱數的平方，而且這類帳號不代表個人的閱讀偏好。
+    """
+
+    def __init__(self, neighbors=50, min_co_count=2, max_user_items=500, batch_size=100000):
+        if sparse is None:
+            raise RecommenderUnavailable("需要安裝 numpy 與 scipy")
+        self.neighbors = neighbors
+        self.min_co_count = min_co_count
+        self.max_user_items = max_user_items
+        self.batch_size = batch_size
+        self.item_index = {}
+        self.keys = []
+        self.titles = []
+        self.user_items = {}
+        self.co_counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.last_loan_id = 0
+
+    def _item(self, title, isbn13):
+        key = isbn13 or title_key(title)
+        index = self.item_index.get(key)
+        if index is None:
+            index = self.item_index[key] = len(self.keys)
+            self.keys.append(key)
+            self.titles.append(' '.join(title.split()))
+        return index
+
+    def _row(self, items):
+        return sorted(items) if len(items) <= self.max_user_items else []
+
+    def _apply(self, pairs):
+        """pairs: [(user_id, item)]；回傳新增的 (使用者, 書籍) 組合數"""
+        added = {}
+        for user_id, item in pairs:
+            if item not in self.user_items.get(user_id, ()):
+                added.setdefault(user_id, set()).add(item)
+        if not added:
+            return 0
+
+        n_items = len(self.keys)
+        old_rows, new_rows = [], []
+        for user_id, items in added.items():
+            old = self.user_items.setdefault(user_id, set())
+            old_rows.append(self._row(old))
+            old |= items
+            new_rows.append(self._row(old))
+
+        def matrix(rows):
+            indptr = np.cumsum([0] + [len(row) for row in rows])
+            indices = np.fromiter((item for row in rows for item in row), dtype=np.int32, count=indptr[-1])
+            return sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                                     shape=(len(rows), n_items))
+
+        old_x, new_x = matrix(old_rows), matrix(new_rows)
+        co_counts = self.co_counts.copy()
+        co_counts.resize((n_items, n_items))
+        self.co_counts = (co_counts + (new_x.T @ new_x) - (old_x.T @ old_x)).tocsr()
+        self.co_counts.eliminate_zeros()
+        return sum(len(items) for items in added.values())
+
+    def update(self, lock_timeout_ms=500):
+        """讀入水位之後的借閱紀錄並更新共同借閱次數，回傳新增的 (使用者, 書籍) 組合數"""
+        try:
+            upper = committed_loan_upper_bound(lock_timeout_ms)
+        except OperationalError:
+            logger.warning("等待 loans 寫入交易逾時，這一輪略過推薦模型更新")
+            return 0
+        total = 0
+        while self.last_loan_id < upper:
+            end = min(self.last_loan_id + self.batch_size, upper)
+            rows = db.session.execute(
+                select(Loan.user_id, Loan.book_title, Loan.book_isbn13)
+                .where(Loan.id > self.last_loan_id, Loan.id <= end)
+            ).all()
+            db.session.commit()
+            total += self._apply([(user_id, self._item(title, isbn)) for user_id, title, isbn in rows])
+            self.last_loan_id = end
+        return total
+
+    def similarity(self):
+        """由共同借閱次數計算每本書的前 neighbors 本相似書 (CSR，float32)"""
+        counts = self.co_counts.diagonal().astype(np.float64)
+        coo = self.co_counts.tocoo()
+        keep = (coo.row != coo.col) & (coo.data >= self.min_co_count)
+        rows, cols = coo.row[keep], coo.col[keep]
+        scores = (coo.data[keep] / np.sqrt(counts[rows] * counts[cols])).astype(np.float32)
+        similar = sparse.csr_matrix((scores, (rows, cols)), shape=self.co_counts.shape)
+        for i in range(similar.shape[0]):
+            start, end = similar.indptr[i], similar.indptr[i + 1]
+            if end - start > self.neighbors:
+                row = similar.data[start:end]
+                row[np.argpartition(row, end - start - self.neighbors)[:end - start - self.neighbors]] = 0
+        similar.eliminate_zeros()
+        return similar
+
+    def save(self, path):
+        """寫出模型檔 (先寫暫存檔再改名，API 不會讀到寫一半的檔案)"""
+        similar = self.similarity()
+        meta = json.dumps({'keys': self.keys, 'titles': self.titles, 'last_loan_id': self.last_loan_id,
+                           'built_at': time.time()}, ensure_ascii=False).encode('utf-8')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, data=similar.data, indices=similar.indices, indptr=similar.indptr,
+                     shape=np.array(similar.shape), meta=np.frombuffer(meta, dtype=np.uint8))
+        os.replace(tmp_path, path)
+        return similar.nnz
+
+
+class CoBorrowModel:
+    def __init__(self, similar, keys, titles, last_loan_id, built_at):
+        self.similar = similar
+        self.keys = keys
+        self.titles = titles
+        self.index = {key: i for i, key in enumerate(keys)}
+        self.last_loan_id = last_loan_id
+        self.built_at = built_at
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as archive:
+            meta = json.loads(archive['meta'].tobytes().decode('utf-8'))
+            similar = sparse.csr_matrix((archive['data'], archive['indices'], archive['indptr']),
+                                        shape=tuple(archive['shape']))
+        return cls(similar, meta['keys'], meta['titles'], meta['last_loan_id'], meta['built_at'])
+
+
+class CoBorrowRecommender:
+    """
+    API 端：讀取 flask recommender build 產生的模型檔 (每 reload_interval 秒檢查一次是否有新版)，
+    以使用者最近的借閱紀錄加總相似度，越近的借閱權重越高。
+    """
+
+    def __init__(self, path, reload_interval):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._model = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def model(self):
+        if sparse is None:
+            raise RecommenderUnavailable("需要安裝 numpy 與 scipy")
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    try:
+                        mtime = os.stat(self.path).st_mtime
+                        if mtime != self._mtime:
+                            self._model, self._mtime = CoBorrowModel.load(self.path), mtime
+                    except FileNotFoundError:
+                        pass
+                    except (OSError, ValueError, KeyError):
+                        logger.exception("讀取推薦模型 %s 失敗", self.path)
+        if self._model is None:
+            raise RecommenderUnavailable(f"推薦模型 {self.path} 尚未建立")
+        return self._model
+
+    def recommend(self, history, limit=10):
+        """history: 由新到舊的 [(書名, 正規化 ISBN-13)]；回傳 [{'title', 'isbn', 'score'}]"""
+        model = self.model()
+        seen, weights = [], []
+        for position, (title, isbn13) in enumerate(history):
+            index = model.index.get(isbn13 or title_key(title))
+            if index is not None and index not in seen:
+                seen.append(index)
+                weights.append(0.9 ** position)
+        if not seen:
+            return []
+        scores = (sparse.csr_matrix(np.array(weights, dtype=np.float32)) @ model.similar[seen]).tocoo()
+        candidates = [(score, item) for item, score in zip(scores.col, scores.data) if item not in seen]
+        candidates.sort(key=lambda candidate: -candidate[0])
+        return [{'title': model.titles[item], 'isbn': model.keys[item] if normalize_isbn(model.keys[item]) == model.keys[item] else None,
+                 'score': round(float(score), 4)}
+                for score, item in candidates[:limit]]
+
+    def stats(self):
+        model = self._model
+        if model is None:
+            return {'loaded': False}
+        return {'loaded': True, 'items': len(model.keys), 'neighbors': int(model.similar.nnz),
+                'last_loan_id': model.last_loan_id, 'built_at': model.built_at}
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+
+
+def get_recommender(config):
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = CoBorrowRecommender(config['RECOMMENDER_MODEL_PATH'],
+                                                   config['RECOMMENDER_RELOAD_INTERVAL'])
+    return _recommender
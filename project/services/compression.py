@@ -0,0 +1,50 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # 沒有安裝 Brotli 時只提供 gzip
+    brotli = None
+
+COMPRESSIBLE = {'application/json', 'text/html', 'text/plain', 'text/csv'}
+
+
+def choose_encoding(accept_encodings):
+    """依 Accept-Encoding 的 q 值選擇 br 或 gzip (同分時優先 br)，都不接受時回傳 None"""
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = max(candidates, key=lambda encoding: accept_encodings[encoding])
+    return best if accept_encodings[best] > 0 else None
+
+
+def init_compression(app):
+    """
+    回應壓縮：JSON / 文字回應超過 COMPRESS_MIN_SIZE 位元組時，依 Accept-Encoding 以 brotli 或 gzip 壓縮。
+    串流回應 (NDJSON / SSE) 與已經有 Content-Encoding 的回應不處理；強 ETag 會加上編碼後綴。
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 206, 304)
+                or response.status_code < 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        if encoding == 'br':
+            data = brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+        else:
+            data = gzip.compress(data, compresslevel=app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(f"{tag}-{encoding}")
+        return response
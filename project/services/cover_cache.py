@@ -0,0 +1,229 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+
+import requests
+
+from .ndhu_fetcher import USER_AGENT
+from .ttl_cache import TTLCache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 沒有 Pillow 時只能提供原圖
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# 縮圖尺寸 (寬, 高)：圖片等比例縮小到放得進這個框，不放大、不裁切
+THUMB_SIZES = {'s': (96, 144), 'm': (200, 300), 'l': (400, 600)}
+# 只接受點陣圖 (SVG 可以夾帶 script，不能從我們的網域提供)
+IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+_MAX_REDIRECTS = 3
+_LOCK_STRIPES = 256
+
+
+class CoverRejected(Exception):
+    """不允許代理的網址或尺寸 (400)"""
+
+
+class CoverUnavailable(Exception):
+    """遠端取不到圖片或內容不是圖片 (502)"""
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CoverCache:
+    """
+    封面圖片代理的磁碟快取 (內容定址)：
+    - sources/<sha1(網址)>：這個網址對應的原圖雜湊與 Content-Type
+    - objects/<hh>/<sha256>：原圖，內容相同的圖片 (例如共用的「無封面」圖) 只存一份
+    - thumbs/<hh>/<sha256>-<尺寸>.jpg：縮圖，第一次要求該尺寸時產生
+    每次讀取會更新檔案的 mtime，總大小超過 max_bytes 時從最久沒用的檔案開始刪除，直到低於 90%。
+    同一個網址同時只會下載一次；下載失敗的網址 failure_ttl 秒內直接回報失敗。
+    """
+
+    def __init__(self, root, max_bytes, allowed_hosts, timeout=10, max_image_bytes=5 << 20, failure_ttl=300):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.allowed_hosts = set(allowed_hosts)
+        self.timeout = timeout
+        self.max_image_bytes = max_image_bytes
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._failures = TTLCache(maxsize=4096, ttl=failure_ttl)
+        self._size = None
+        self._size_lock = threading.Lock()
+
+    def allowed(self, url):
+        parts = urllib.parse.urlsplit(url or '')
+        return parts.scheme in ('http', 'https') and parts.hostname in self.allowed_hosts
+
+    def _path(self, kind, name, suffix=''):
+        return os.path.join(self.root, kind, name[:2], name + suffix)
+
+    def _read_source(self, url_key):
+        try:
+            with open(os.path.join(self.root, 'sources', url_key), encoding='ascii') as f:
+                digest, mimetype = f.read().split()
+        except (FileNotFoundError, ValueError):
+            return None, None
+        return digest, mimetype
+
+    def _download(self, url):
+        for _ in range(_MAX_REDIRECTS + 1):
+            if not self.allowed(url):
+                raise CoverUnavailable(f"不允許的圖片網址: {url}")
+            try:
+                response = self.session.get(url, timeout=self.timeout, stream=True, allow_redirects=False)
+            except requests.RequestException as e:
+                raise CoverUnavailable(f"下載封面失敗: {e}") from e
+            with response:
+                if response.is_redirect:
+                    url = urllib.parse.urljoin(url, response.headers['Location'])
+                    continue
+                mimetype = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                if response.status_code != 200 or mimetype not in IMAGE_TYPES:
+                    raise CoverUnavailable(f"封面回應 {response.status_code} {mimetype or '(沒有 Content-Type)'}")
+                data = response.raw.read(self.max_image_bytes + 1, decode_content=True)
+                if len(data) > self.max_image_bytes:
+                    raise CoverUnavailable("封面圖片太大")
+                return data, mimetype
+        raise CoverUnavailable("封面網址轉址次數過多")
+
+    def _thumbnail(self, data, size):
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img = ImageOps.exif_transpose(img).convert('RGB')
+                img.thumbnail(THUMB_SIZES[size])
+                buffer = io.BytesIO()
+                img.save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise CoverUnavailable(f"無法解析封面圖片: {e}") from e
+        return buffer.getvalue()
+
+    def get(self, url, size='m'):
+        """回傳 (檔案路徑, Content-Type, ETag)；size 為 THUMB_SIZES 的鍵或 orig (原圖)"""
+        if not self.allowed(url):
+            raise CoverRejected("只能代理允許的主機上的圖片")
+        if size != 'orig' and size not in THUMB_SIZES:
+            raise CoverRejected(f"size 只能是 {', '.join(THUMB_SIZES)} 或 orig")
+        if Image is None:
+            size = 'orig'
+        url_key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        with self._locks[int(url_key[:8], 16) % _LOCK_STRIPES]:
+            digest, mimetype = self._read_source(url_key)
+            object_path = digest and self._path('objects', digest)
+            data = None
+            if not digest or not os.path.exists(object_path):
+                if self._failures.get(url):
+                    raise CoverUnavailable("封面暫時無法取得")
+                try:
+                    data, mimetype = self._download(url)
+                except CoverUnavailable:
+                    self._failures.set(url, True)
+                    raise
+                digest = hashlib.sha256(data).hexdigest()
+                object_path = self._path('objects', digest)
+                if not os.path.exists(object_path):
+                    _atomic_write(object_path, data)
+                    self._account(len(data))
+                _atomic_write(os.path.join(self.root, 'sources', url_key), f"{digest} {mimetype}".encode('ascii'))
+
+            if size == 'orig':
+                path = object_path
+            else:
+                path, mimetype = self._path('thumbs', digest, f"-{size}.jpg"), 'image/jpeg'
+                if not os.path.exists(path):
+                    if data is None:
+                        with open(object_path, 'rb') as f:
+                            data = f.read()
+                    thumbnail = self._thumbnail(data, size)
+                    _atomic_write(path, thumbnail)
+                    self._account(len(thumbnail))
+            os.utime(path)
+        return path, mimetype, f"{digest}-{size}"
+
+    def _scan(self):
+        files = []
+        for kind in ('objects', 'thumbs'):
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, kind)):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _account(self, nbytes):
+        """記錄新寫入的大小，超過上限時淘汰最久沒用的檔案 (多個行程共用目錄時以重新掃描的實際大小為準)"""
+        with self._size_lock:
+            if self._size is None:
+                # 第一次寫入：掃描目錄取得實際大小 (已包含剛寫入的檔案)
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += nbytes
+            if self._size <= self.max_bytes:
+                return
+            files = sorted(self._scan())
+            total = sum(size for _, size, _ in files)
+            target = self.max_bytes * 0.9
+            evicted = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            self._size = total
+            logger.info("封面快取淘汰 %s 個檔案，目前 %.1f MB", evicted, total / (1 << 20))
+
+    def stats(self):
+        with self._size_lock:
+            size = self._size
+        return {'bytes': size, 'max_bytes': self.max_bytes, 'pillow': Image is not None}
+
+
+def proxied_cover_url(url, config, size='m'):
+    """允許代理的封面網址改寫成 /api/covers/?url=...；其他網址 (或空字串) 原樣回傳"""
+    if url and urllib.parse.urlsplit(url).hostname in config['COVER_PROXY_HOSTS']:
+        return f"/api/covers/?{urllib.parse.urlencode({'url': url, 'size': size})}"
+    return url
+
+
+_cover_cache = None
+_cover_cache_lock = threading.Lock()
+
+
+def get_cover_cache(config):
+    global _cover_cache
+    if _cover_cache is None:
+        with _cover_cache_lock:
+            if _cover_cache is None:
+                _cover_cache = CoverCache(
+                    root=config['COVER_CACHE_DIR'],
+                    max_bytes=config['COVER_CACHE_MAX_BYTES'],
+                    allowed_hosts=config['COVER_PROXY_HOSTS'],
+                    timeout=config['COVER_FETCH_TIMEOUT'],
+                    max_image_bytes=config['COVER_MAX_IMAGE_BYTES'],
+                )
+    return _cover_cache
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 背景重新驗證 (stale-while-revalidate) 共用的執行緒池
+_revalidate_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='gateway-revalidate')
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(unicodedata.normalize('NFKC', value).split()).casefold()
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def query_hash(payload):
+    """正規化 (全形半形、空白、大小寫、key 順序) 後的 payload 雜湊，作為快取與合併請求的鍵"""
+    canonical = json.dumps(_normalize(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同一個 key 同時只會有一個呼叫真正執行，其他併發的呼叫等待並共用它的結果 (或例外)"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """回傳 (result, shared)；shared 為 True 表示這次是搭別人的便車"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class UpstreamGateway:
+    """
+    上游 (N8N) 閘道：單一飛行合併 + 回應快取。
+    - 快取在 ttl 秒內為新鮮，直接回傳
+    - 過期但仍在 stale_ttl 內：先回傳舊資料，同時在背景重新向上游取得 (stale-while-revalidate)
+    - 其他情況：向上游取得，併發的相同查詢只會打一次上游
+    - 前景呼叫因呼叫端縮短的逾時放棄時，可用 warm() 在背景把同一個查詢做完並寫入快取
+    只有成功 (2xx) 的回應會被快取。
+    """
+
+    def __init__(self, name, ttl, stale_ttl, maxsize=1024):
+        self.name = name
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize, ttl + stale_ttl)
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._warming = set()
+        self._counters = {'hits': 0, 'stale_hits': 0, 'upstream_calls': 0,
+                          'coalesced': 0, 'revalidations': 0, 'warms': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _key(self, payload, scope):
+        return query_hash(payload) if scope is None else (scope, query_hash(payload))
+
+    def _store(self, key, body, status):
+        if 200 <= status < 300:
+            self.cache.set(key, (time.monotonic(), body, status))
+
+    def _fetch(self, key, fetch):
+        try:
+            (body, status), shared = self.flight.do(key, fetch)
+        except Exception:
+            self._count('errors')
+            raise
+        self._count('coalesced' if shared else 'upstream_calls')
+        if not shared:
+            self._store(key, body, status)
+        return body, status
+
+    def _revalidate(self, key, fetch):
+        try:
+            self._fetch(key, fetch)
+        except Exception:
+            logger.warning("%s 背景重新驗證失敗", self.name, exc_info=True)
+
+    def _warm(self, key, fetch):
+        try:
+            body, status = fetch()
+            self._store(key, body, status)
+        except Exception:
+            self._count('errors')
+            logger.warning("%s 背景預熱失敗", self.name, exc_info=True)
+        finally:
+            with self._lock:
+                self._warming.discard(key)
+
+    def call(self, payload, fetch, scope=None, revalidate=None):
+        """
+        fetch 是不帶參數、回傳 (body, status) 的函式；上游錯誤時應該拋出例外。
+        scope (例如使用者 id) 會成為快取鍵的一部分，之後可用 invalidate(scope) 整批清除。
+        revalidate 是背景重新驗證時使用的 fetch (例如不套用前景的縮短逾時)，預設與 fetch 相同。
+        """
+        key = self._key(payload, scope)
+        entry = self.cache.get(key)
+        if entry is not None:
+            stored_at, body, status = entry
+            if time.monotonic() - stored_at < self.ttl:
+                self._count('hits')
+            else:
+                self._count('stale_hits')
+                self._count('revalidations')
+                _revalidate_executor.submit(self._revalidate, key, revalidate or fetch)
+            return body, status
+        return self._fetch(key, fetch)
+
+    def warm(self, payload, fetch, scope=None):
+        """
+        在背景執行 fetch 並把結果寫入 (payload, scope) 的快取，不等待結果；同一個鍵已在預熱時不會重複送出。
+        前景呼叫用縮短的逾時放棄時使用，慢的上游回應才不會每次都白算、永遠進不了快取。
+        預熱不經過單一飛行：前景的併發呼叫不會排在這個長逾時的呼叫後面等待。
+        """
+        key = self._key(payload, scope)
+        with self._lock:
+            if key in self._warming:
+                return False
+            self._warming.add(key)
+            self._counters['warms'] += 1
+        _revalidate_executor.submit(self._warm, key, fetch)
+        return True
+
+    def invalidate(self, scope):
+        """清除某個 scope 的所有快取，回傳清除筆數 (只影響本行程)"""
+        return self.cache.delete_where(lambda key: isinstance(key, tuple) and key[0] == scope)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['cached_entries'] = len(self.cache)
+        return stats
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(name, config):
+    """依 Config.GATEWAY_ROUTES[name] 的 TTL 設定取得 (並建立) 行程內共用的閘道"""
+    gateway = _gateways.get(name)
+    if gateway is None:
+        with _gateways_lock:
+            gateway = _gateways.get(name)
+            if gateway is None:
+                route = config['GATEWAY_ROUTES'][name]
+                gateway = _gateways[name] = UpstreamGateway(name, route['ttl'], route['stale_ttl'],
+                                                              route.get('maxsize', 1024))
+    return gateway
+
+
+def gateway_stats():
+    return {name: gateway.stats() for name, gateway in _gateways.items()}
@@ -0,0 +1,33 @@
+import hashlib
+import json
+
+from flask import Response, request
+
+# 壓縮後的回應在 ETag 後面加上編碼 (見 services/compression.py)，比對 If-None-Match 時一併接受
+ENCODING_SUFFIXES = ('', '-gzip', '-br')
+
+
+def make_etag(*parts):
+    """由版本號、快取鍵等組成強 ETag (不含引號)"""
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def content_digest(data):
+    """JSON 內容的雜湊 (鍵排序、不跳脫中文)，同樣的內容不論來源都得到同樣的值"""
+    encoded = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def etag_matches(tag):
+    """請求的 If-None-Match 是否包含這個 ETag (未壓縮或壓縮後的版本)；If-None-Match 依規範用弱比對"""
+    if_none_match = request.if_none_match
+    return bool(if_none_match) and any(if_none_match.contains_weak(tag + suffix) for suffix in ENCODING_SUFFIXES)
+
+
+def not_modified(tag):
+    """304 回應：沒有本文，只帶 ETag"""
+    response = Response(status=304)
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,70 @@
+import re
+import unicodedata
+
+# 一段 ISBN：數字 (ISBN-10 最後一碼可以是 X)，中間可夾連字號
+_GROUP = re.compile(r'[0-9Xx]+(?:-[0-9Xx]+)*')
+
+
+def isbn13_check_digit(body12):
+    """ISBN-13 (EAN-13) 檢查碼：奇數位權重 1、偶數位權重 3"""
+    total = sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(body12))
+    return str((10 - total % 10) % 10)
+
+
+def _valid_isbn10(digits):
+    if len(digits) != 10 or not digits[:9].isdigit() or not (digits[9].isdigit() or digits[9] == 'X'):
+        return False
+    values = [int(d) for d in digits[:9]] + [10 if digits[9] == 'X' else int(digits[9])]
+    return sum((10 - i) * value for i, value in enumerate(values)) % 11 == 0
+
+
+def isbn10_to_13(isbn10):
+    """ISBN-10 轉 ISBN-13：前面加 978，重新計算檢查碼"""
+    body = '978' + isbn10[:9]
+    return body + isbn13_check_digit(body)
+
+
+def to_isbn13(digits):
+    """
+    把去掉連字號的 10 / 13 碼轉成 ISBN-13，檢查碼不對或不是書籍的 978 / 979 開頭時回傳 None。
+    """
+    digits = digits.upper()
+    if len(digits) == 13:
+        if digits.isdigit() and digits[:3] in ('978', '979') and digits[12] == isbn13_check_digit(digits[:12]):
+            return digits
+        return None
+    if _valid_isbn10(digits):
+        return isbn10_to_13(digits)
+    return None
+
+
+def split_isbns(raw):
+    """
+    從任意字串 (例如爬蟲的 "978-986-476-123-4 (平裝) ; 986-476-123-X" 或 "無 ISBN") 取出所有有效的 ISBN，
+    一律轉成 ISBN-13，去掉重複並保持原本的順序。
+    以空白分段書寫的 ISBN (978 986 476 123 4) 會把相鄰的片段接起來再檢查。
+    """
+    found = []
+    pending, pending_end = '', None
+    text = unicodedata.normalize('NFKC', raw or '')
+    for match in _GROUP.finditer(text):
+        digits = match.group().replace('-', '').upper()
+        joined = pending + digits if pending and not text[pending_end:match.start()].strip() else ''
+        isbn = to_isbn13(digits) or (to_isbn13(joined) if joined else None)
+        if isbn:
+            if isbn not in found:
+                found.append(isbn)
+            pending = ''
+        else:
+            pending = joined if joined and len(joined) < 13 else digits
+            pending_end = match.end()
+    return found
+
+
+def normalize_isbn(raw):
+    """
+    取出字串中的第一個有效 ISBN，回傳 13 碼 (ISBN-10 會轉成 ISBN-13)；找不到時回傳 None。
+    借閱紀錄、館藏目錄、爬蟲結果都用這個格式比對，查詢一律是完全相等的比對。
+    """
+    found = split_isbns(raw)
+    return found[0] if found else None
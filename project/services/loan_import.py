@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models import User
+from .isbn import normalize_isbn
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+COLUMNS = ('user_id', 'book_title', 'book_isbn', 'loan_date', 'return_date')
+# 寫入時多一欄由 book_isbn 算出的正規化 ISBN-13
+_DB_COLUMNS = COLUMNS + ('book_isbn13',)
+_COPY_SQL = f"COPY loans ({', '.join(_DB_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+_INSERT_SQL = f"INSERT INTO loans ({', '.join(_DB_COLUMNS)}) VALUES %s"
+
+
+def guess_format(filename=None, content_type=None):
+    """依副檔名或 Content-Type 判斷檔案格式，判斷不出來時回傳 None"""
+    name = (filename or '').lower()
+    ctype = (content_type or '').split(';')[0].strip().lower()
+    if name.endswith(('.ndjson', '.jsonl')) or ctype in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if name.endswith('.csv') or ctype in ('text/csv', 'application/csv'):
+        return 'csv'
+    return None
+
+
+class _RawReader(io.RawIOBase):
+    """把只有 read() 的串流 (例如 WSGI 伺服器的請求本文) 包成 io 模組認得的 raw stream"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_records(stream, fmt):
+    """
+    逐行讀取二進位串流，產生 (行號, 欄位值 tuple)，tuple 依 COLUMNS 順序；整個檔案不會一次讀進記憶體。
+    無法解析的行產生 (行號, None)。
+    """
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(_RawReader(stream), buffer_size=1 << 16)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.reader(text)
+        header = [name.strip() for name in next(reader, [])]
+        positions = [header.index(name) if name in header else None for name in COLUMNS]
+        width = len(header)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != width:
+                yield reader.line_num, None
+                continue
+            yield reader.line_num, tuple(row[i] if i is not None else None for i in positions)
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                yield line_no, tuple(record.get(name) for name in COLUMNS)
+            else:
+                yield line_no, None
+    else:
+        raise ValueError(f"不支援的格式: {fmt}")
+
+
+def _parse_datetime(value, field, required):
+    if value is None or value == '':
+        if required:
+            raise ValueError(f"缺少 {field}")
+        return None
+    text = str(value).strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"{field} 不是 ISO 8601 時間: {value}") from None
+    if parsed.tzinfo is not None:
+        # 資料表存的是 UTC 的 naive datetime (與 datetime.utcnow 一致)
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _text(value, field):
+    """把欄位值轉成去除前後空白的字串；NDJSON 的數字 (例如未加引號的 ISBN) 直接轉字串，其他型別拒絕"""
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"{field} 不是字串: {value!r}")
+    return str(value).strip()
+
+
+def validate_record(values):
+    """
+    檢查一筆 iter_records 產生的欄位值並轉型，最後附上正規化的 ISBN-13 (依 _DB_COLUMNS 順序)；
+    不合格時拋出 ValueError (訊息即拒絕原因)
+    """
+    if values is None:
+        raise ValueError("無法解析的資料列")
+    user_id, title, isbn, loan_date, return_date = values
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"user_id 不是整數: {user_id}") from None
+    title = _text(title, 'book_title')
+    if not title:
+        raise ValueError("缺少 book_title")
+    if len(title) > 255:
+        raise ValueError("book_title 超過 255 字")
+    isbn = _text(isbn, 'book_isbn') or None
+    if isbn and len(isbn) > 20:
+        raise ValueError("book_isbn 超過 20 字")
+    loan_date = _parse_datetime(loan_date, 'loan_date', required=True)
+    return_date = _parse_datetime(return_date, 'return_date', required=False)
+    if return_date and return_date < loan_date:
+        raise ValueError("return_date 早於 loan_date")
+    return user_id, title, isbn, loan_date, return_date, normalize_isbn(isbn)
+
+
+class _UserIds:
+    """記住已確認存在 / 不存在的使用者 id，每個 chunk 只查一次還沒看過的 id"""
+
+    def __init__(self):
+        self.known = set()
+        self.missing = set()
+
+    def resolve(self, user_ids):
+        unseen = set(user_ids) - self.known - self.missing
+        if unseen:
+            found = set(db.session.execute(select(User.id).where(User.id.in_(unseen))).scalars())
+            self.known |= found
+            self.missing |= unseen - found
+        db.session.close()
+
+
+def _write_rows(cursor, rows):
+    if psycopg2.extensions.get_wait_callback() is not None:
+        # gevent worker (psycogreen) 底下 psycopg2 不支援 COPY，改用多列 VALUES 的批次 INSERT
+        execute_values(cursor, _INSERT_SQL, rows, page_size=1000)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for user_id, title, isbn, loan_date, return_date, isbn13 in rows:
+        # 空欄位 (未加引號) 在 COPY CSV 中就是 NULL
+        writer.writerow((user_id, title, isbn or '', loan_date.isoformat(' '),
+                         return_date.isoformat(' ') if return_date else '', isbn13 or ''))
+    buffer.seek(0)
+    cursor.copy_expert(_COPY_SQL, buffer, size=1 << 20)
+
+
+def _bump_loans_versions(cursor, user_ids):
+    """匯入的借閱紀錄 commit 前，讓這些使用者的 /loans/my ETag 失效"""
+    if user_ids:
+        cursor.execute("UPDATE users SET loans_version = loans_version + 1 WHERE id = ANY(%s)", (sorted(user_ids),))
+        user_ids.clear()
+
+
+def import_loans(records, chunk_size=10000, commit_rows=200000, on_reject=None, max_reported=100):
+    """
+    批次匯入借閱紀錄。records 為 (行號, 欄位值) 的 iterable (見 iter_records)。
+    每 chunk_size 筆驗證一次並用 COPY (gevent 底下改用批次 INSERT) 寫入，每累積 commit_rows 筆 commit 一次；
+    不合格的資料列會略過並呼叫 on_reject(行號, 原始紀錄, 原因)，報告中只保留前 max_reported 筆。
+    中途發生錯誤時只回滾目前的交易，先前已 commit 的資料會保留 (報告中的 imported 為已 commit 的筆數)。
+    """
+    report = {'imported': 0, 'rejected': 0, 'rejections': []}
+    users = _UserIds()
+
+    def reject(line_no, values, error):
+        report['rejected'] += 1
+        if len(report['rejections']) < max_reported:
+            report['rejections'].append({'line': line_no, 'error': error})
+        if on_reject is not None:
+            on_reject(line_no, dict(zip(COLUMNS, values)) if values is not None else None, error)
+
+    raw = db.engine.raw_connection()
+    # 背景執行緒寫入上一批的同時，主執行緒繼續解析與驗證下一批 (同時最多一批在寫)
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='loan-import')
+    in_flight = None
+    pending = 0
+    touched = set()
+    try:
+        cursor = raw.cursor()
+
+        def wait_for_writer():
+            nonlocal in_flight
+            if in_flight is not None:
+                in_flight.result()
+                in_flight = None
+
+        def flush(chunk):
+            nonlocal in_flight, pending
+            users.resolve(row[0] for _, _, row in chunk)
+            rows = []
+            for line_no, values, row in chunk:
+                if row[0] in users.known:
+                    rows.append(row)
+                else:
+                    reject(line_no, values, f"找不到使用者 {row[0]}")
+            wait_for_writer()
+            if pending >= commit_rows:
+                _bump_loans_versions(cursor, touched)
+                raw.commit()
+                report['imported'] += pending
+                pending = 0
+            if rows:
+                in_flight = writer.submit(_write_rows, cursor, rows)
+                pending += len(rows)
+                touched.update(row[0] for row in rows)
+
+        chunk = []
+        for line_no, values in records:
+            try:
+                chunk.append((line_no, values, validate_record(values)))
+            except ValueError as e:
+                reject(line_no, values, str(e))
+                continue
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+        wait_for_writer()
+        _bump_loans_versions(cursor, touched)
+        raw.commit()
+        report['imported'] += pending
+    except Exception:
+        if in_flight is not None:
+            in_flight.exception()
+        raw.rollback()
+        logger.exception("借閱紀錄匯入中斷 (已 commit %s 筆)", report['imported'])
+        raise
+    finally:
+        writer.shutdown()
+        raw.close()
+    return report
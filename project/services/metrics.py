@@ -0,0 +1,82 @@
+import os
+import time
+import urllib.parse
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# 秒；涵蓋快取命中 (毫秒級) 到 N8N RAG / 多頁爬蟲 (數秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'API 請求處理時間 (到回應標頭送出為止)',
+    ['namespace', 'route', 'method'], buckets=LATENCY_BUCKETS)
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'API 請求數 (依狀態碼)', ['namespace', 'route', 'method', 'status'])
+
+UPSTREAM_SECONDS = Histogram(
+    'upstream_request_duration_seconds', '上游 (N8N) 單次 HTTP 請求時間', ['target'], buckets=LATENCY_BUCKETS)
+UPSTREAM_ERRORS = Counter(
+    'upstream_errors_total', '上游 (N8N) 錯誤數', ['target', 'kind'])
+
+SCRAPER_PAGE_FETCH_SECONDS = Histogram(
+    'scraper_page_fetch_seconds', '東華 OPAC 單頁抓取時間', buckets=LATENCY_BUCKETS)
+SCRAPER_PAGES_PER_REQUEST = Histogram(
+    'scraper_pages_per_request', '每次爬蟲呼叫交出的頁數 (含快取命中)', buckets=(0, 1, 2, 3, 5, 10, 20, 50))
+
+BCRYPT_SECONDS = Histogram(
+    'bcrypt_duration_seconds', 'bcrypt 計算時間 (不含排隊)', ['operation'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+BCRYPT_REJECTED = Counter(
+    'bcrypt_rejected_total', 'bcrypt 佇列已滿而回 503 的次數')
+
+RATE_LIMITED = Counter(
+    'rate_limited_total', '超過請求頻率限制而回 429 的次數', ['namespace', 'route', 'method'])
+
+
+def upstream_target(url):
+    """上游的標籤值：主機 + 路徑 (不含查詢字串，避免標籤數量無限增加)"""
+    parts = urllib.parse.urlsplit(url or '')
+    return f"{parts.netloc}{parts.path}" or 'unknown'
+
+
+def _route_labels():
+    rule = request.url_rule.rule if request.url_rule else '(unmatched)'
+    segments = rule.strip('/').split('/')
+    # /api/<namespace>/... 對應 Flask-RESTX 的 Namespace (auth, loans, recommend, search, scraper ...)
+    namespace = segments[1] if len(segments) > 1 and segments[0] == 'api' else 'other'
+    return namespace, rule, request.method
+
+
+def _registry():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # gunicorn 多個 worker：每個行程把數值寫到共用目錄，輸出時再合併
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def init_metrics(app):
+    """
+    請求計時層：每個請求依 namespace / 路由 / 方法記錄延遲直方圖與狀態碼計數，並提供 GET /metrics。
+    /metrics 不在 /api 底下，nginx 不會對外轉發，只給同一網路內的 Prometheus 抓取。
+    """
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is not None and request.endpoint != 'metrics':
+            namespace, route, method = _route_labels()
+            HTTP_REQUEST_SECONDS.labels(namespace, route, method).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(namespace, route, method, str(response.status_code)).inc()
+        return response
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics():
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import SCRAPER_PAGE_FETCH_SECONDS, SCRAPER_PAGES_PER_REQUEST
+from .ndhu_parser import parse_results_fast
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+PAGE_SIZE = 10  # OPAC 每一頁固定 10 筆
+
+# 計算內容雜湊前拿掉每次都會變、但和搜尋結果無關的部分 (script / style / 註解 / 隱藏欄位 / session id)，再合併空白
+_VOLATILE = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|<input\b[^>]*type=["\']?hidden[^>]*>'
+                       r'|;jsessionid=[0-9A-Za-z._-]+', re.IGNORECASE | re.DOTALL)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def content_hash(html):
+    """結果頁正規化後的 SHA-256，OPAC 沒有提供 ETag / Last-Modified 時用來判斷內容有沒有變"""
+    normalized = _WHITESPACE.sub(' ', _VOLATILE.sub('', html)).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class HostLimiter:
+    """
+    單一主機的禮貌限流器：
+    - 同時最多 max_concurrency 個請求
+    - 兩次「發出請求」之間至少間隔 delay 秒
+    - delay 會自我調整：伺服器回 429/503 或逾時就加倍，正常回應則慢慢縮回 min_delay
+    """
+
+    def __init__(self, max_concurrency, min_delay, max_delay):
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min_delay
+
+    def __enter__(self):
+        self._slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.delay
+        if start_at > now:
+            time.sleep(start_at - now)
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+        return False
+
+    def backoff(self, retry_after=None):
+        with self._lock:
+            self.delay = min(self.max_delay, max(self.delay * 2, self.min_delay or 0.1, retry_after or 0))
+            self._next_start = max(self._next_start, time.monotonic() + self.delay)
+
+    def relax(self):
+        with self._lock:
+            self.delay = max(self.min_delay, self.delay * 0.8)
+
+
+class NDHUFetcher:
+    """
+    東華 OPAC 翻頁抓取引擎。
+    整個行程共用一個 keep-alive Session 與執行緒池，多頁會平行抓取，
+    但同一時間對 OPAC 的連線數與請求間隔由 HostLimiter 控制。
+    """
+
+    def __init__(self, base_url, max_concurrency=4, min_delay=0.1, max_delay=5.0, timeout=10, max_workers=16):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.limiter = HostLimiter(max_concurrency, min_delay, max_delay)
+        self.prefetch = max_concurrency * 2
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ndhu-fetch')
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def page_url(self, keyword, page):
+        encoded_keyword = urllib.parse.quote(keyword)
+        start_index = page * PAGE_SIZE  # 每一頁跳 10 筆
+        return f"{self.base_url}/toread/opac/search?q={encoded_keyword}&max=&view=CONTENT&level=all&material_type=all&location=&start={start_index}"
+
+    def _get(self, keyword, page, headers=None):
+        url = self.page_url(keyword, page)
+        with self.limiter:
+            logger.debug("正在爬取第 %s 頁: %s", page + 1, url)
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.exceptions.Timeout:
+                self.limiter.backoff()
+                raise
+            finally:
+                SCRAPER_PAGE_FETCH_SECONDS.observe(time.perf_counter() - started)
+        if response.status_code in (429, 503):
+            self.limiter.backoff(_retry_after(response))
+        else:
+            self.limiter.relax()
+        response.raise_for_status()
+        return response
+
+    def fetch_html(self, keyword, page):
+        """抓取單一頁 (page 從 0 開始) 的原始 HTML"""
+        return self._get(keyword, page).text
+
+    def fetch_page(self, keyword, page):
+        """抓取並解析單一頁，回傳該頁的書籍列表"""
+        return parse_results_fast(self.fetch_html(keyword, page), page + 1)
+
+    def fetch_page_if_changed(self, keyword, page, known=None):
+        """
+        條件式抓取單一頁。known 是上次的驗證資訊 {'etag', 'last_modified', 'content_hash'}：
+        有 ETag / Last-Modified 就帶 If-None-Match / If-Modified-Since，OPAC 回 304 時不下載內容；
+        回 200 但正規化後的內容雜湊和上次相同，也視為沒變，不做解析。
+        回傳 (books, validators)，沒變時 books 為 None。
+        """
+        known = known or {}
+        headers = {}
+        if known.get('etag'):
+            headers['If-None-Match'] = known['etag']
+        if known.get('last_modified'):
+            headers['If-Modified-Since'] = known['last_modified']
+        response = self._get(keyword, page, headers)
+        if response.status_code == 304:
+            return None, dict(known)
+        html = response.text
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash(html),
+        }
+        if validators['content_hash'] == known.get('content_hash'):
+            return None, validators
+        return parse_results_fast(html, page + 1), validators
+
+    def _ordered(self, fn, pages):
+        """
+        依 pages 的順序產出 (page, fn(page) 的結果)，背景只預先送出 prefetch 頁，
+        每交出一頁才補送下一頁，頁數再多記憶體用量也固定；提早結束時取消尚未開始的頁面。
+        """
+        pages = iter(pages)
+        futures = {}
+        order = []
+
+        def submit_next():
+            page = next(pages, None)
+            if page is not None:
+                futures[page] = self.executor.submit(fn, page)
+                order.append(page)
+
+        for _ in range(self.prefetch):
+            submit_next()
+        try:
+            while order:
+                page = order.pop(0)
+                result = futures.pop(page).result()
+                submit_next()
+                yield page, result
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+    def iter_pages(self, keyword, pages, cache=None):
+        """
+        平行抓取前 pages 頁，並「依頁碼順序」逐頁產出 (page_no, books)。
+        某一頁沒有資料或不滿 PAGE_SIZE 筆 (已是最後一頁) 時，取消後面尚未開始的頁面並提早結束。
+        有傳入 cache (ScrapeCache) 時，命中的頁面不會對 OPAC 發出請求，新抓到的頁面 (包含空頁) 會寫回快取。
+        """
+        cached = cache.get_many(keyword, range(1, pages + 1)) if cache else {}
+        # 快取裡已知是最後一頁 (空頁或不滿一頁) 的話，它後面的頁面都不用抓了
+        last_page = min([page_no for page_no, books in cached.items() if len(books) < PAGE_SIZE] + [pages])
+        fetched = self._ordered(lambda page: self.fetch_page(keyword, page),
+                                (page for page in range(last_page) if page + 1 not in cached))
+        served = 0
+        try:
+            for page in range(last_page):
+                page_no = page + 1
+                if page_no in cached:
+                    books = cached[page_no]
+                else:
+                    _, books = next(fetched)
+                    if cache:
+                        cache.set(keyword, page_no, books)
+                if not books:
+                    break
+                served += 1
+                yield page_no, books
+                if len(books) < PAGE_SIZE:
+                    break
+        finally:
+            SCRAPER_PAGES_PER_REQUEST.observe(served)
+            fetched.close()
+
+    def iter_page_changes(self, keyword, pages, known=None):
+        """
+        給定期重新爬取用：依頁碼順序產出 (page_no, books, validators)，沒變的頁面 books 為 None。
+        known 是 {page_no: 上次的驗證資訊 (含 book_count)}；遇到空頁或不滿一頁 (不論有沒有變) 就結束。
+        """
+        known = known or {}
+        fetched = self._ordered(lambda page: self.fetch_page_if_changed(keyword, page, known.get(page + 1)),
+                                range(pages))
+        try:
+            for page, (books, validators) in fetched:
+                page_no = page + 1
+                validators['book_count'] = len(books) if books is not None else known[page_no]['book_count']
+                yield page_no, books, validators
+                if validators['book_count'] < PAGE_SIZE:
+                    break
+        finally:
+            fetched.close()
+
+    def fetch_all(self, keyword, pages, cache=None):
+        all_books = []
+        for _, books in self.iter_pages(keyword, pages, cache=cache):
+            all_books.extend(books)
+        return all_books
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return None
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher(config):
+    """取得行程內共用的 NDHUFetcher (第一次使用時才建立，避免 fork 前就開好連線)"""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = NDHUFetcher(
+                    base_url=config['NDHU_OPAC_BASE_URL'],
+                    max_concurrency=config['SCRAPER_MAX_CONCURRENCY'],
+                    min_delay=config['SCRAPER_MIN_DELAY'],
+                    max_delay=config['SCRAPER_MAX_DELAY'],
+                    timeout=config['SCRAPER_TIMEOUT'],
+                )
+    return _fetcher
@@ -0,0 +1,125 @@
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from .isbn import split_isbns
+
+NDHU_HOST = 'https://books-lib.ndhu.edu.tw'
+
+
+def parse_results(html, page_no):
+    """將一頁東華 OPAC 搜尋結果解析成書籍列表 (沒有結果時回傳空列表)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.find_all('li', class_='is_img')
+
+    books = []
+    for item in items:
+        title_container = item.find('li', class_='reslt_item_head')
+        title = title_container.find('a').text.strip() if title_container and title_container.find('a') else "未知書名"
+
+        author_tag = item.find('span', class_='crs_author')
+        author = author_tag.text.strip() if author_tag else "未知作者"
+
+        img_container = item.find('div', class_='img_reslt')
+        img_tag = img_container.find('img') if img_container else None
+        if img_tag and img_tag.has_attr('src'):
+            raw_url = img_tag['src']
+            # 如果是相對路徑，補上東華大學的網域
+            if raw_url.startswith('/'):
+                image_url = f"{NDHU_HOST}{raw_url}"
+            else:
+                image_url = raw_url
+        else:
+            image_url = ""
+
+        # ISBN 處理：正規化成 ISBN-13 (一筆書目可能列出多個 ISBN，例如平裝 / 精裝)
+        isbns = []
+        isbn_span = item.find('span', class_='crs_isbn')
+        if isbn_span and isbn_span.parent:
+            isbns = split_isbns(isbn_span.parent.text.replace(isbn_span.text, ''))
+
+        # 館藏狀態處理
+        avail_container = item.find('li', class_='avail_inf')
+        availability = " | ".join([a.text.strip() for a in avail_container.find_all('a')]) if avail_container else "未知狀態"
+
+        books.append({
+            "title": title,
+            "author": author,
+            "image_url": image_url,
+            "isbn": isbns[0] if isbns else None,
+            "isbns": isbns,
+            "availability": availability,
+            "source_page": page_no  # 標記這是第幾頁抓到的
+        })
+    return books
+
+
+def _has_class(el, name):
+    return name in (el.get('class') or '').split()
+
+
+def _text(el):
+    return ''.join(el.itertext())
+
+
+def _find(el, tag, cls):
+    for child in el.iter(tag):
+        if _has_class(child, cls):
+            return child
+    return None
+
+
+def _result_items(parser):
+    return (el for _, el in parser.read_events() if _has_class(el, 'is_img'))
+
+
+def _iter_result_items(html, chunk_size=16384):
+    """分段餵給 pull parser，每段餵完就先交出已經完整關閉的結果區塊"""
+    if not html.strip():
+        return
+    parser = etree.HTMLPullParser(events=('end',), tag='li')
+    for offset in range(0, len(html), chunk_size):
+        parser.feed(html[offset:offset + chunk_size])
+        yield from _result_items(parser)
+    parser.close()
+    yield from _result_items(parser)
+
+
+def iter_results_fast(html, page_no):
+    """
+    快速解析路徑：以 lxml 的 pull parser 串流掃描，只在每個 <li class="is_img"> 結束時
+    萃取欄位，處理完立刻清掉該節點，不保留整份文件樹。
+    產出的書籍資料與 parse_results 完全相同。
+    """
+    for item in _iter_result_items(html):
+        title_container = _find(item, 'li', 'reslt_item_head')
+        title_link = title_container.find('.//a') if title_container is not None else None
+        author_tag = _find(item, 'span', 'crs_author')
+        img_container = _find(item, 'div', 'img_reslt')
+        img_tag = img_container.find('.//img') if img_container is not None else None
+        isbn_span = _find(item, 'span', 'crs_isbn')
+        avail_container = _find(item, 'li', 'avail_inf')
+
+        raw_url = img_tag.get('src') if img_tag is not None else None
+        if raw_url is not None:
+            image_url = f"{NDHU_HOST}{raw_url}" if raw_url.startswith('/') else raw_url
+        else:
+            image_url = ""
+
+        isbns = []
+        if isbn_span is not None and isbn_span.getparent() is not None:
+            isbns = split_isbns(_text(isbn_span.getparent()).replace(_text(isbn_span), ''))
+
+        yield {
+            "title": _text(title_link).strip() if title_link is not None else "未知書名",
+            "author": _text(author_tag).strip() if author_tag is not None else "未知作者",
+            "image_url": image_url,
+            "isbn": isbns[0] if isbns else None,
+            "isbns": isbns,
+            "availability": " | ".join(_text(a).strip() for a in avail_container.iter('a')) if avail_container is not None else "未知狀態",
+            "source_page": page_no
+        }
+        item.clear()
+
+
+def parse_results_fast(html, page_no):
+    return list(iter_results_fast(html, page_no))
@@ -0,0 +1,19 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(loan_date, row_id):
+    """把最後一筆的 (loan_date, id) 編成不透明的游標字串 (URL-safe)"""
+    raw = json.dumps([loan_date.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解回 (loan_date, id)；格式不正確時拋出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        loan_date, row_id = json.loads(raw)
+        return datetime.fromisoformat(loan_date), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("無效的游標") from e
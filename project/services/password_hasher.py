@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..extensions import bcrypt
+from .metrics import BCRYPT_REJECTED, BCRYPT_SECONDS
+
+
+class HasherBusy(Exception):
+    """bcrypt 工作佇列已滿 (例如開學登入尖峰)，呼叫端應該快速回應 503"""
+
+    def __init__(self, pending):
+        super().__init__(f"密碼驗證忙碌中 (排隊 {pending} 筆)")
+        self.pending = pending
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def hash_rounds(password_hash):
+    """從 bcrypt 雜湊 ($2b$12$...) 取出工作因子，格式不對時回傳 None"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    把 bcrypt (刻意很慢的 CPU 運算) 移到固定大小的執行緒池：
+    - 同時最多 max_workers 個 bcrypt 在算 (bcrypt 會釋放 GIL，可以用滿多核心)
+    - 另外最多 max_queue 個在排隊，再多就直接拋出 HasherBusy，請求不會卡住 worker 等待
+    gevent worker 底下 threading 已被換成 greenlet，所以改用 gevent 的原生執行緒池，避免 bcrypt 卡住整個事件迴圈。
+    """
+
+    def __init__(self, max_workers, max_queue, rounds):
+        self.max_pending = max_workers + max_queue
+        self.rounds = rounds
+        self._pending = 0
+        self._lock = threading.Lock()
+        if _gevent_patched():
+            from gevent.threadpool import ThreadPool
+            pool = ThreadPool(max_workers)
+            self._run = lambda fn, *args: pool.apply(fn, args)
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+            self._run = lambda fn, *args: executor.submit(fn, *args).result()
+
+    def _submit(self, operation, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                BCRYPT_REJECTED.inc()
+                raise HasherBusy(self._pending)
+            self._pending += 1
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                BCRYPT_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+        try:
+            return self._run(timed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash(self, password):
+        return self._submit('hash', bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def check(self, password_hash, password):
+        return self._submit('check', bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """工作因子與設定 (BCRYPT_LOG_ROUNDS) 不同時，登入成功後應該用新的因子重新雜湊"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            return {'pending': self._pending, 'max_pending': self.max_pending, 'rounds': self.rounds}
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher(config):
+    """取得行程內共用的 PasswordHasher (第一次使用時才建立)"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                workers = config['AUTH_HASH_WORKERS'] or os.cpu_count() or 1
+                _hasher = PasswordHasher(
+                    max_workers=workers,
+                    max_queue=config['AUTH_HASH_QUEUE'],
+                    rounds=config['BCRYPT_LOG_ROUNDS'],
+                )
+    return _hasher
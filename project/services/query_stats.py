@@ -0,0 +1,167 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class _PoolWaits:
+    """連線池取用連線的等待時間 (行程內累計)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {'checkouts': self.count,
+                    'avg_wait_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                    'max_wait_ms': round(self.max * 1000, 3)}
+
+
+pool_waits = _PoolWaits()
+
+
+class TimedQueuePool(QueuePool):
+    """記錄每次從連線池取得連線要等多久 (連線池用完時，請求會在這裡排隊)"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            pool_waits.record(waited)
+            if has_request_context():
+                _request_stats()['wait'] += waited
+
+
+class _EndpointStats:
+    """每個端點 (方法 + 路由) 的查詢次數與資料庫時間 (行程內累計)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, stats):
+        with self._lock:
+            entry = self._data.setdefault(endpoint, {'requests': 0, 'queries': 0, 'db_ms': 0.0,
+                                                     'max_queries': 0, 'max_db_ms': 0.0, 'nplus1': 0})
+            entry['requests'] += 1
+            entry['queries'] += stats['count']
+            entry['db_ms'] += stats['time'] * 1000
+            entry['max_queries'] = max(entry['max_queries'], stats['count'])
+            entry['max_db_ms'] = max(entry['max_db_ms'], stats['time'] * 1000)
+            entry['nplus1'] += bool(stats['nplus1'])
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: dict(entry, db_ms=round(entry['db_ms'], 3), max_db_ms=round(entry['max_db_ms'], 3),
+                               avg_queries=round(entry['queries'] / entry['requests'], 2))
+                for endpoint, entry in sorted(self._data.items())
+            }
+
+
+endpoint_stats = _EndpointStats()
+
+
+def _request_stats():
+    stats = g.get('query_stats')
+    if stats is None:
+        stats = g.query_stats = {'count': 0, 'time': 0.0, 'wait': 0.0, 'slowest': (0.0, None),
+                                 'statements': Counter(), 'nplus1': []}
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if not has_request_context():
+        return
+    stats = _request_stats()
+    stats['count'] += 1
+    stats['time'] += elapsed
+    if elapsed > stats['slowest'][0]:
+        stats['slowest'] = (elapsed, statement)
+    # 參數化後的 SQL 文字相同 = 同一個查詢換不同參數重複執行 (例如逐筆載入 lazy relationship)
+    stats['statements'][statement] += 1
+
+
+def _handle_error(context):
+    # 執行失敗時不會觸發 after_cursor_execute，把開始時間丟掉
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+def _short(statement, limit=300):
+    return _WHITESPACE.sub(' ', statement or '').strip()[:limit]
+
+
+def init_query_stats(app):
+    """
+    每個請求的資料庫查詢統計：查詢次數、總 DB 時間、最慢的語句、連線池等待時間。
+    - 回應加上 Server-Timing 標頭 (瀏覽器開發者工具可直接看到)
+    - 同一語句在一個請求內執行 DB_NPLUS1_THRESHOLD 次以上時記錄 N+1 警告
+    - 累計數字可從 /api/health/db 查看
+    必須在 db.init_app 之前呼叫 (要替換連線池類別)。
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if 'pool_size' in options:
+        options.setdefault('poolclass', TimedQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    slow_query = app.config['DB_SLOW_QUERY_MS'] / 1000
+    threshold = app.config['DB_NPLUS1_THRESHOLD']
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        endpoint = f"{request.method} {request.url_rule.rule if request.url_rule else '(unmatched)'}"
+        for statement, times in stats['statements'].items():
+            if times >= threshold:
+                stats['nplus1'].append(statement)
+                logger.warning("可能的 N+1 查詢 (%s)：同一語句執行 %s 次: %s", endpoint, times, _short(statement))
+        slowest, statement = stats['slowest']
+        if slowest >= slow_query:
+            logger.warning("慢查詢 (%s) %.0fms: %s", endpoint, slowest * 1000, _short(statement))
+        endpoint_stats.record(endpoint, stats)
+        response.headers.add('Server-Timing', f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries"')
+        response.headers.add('Server-Timing', f'db-wait;dur={stats["wait"] * 1000:.1f}')
+        return response
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(),
+                      idle=pool.checkedin())
+    return status
@@ -0,0 +1,169 @@
+import logging
+import math
+import threading
+import time
+
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from .metrics import RATE_LIMITED, _route_labels
+from .ttl_cache import TTLCache
+
+try:
+    import redis
+except ImportError:  # 沒有安裝 redis 時只能使用行程內的 token bucket
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = bucket；ARGV = 每秒補充的 token 數、容量、這次請求的成本
+# 以 Redis 伺服器的時間計算，兩個副本的時鐘不一致也不影響；回傳 {是否允許, 需要等待的毫秒數, 剩餘 token}
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, wait_ms = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait_ms = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, wait_ms, math.floor(tokens)}
+"""
+
+
+class TokenBucketLimiter:
+    """
+    每個身分一個 token bucket：容量 burst，每秒補充 rate 個 token，請求依路由扣除不同的成本。
+    有設定 redis_url 時 bucket 存在 Redis (以 Lua 腳本原子地補充與扣除，所有副本共用)；
+    沒有設定或 Redis 連不上時改用行程內的 bucket (限制變成每個 worker 各自計算，比較寬鬆)，
+    retry_after 秒後再試 Redis。
+    """
+
+    def __init__(self, rate, burst, redis_url=None, redis_timeout=0.1, retry_after=5, prefix='ratelimit:'):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._redis = self._script = None
+        if redis_url and redis is not None:
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=redis_timeout,
+                                               socket_connect_timeout=redis_timeout)
+            self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+        elif redis_url:
+            logger.warning("沒有安裝 redis 套件，請求頻率限制改在各行程內計算")
+        # 閒置 burst / rate 秒後 bucket 一定是滿的，可以直接丟掉
+        self._local = TTLCache(maxsize=100000, ttl=burst / rate)
+        self._local_lock = threading.Lock()
+        self._redis_down_until = 0.0
+
+    @property
+    def shared(self):
+        return self._redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _hit_local(self, key, cost):
+        with self._local_lock:
+            now = time.monotonic()
+            tokens, ts = self._local.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - ts) * self.rate)
+            if tokens >= cost:
+                self._local.set(key, (tokens - cost, now))
+                return True, 0.0, math.floor(tokens - cost)
+            self._local.set(key, (tokens, now))
+            return False, (cost - tokens) / self.rate, math.floor(tokens)
+
+    def hit(self, key, cost):
+        """扣除 cost 個 token，回傳 (是否允許, 需要等待的秒數, 剩餘 token)；成本超過容量時以容量計算"""
+        cost = min(cost, self.burst)
+        if self.shared:
+            try:
+                allowed, wait_ms, remaining = self._script(keys=[self.prefix + key], args=[self.rate, self.burst, cost])
+                return bool(allowed), wait_ms / 1000, remaining
+            except redis.RedisError as e:
+                self._redis_down_until = time.monotonic() + self.retry_after
+                logger.warning("Redis 無法使用 (%s)，%s 秒內改用行程內的請求頻率限制", e, self.retry_after)
+        return self._hit_local(key, cost)
+
+    def stats(self):
+        return {'shared': self.shared, 'local_buckets': len(self._local), 'rate': self.rate, 'burst': self.burst}
+
+
+def request_identity():
+    """有效的 JWT 以使用者 id 為鍵，否則以用戶端 IP 為鍵 (nginx 會以 X-Real-IP 帶入真實 IP)"""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except (JWTExtendedException, PyJWTError):
+        identity = None
+    if identity is not None:
+        return f"user:{identity}"
+    return f"ip:{request.headers.get('X-Real-IP') or request.remote_addr}"
+
+
+def request_cost(config):
+    """依 RATE_LIMIT_COSTS 查這個路由的成本；爬蟲路由另外依頁數加上 RATE_LIMIT_PAGE_COSTS"""
+    route = f"{request.method} {request.url_rule.rule}"
+    cost = config['RATE_LIMIT_COSTS'].get(route, config['RATE_LIMIT_DEFAULT_COST'])
+    per_page = config['RATE_LIMIT_PAGE_COSTS'].get(route)
+    if per_page:
+        raw = request.args.get('pages') if request.method == 'GET' else (request.get_json(silent=True) or {}).get('pages')
+        try:
+            pages = int(raw if raw is not None else 3)
+        except (TypeError, ValueError):
+            pages = 1
+        cost += per_page * min(max(pages, 1), config['SCRAPE_MAX_PAGES'])
+    return cost
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter(config):
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = TokenBucketLimiter(
+                    rate=config['RATE_LIMIT_RATE'],
+                    burst=config['RATE_LIMIT_BURST'],
+                    redis_url=config['RATE_LIMIT_REDIS_URL'],
+                    redis_timeout=config['RATE_LIMIT_REDIS_TIMEOUT'],
+                )
+    return _limiter
+
+
+def init_rate_limit(app):
+    """
+    應用層請求頻率限制：每個使用者 (或 IP) 一個 token bucket，昂貴的路由扣比較多 token。
+    在 before_request 執行，超過時直接回 429 與 Retry-After，不會查詢資料庫或呼叫上游。
+    要在 init_metrics 之後註冊，429 才會記錄在請求指標內。
+    """
+
+    @app.before_request
+    def enforce_rate_limit():
+        config = current_app.config
+        if not config['RATE_LIMIT_ENABLED'] or request.url_rule is None or not request.url_rule.rule.startswith('/api'):
+            return None
+        cost = request_cost(config)
+        if cost <= 0:
+            return None
+        allowed, wait, remaining = get_limiter(config).hit(request_identity(), cost)
+        if allowed:
+            return None
+        namespace, route, method = _route_labels()
+        RATE_LIMITED.labels(namespace, route, method).inc()
+        retry_after = max(1, math.ceil(wait))
+        return ({"error": "請求太頻繁，請稍後再試", "retry_after": retry_after}, 429,
+                {'Retry-After': str(retry_after)})
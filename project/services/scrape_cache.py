@@ -0,0 +1,135 @@
+import logging
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db
+from ..models import ScrapeCacheEntry
+from .http_cache import content_digest
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_keyword(keyword):
+    """快取鍵用的關鍵字正規化：全形轉半形、去頭尾空白、合併連續空白、不分大小寫"""
+    keyword = unicodedata.normalize('NFKC', keyword)
+    return ' '.join(keyword.split()).casefold()
+
+
+class ScrapeCache:
+    """
+    爬蟲結果的兩層快取，以 (正規化關鍵字, 頁碼) 為鍵：
+    - 第一層：行程內 LRU (TTLCache)，TTL 較短，命中時完全不碰資料庫
+    - 第二層：Postgres 的 scrape_cache 表，兩個 API 副本共用
+    第二層故障時只記錄 log，爬蟲照常運作。
+    第一層同時保存每頁內容的雜湊 (放進第一層時計算一次)，給 API 組 ETag 用。
+    """
+
+    def __init__(self, maxsize, ttl, local_ttl):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, min(local_ttl, ttl))
+        self._lock = threading.Lock()
+        self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def _count(self, name, n=1):
+        if n:
+            with self._lock:
+                self._counters[name] += n
+
+    def get_many(self, keyword, page_numbers):
+        """一次查詢多頁，回傳 {page_no: books}，只包含有命中的頁面"""
+        key = normalize_keyword(keyword)
+        found = {}
+        for page_no in page_numbers:
+            entry = self.local.get((key, page_no))
+            if entry is not None:
+                found[page_no] = entry[0]
+        self._count('local_hits', len(found))
+
+        wanted = [page_no for page_no in page_numbers if page_no not in found]
+        if wanted:
+            try:
+                # 用獨立連線查詢並立即歸還，接下來等待 OPAC 的期間不會佔住連線池
+                with db.engine.connect() as conn:
+                    rows = conn.execute(
+                        select(ScrapeCacheEntry.page, ScrapeCacheEntry.books).where(
+                            ScrapeCacheEntry.keyword == key,
+                            ScrapeCacheEntry.page.in_(wanted),
+                            ScrapeCacheEntry.expires_at > datetime.utcnow(),
+                        )
+                    ).all()
+            except SQLAlchemyError:
+                logger.exception("讀取共用爬蟲快取失敗")
+                rows = []
+            for page_no, books in rows:
+                found[page_no] = books
+                self.local.set((key, page_no), (books, content_digest(books)))
+            self._count('shared_hits', len(rows))
+            self._count('misses', len(wanted) - len(rows))
+        return found
+
+    def set(self, keyword, page_no, books):
+        key = normalize_keyword(keyword)
+        self.local.set((key, page_no), (books, content_digest(books)))
+        values = {'keyword': key, 'page': page_no, 'books': books,
+                  'expires_at': datetime.utcnow() + timedelta(seconds=self.ttl)}
+        stmt = insert(ScrapeCacheEntry).values(**values).on_conflict_do_update(
+            index_elements=[ScrapeCacheEntry.keyword, ScrapeCacheEntry.page],
+            set_={'books': values['books'], 'expires_at': values['expires_at']},
+        )
+        try:
+            # 用獨立的連線寫入，不影響請求本身的 db.session 交易
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+        except SQLAlchemyError:
+            logger.exception("寫入共用爬蟲快取失敗")
+
+    def digest(self, keyword, page_no, books):
+        """某一頁內容的雜湊：books 就是第一層快取裡的那一份時直接使用已算好的值"""
+        entry = self.local.get((normalize_keyword(keyword), page_no))
+        if entry is not None and entry[0] is books:
+            return entry[1]
+        return content_digest(books)
+
+    def invalidate(self, keyword):
+        """手動清除某個關鍵字的所有頁面，回傳共用快取刪除的筆數"""
+        key = normalize_keyword(keyword)
+        self.local.delete_where(lambda cache_key: cache_key[0] == key)
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(ScrapeCacheEntry).where(ScrapeCacheEntry.keyword == key))
+        return result.rowcount
+
+    def purge_expired(self):
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(ScrapeCacheEntry).where(ScrapeCacheEntry.expires_at <= datetime.utcnow()))
+        return result.rowcount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = sum(stats.values())
+        stats['hit_ratio'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        stats['local_size'] = len(self.local)
+        return stats
+
+
+_scrape_cache = None
+_scrape_cache_lock = threading.Lock()
+
+
+def get_scrape_cache(config):
+    global _scrape_cache
+    if _scrape_cache is None:
+        with _scrape_cache_lock:
+            if _scrape_cache is None:
+                _scrape_cache = ScrapeCache(
+                    maxsize=config['SCRAPE_CACHE_MAXSIZE'],
+                    ttl=config['SCRAPE_CACHE_TTL'],
+                    local_ttl=config['SCRAPE_CACHE_LOCAL_TTL'],
+                )
+    return _scrape_cache
@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from ..extensions import db
+from ..models import ScrapeJob, ScrapeJobPage
+from .ndhu_fetcher import get_fetcher
+from .scrape_cache import get_scrape_cache, normalize_keyword
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+ACTIVE = (QUEUED, RUNNING)
+# worker 清除過期工作的間隔 (秒)
+_PURGE_EVERY = 3600
+
+
+def submit_job(query, pages):
+    """
+    排入一個爬蟲工作，回傳 (job, created)。
+    已經有相同 (正規化關鍵字, 頁數) 的工作在排隊或執行中時不會重複建立，直接回傳那一個 (created 為 False)。
+    """
+    keyword = normalize_keyword(query)[:255]
+    job_id = db.session.execute(
+        insert(ScrapeJob).values(id=uuid.uuid4().hex, keyword=keyword, query=query[:255], pages=pages,
+                                 status=QUEUED, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[ScrapeJob.keyword, ScrapeJob.pages],
+                                index_where=ScrapeJob.status.in_(ACTIVE))
+        .returning(ScrapeJob.id)
+    ).scalar()
+    created = job_id is not None
+    if not created:
+        job_id = db.session.execute(
+            select(ScrapeJob.id).where(ScrapeJob.keyword == keyword, ScrapeJob.pages == pages,
+                                       ScrapeJob.status.in_(ACTIVE))
+        ).scalar()
+    db.session.commit()
+    if job_id is None:
+        # 進行中的那個工作剛好在兩個查詢之間結束，重新排一次
+        return submit_job(query, pages)
+    return db.session.get(ScrapeJob, job_id), created
+
+
+def job_pages(job_id, after=0, limit=10):
+    """工作已完成的頁面中，頁碼大於 after 的前 limit 頁 [(page, books)]"""
+    return db.session.execute(
+        select(ScrapeJobPage.page, ScrapeJobPage.books)
+        .where(ScrapeJobPage.job_id == job_id, ScrapeJobPage.page > after)
+        .order_by(ScrapeJobPage.page)
+        .limit(limit)
+    ).all()
+
+
+def claim_job(stale_after, max_attempts):
+    """
+    領取最早排入的工作 (或 stale_after 秒沒有進度的執行中工作)，回傳 job id；沒有工作時回傳 None。
+    FOR UPDATE SKIP LOCKED：多個 worker 同時領取時各自拿到不同的工作，不會互相等待。
+    """
+    while True:
+        now = datetime.utcnow()
+        job = db.session.execute(
+            select(ScrapeJob)
+            .where(or_(ScrapeJob.status == QUEUED,
+                       and_(ScrapeJob.status == RUNNING, ScrapeJob.heartbeat_at < now - timedelta(seconds=stale_after))))
+            .order_by(ScrapeJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if job is None:
+            db.session.commit()
+            return None
+        if job.attempts >= max_attempts:
+            job.status, job.finished_at = FAILED, now
+            job.error = job.error or f"執行 {job.attempts} 次都沒有完成"
+            db.session.commit()
+            continue
+        job.status, job.attempts = RUNNING, job.attempts + 1
+        job.started_at = job.heartbeat_at = now
+        db.session.commit()
+        return job.id
+
+
+def run_job(job_id, fetcher, cache):
+    """執行工作：每抓完一頁就寫入結果並更新進度 (同一個交易)，重試時會覆寫已完成的頁面"""
+    job = db.session.get(ScrapeJob, job_id)
+    query, pages = job.query, job.pages
+    db.session.commit()
+    count = 0
+    try:
+        for page_no, books in fetcher.iter_pages(query, pages, cache=cache):
+            stmt = insert(ScrapeJobPage).values(job_id=job_id, page=page_no, books=books)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[ScrapeJobPage.job_id, ScrapeJobPage.page], set_={'books': stmt.excluded.books}))
+            count += len(books)
+            job = db.session.get(ScrapeJob, job_id)
+            job.pages_done, job.book_count, job.heartbeat_at = page_no, count, datetime.utcnow()
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("爬蟲工作 %s 失敗", job_id)
+        job = db.session.get(ScrapeJob, job_id)
+        job.status, job.error, job.finished_at = FAILED, f"爬蟲翻頁失敗: {e}", datetime.utcnow()
+        db.session.commit()
+        return
+    job = db.session.get(ScrapeJob, job_id)
+    job.status, job.finished_at = SUCCEEDED, datetime.utcnow()
+    db.session.commit()
+
+
+def purge_finished(retention):
+    """刪除完成超過 retention 秒的工作 (結果頁面會一併刪除)，回傳刪除的工作數"""
+    result = db.session.execute(delete(ScrapeJob).where(
+        ScrapeJob.status.in_((SUCCEEDED, FAILED)),
+        ScrapeJob.finished_at < datetime.utcnow() - timedelta(seconds=retention)))
+    db.session.commit()
+    return result.rowcount
+
+
+class ScrapeWorker:
+    """
+    在一個行程內開 concurrency 個執行緒輪流領取並執行工作。
+    同時執行的工作總數 = worker 行程數 x concurrency；對 OPAC 的連線數仍受 NDHUFetcher 的主機限流控制。
+    """
+
+    def __init__(self, app, concurrency):
+        self.app = app
+        self.concurrency = concurrency
+        self.stopping = threading.Event()
+        self._purged_at = 0.0
+        self._purge_lock = threading.Lock()
+
+    def _maybe_purge(self, config):
+        with self._purge_lock:
+            if time.monotonic() - self._purged_at < _PURGE_EVERY:
+                return
+            self._purged_at = time.monotonic()
+        deleted = purge_finished(config['SCRAPE_JOB_RETENTION'])
+        if deleted:
+            logger.info("已清除 %s 個過期的爬蟲工作", deleted)
+
+    def _loop(self):
+        with self.app.app_context():
+            config = self.app.config
+            fetcher, cache = get_fetcher(config), get_scrape_cache(config)
+            while not self.stopping.is_set():
+                try:
+                    self._maybe_purge(config)
+                    job_id = claim_job(config['SCRAPE_JOB_STALE_AFTER'], config['SCRAPE_JOB_MAX_ATTEMPTS'])
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("領取爬蟲工作失敗")
+                    job_id = None
+                if job_id is None:
+                    self.stopping.wait(config['SCRAPE_JOB_POLL_INTERVAL'])
+                    continue
+                started = time.monotonic()
+                run_job(job_id, fetcher, cache)
+                logger.info("爬蟲工作 %s 完成 (%.1fs)", job_id, time.monotonic() - started)
+
+    def run(self):
+        threads = [threading.Thread(target=self._loop, name=f"scrape-worker-{i}", daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            # 執行中的工作會在 SCRAPE_JOB_STALE_AFTER 秒後由其他 worker 重試
+            self.stopping.set()
@@ -0,0 +1,129 @@
+import re
+import unicodedata
+
+from sqlalchemy import func, select, text
+
+from ..extensions import db
+from ..models import Book
+from .isbn import normalize_isbn
+
+# 整個查詢只是一個 ISBN (可以有 ISBN 字首、連字號或空白)
+_ISBN_QUERY = re.compile(r'(?:isbn(?:-1[03])?\s*:?\s*)?[0-9x][0-9x\s-]*', re.IGNORECASE)
+# 中日韓文字 (CJK) 的連續片段，或英數字組成的單字
+_TOKEN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+|[0-9a-z]+')
+
+
+def _is_cjk(token):
+    return not token[0].isascii()
+
+
+def tokenize(text_value, for_query=False):
+    """
+    CJK 感知的斷詞：英數字以單字為單位；中文沒有空白分詞，改用字元 bigram。
+    建索引時中文另外加上單字 (unigram)，讓單一中文字的查詢也能命中；
+    查詢時只用 bigram (單一字元的片段才用 unigram)，相當於「子字串全部出現」的比對。
+    """
+    normalized = unicodedata.normalize('NFKC', text_value or '').casefold()
+    tokens = []
+    for run in _TOKEN.findall(normalized):
+        if not _is_cjk(run):
+            tokens.append(run)
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if for_query:
+            tokens.extend(bigrams or [run])
+        else:
+            tokens.extend(bigrams)
+            tokens.extend(run)
+    return tokens
+
+
+def search_vector_expr(title, author, isbn):
+    """書目的 tsvector：書名與 ISBN 權重 A、作者權重 B (使用 simple 設定，不做語系詞幹處理)"""
+    return (
+        func.setweight(func.to_tsvector('simple', ' '.join(tokenize(title))), 'A')
+        .op('||')(func.setweight(func.to_tsvector('simple', ' '.join(tokenize(author))), 'B'))
+        .op('||')(func.setweight(func.to_tsvector('simple', isbn or ''), 'A'))
+    )
+
+
+def build_tsquery(query):
+    """把使用者輸入轉成 to_tsquery 字串；最後一個英數字單字做前綴比對 (邊打邊搜)"""
+    tokens = list(dict.fromkeys(tokenize(query, for_query=True)))
+    if not tokens:
+        return None
+    terms = [f"'{token}'" for token in tokens]
+    if not _is_cjk(tokens[-1]) and not query[-1:].isspace():
+        terms[-1] += ':*'
+    return ' & '.join(terms)
+
+
+def isbn_query(query):
+    """查詢只是一個有效的 ISBN-10 / ISBN-13 時回傳正規化的 ISBN-13，否則回傳 None"""
+    query = unicodedata.normalize('NFKC', query or '').strip()
+    return normalize_isbn(query) if _ISBN_QUERY.fullmatch(query) else None
+
+
+def search_books(query, page=1, per_page=20, max_candidates=2000):
+    """
+    在館藏目錄做全文檢索，回傳 (books, has_more)。
+    查詢是 ISBN 時 (不論有沒有連字號、10 碼或 13 碼) 直接用唯一索引做完全相等的比對。
+    先用 GIN 索引取出最多 max_candidates 筆符合的書 (命中太多時取 id 最大、也就是最新收錄的那些，
+    每一頁看到的候選集合都相同)，再依 ts_rank_cd 排名分頁，熱門詞命中很多筆時排名成本也有上限。全文檢索沒有結果時，改用書名的 trigram 相似度。
+    """
+    isbn13 = isbn_query(query)
+    if isbn13:
+        book = db.session.execute(select(Book).where(Book.isbn == isbn13)).scalar()
+        return ([book] if book and page == 1 else []), False
+
+    offset = (page - 1) * per_page
+    tsquery = build_tsquery(query)
+    rows = []
+    if tsquery:
+        ts = func.to_tsquery('simple', tsquery)
+        candidates = (
+            select(Book.id, func.ts_rank_cd(Book.search_vector, ts).label('rank'))
+            .where(Book.search_vector.op('@@')(ts))
+            .order_by(Book.id.desc())
+            .limit(max_candidates)
+            .subquery()
+        )
+        rows = db.session.execute(
+            select(Book)
+            .join(candidates, candidates.c.id == Book.id)
+            .order_by(candidates.c.rank.desc(), Book.id)
+            .offset(offset).limit(per_page + 1)
+        ).scalars().all()
+
+    if not rows and page == 1 and query.strip():
+        # 打錯字等情況：用 pg_trgm 找書名相近的書
+        db.session.execute(text("SET LOCAL pg_trgm.similarity_threshold = 0.3"))
+        rows = db.session.execute(
+            select(Book)
+            .where(Book.name.op('%')(query))
+            .order_by(Book.name.op('<->')(query), Book.id)
+            .limit(per_page + 1)
+        ).scalars().all()
+
+    return rows[:per_page], len(rows) > per_page
+
+
+def reindex_books(batch_size=5000):
+    """重新計算所有書目的 search_vector (索引規則改變或舊資料回填時使用)，回傳處理筆數"""
+    last_id = 0
+    total = 0
+    while True:
+        books = db.session.execute(
+            select(Book.id, Book.name, Book.author, Book.isbn)
+            .where(Book.id > last_id).order_by(Book.id).limit(batch_size)
+        ).all()
+        if not books:
+            return total
+        for book_id, name, author, isbn in books:
+            db.session.execute(
+                Book.__table__.update().where(Book.id == book_id)
+                .values(search_vector=search_vector_expr(name, author, isbn))
+            )
+        db.session.commit()
+        total += len(books)
+        last_id = books[-1].id
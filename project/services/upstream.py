@@ -0,0 +1,198 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from .metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS, upstream_target
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """斷路器開啟中：上游近期持續失敗，直接快速失敗而不送出請求"""
+
+    def __init__(self, target, retry_after):
+        super().__init__(f"{target} 暫時無法使用 (斷路器開啟中)")
+        self.target = target
+        self.retry_after = retry_after
+
+
+def _never_sent(exc):
+    """連線根本沒建立起來 (請求沒送到上游)，這種失敗任何呼叫都可以安全重試"""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class CircuitBreaker:
+    """
+    三態斷路器：
+    - closed：正常放行，連續失敗達 failure_threshold 次就 open
+    - open：reset_timeout 秒內所有呼叫都快速失敗
+    - half_open：冷卻時間過後只放一個試探請求，成功就回到 closed，失敗就重新 open；
+      試探請求沒有回報結果 (例如 greenlet 被中止) 時，再過 reset_timeout 秒放下一個試探請求
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_timeout:
+                # opened_at 同時記錄放出試探請求的時間
+                self.state = 'half_open'
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning("斷路器開啟 (連續失敗 %s 次)", self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class UpstreamClient:
+    """
+    共用的上游 HTTP 用戶端 (N8N 等)：
+    - 每個行程一個 keep-alive 連線池，連線逾時與讀取逾時分開設定
+    - 每個目標 (主機 + 路徑) 一個斷路器，上游不健康時快速失敗 (UpstreamUnavailable)；
+      同一台 N8N 上的推薦與搜尋 webhook 各自計算，慢的 RAG 呼叫不會連帶擋掉搜尋
+    - 連線沒建立起來的失敗一律可重試；讀取逾時、連線中斷與 5xx 只有 idempotent 呼叫才重試，
+      重試間隔為 full jitter 指數退避
+    """
+
+    def __init__(self, connect_timeout, read_timeout, max_retries, backoff_base,
+                 failure_threshold, reset_timeout, pool_maxsize):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def breaker_for(self, url):
+        target = upstream_target(url)
+        with self._lock:
+            breaker = self._breakers.get(target)
+            if breaker is None:
+                breaker = self._breakers[target] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return target, breaker
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+
+    def _shortened(self, timeout):
+        """呼叫端給的讀取逾時比預設短 (例如有本地結果可替代時)；這種逾時不代表上游不健康"""
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        return read_timeout is not None and read_timeout < self.timeout[1]
+
+    def request(self, method, url, idempotent=False, **kwargs):
+        """送出請求並回傳 Response (4xx 也會回傳)；5xx 與網路錯誤在重試用完後拋出例外"""
+        target, breaker = self.breaker_for(url)
+        kwargs.setdefault('timeout', self.timeout)
+        shortened = self._shortened(kwargs['timeout'])
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                UPSTREAM_ERRORS.labels(target, 'breaker_open').inc()
+                raise UpstreamUnavailable(target, breaker.retry_after())
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                UPSTREAM_SECONDS.labels(target).observe(time.perf_counter() - started)
+                if isinstance(e, requests.exceptions.ReadTimeout) and shortened:
+                    # 呼叫端自己縮短的逾時只記在指標，不算上游失敗 (也不重試)
+                    UPSTREAM_ERRORS.labels(target, 'caller_timeout').inc()
+                    raise
+                UPSTREAM_ERRORS.labels(target, 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection').inc()
+                breaker.record_failure()
+                if not (idempotent or _never_sent(e)) or attempt >= self.max_retries:
+                    raise
+            except Exception:
+                UPSTREAM_ERRORS.labels(target, 'other').inc()
+                breaker.record_failure()
+                raise
+            except BaseException:
+                # gevent.Timeout / GreenletExit (worker 關閉、用戶端斷線)：不是上游的錯，不回報結果；
+                # 若這是試探請求，斷路器會在 reset_timeout 秒後再放下一個
+                UPSTREAM_ERRORS.labels(target, 'aborted').inc()
+                raise
+            else:
+                UPSTREAM_SECONDS.labels(target).observe(time.perf_counter() - started)
+                if response.status_code < 500:
+                    breaker.record_success()
+                    return response
+                UPSTREAM_ERRORS.labels(target, 'http_5xx').inc()
+                breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries:
+                    response.raise_for_status()
+                # 要重試就不會再讀這個回應，先釋放連線讓它回到連線池
+                response.close()
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+    def post_json(self, url, payload, idempotent=False, timeout=None):
+        """POST JSON 並回傳 (body, status)；非 2xx 會拋出 HTTPError。timeout 可覆寫預設的 (連線, 讀取) 逾時"""
+        kwargs = {'timeout': timeout} if timeout is not None else {}
+        response = self.request('POST', url, idempotent=idempotent, json=payload, **kwargs)
+        response.raise_for_status()
+        return response.json(), response.status_code
+
+    def stats(self):
+        with self._lock:
+            return {target: {'state': breaker.state, 'failures': breaker.failures}
+                    for target, breaker in self._breakers.items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_upstream_client(config):
+    """取得行程內共用的 UpstreamClient (第一次使用時才建立)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient(
+                    connect_timeout=config['UPSTREAM_CONNECT_TIMEOUT'],
+                    read_timeout=config['UPSTREAM_READ_TIMEOUT'],
+                    max_retries=config['UPSTREAM_MAX_RETRIES'],
+                    backoff_base=config['UPSTREAM_BACKOFF_BASE'],
+                    failure_threshold=config['UPSTREAM_BREAKER_THRESHOLD'],
+                    reset_timeout=config['UPSTREAM_BREAKER_RESET'],
+                    pool_maxsize=config['UPSTREAM_POOL_SIZE'],
+                )
+    return _client
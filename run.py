@@ -1,6 +1,9 @@
+import os
 from project import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port = 5000, debug = True)
+    # 僅供本機開發：FLASK_DEBUG=1 才開啟除錯模式與自動重新載入
+    # 正式環境請用 gunicorn -c gunicorn.conf.py run:app
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes'))
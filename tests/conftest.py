@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from project.config import DevelopmentConfig
+
+
+@pytest.fixture(scope='session')
+def app():
+    """
+    連到 TEST_DATABASE_URL 的測試用 app (會先套用所有遷移)；沒有設定時略過需要資料庫的測試。
+    資料表是共用的，每個測試自己清除寫入的資料。
+    """
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("需要資料庫的測試：請設定 TEST_DATABASE_URL")
+
+    from flask_migrate import upgrade
+
+    from project import create_app
+
+    class TestConfig(DevelopmentConfig):
+        SQLALCHEMY_DATABASE_URI = url
+        TESTING = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
@@ -0,0 +1,89 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from project.extensions import db
+from project.models import Loan, LoanDailyCount, User
+from project.services.analytics import rebuild_daily_counts, refresh_daily_counts, title_key
+from project.services.isbn import normalize_isbn
+
+USERNAME = 'pytest-analytics'
+# 測試資料放在很久以前的日期，(day, book_key) 不會和既有資料重疊
+DAYS = (date(2001, 1, 1), date(2001, 1, 2))
+
+
+@pytest.fixture
+def user_id(app_context):
+    def clear():
+        user = User.query.filter_by(username=USERNAME).first()
+        if user:
+            Loan.query.filter_by(user_id=user.id).delete()
+            db.session.delete(user)
+        db.session.execute(delete(LoanDailyCount).where(LoanDailyCount.day.in_(DAYS)))
+        db.session.commit()
+
+    clear()
+    user = User(username=USERNAME, email=f'{USERNAME}@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    # 先把既有的借閱紀錄彙總完，之後的 refresh 只會看到測試新增的資料
+    refresh_daily_counts()
+    yield user.id
+    clear()
+
+
+def add_loans(user_id, loans):
+    for day, title, isbn in loans:
+        db.session.add(Loan(user_id=user_id, book_title=title, book_isbn=isbn, book_isbn13=normalize_isbn(isbn),
+                            loan_date=datetime.combine(day, datetime.min.time()).replace(hour=10)))
+    db.session.commit()
+
+
+def daily_counts():
+    rows = db.session.execute(
+        select(LoanDailyCount.day, LoanDailyCount.book_key, LoanDailyCount.count, LoanDailyCount.book_isbn)
+        .where(LoanDailyCount.day.in_(DAYS))
+    ).all()
+    return {(day, key): (count, isbn) for day, key, count, isbn in rows}
+
+
+def test_second_refresh_only_adds_new_loans(user_id):
+    add_loans(user_id, [
+        (DAYS[0], '測試書 A', '978-0-306-40615-7'),
+        (DAYS[0], '測試書 A (平裝)', '0306406152'),
+        (DAYS[0], 'pytest  無 ISBN 的書', None),
+    ])
+    assert refresh_daily_counts() == 3
+    first = daily_counts()
+    assert first == {
+        (DAYS[0], '9780306406157'): (2, '9780306406157'),
+        (DAYS[0], title_key('pytest 無 ISBN 的書')): (1, None),
+    }
+    assert refresh_daily_counts() == 0
+    assert daily_counts() == first
+
+    add_loans(user_id, [
+        (DAYS[0], 'PYTEST 無 ISBN 的書', ''),
+        (DAYS[1], '測試書 A', '9780306406157'),
+    ])
+    # 小批次也只處理新的兩筆
+    assert refresh_daily_counts(batch_size=1) == 2
+    assert daily_counts() == {
+        (DAYS[0], '9780306406157'): (2, '9780306406157'),
+        (DAYS[0], title_key('pytest 無 ISBN 的書')): (2, None),
+        (DAYS[1], '9780306406157'): (1, '9780306406157'),
+    }
+
+
+def test_rebuild_matches_incremental_refresh(user_id):
+    add_loans(user_id, [(DAYS[0], '測試書 A', '9780306406157'), (DAYS[1], 'pytest 書 B', None)])
+    refresh_daily_counts()
+    add_loans(user_id, [(DAYS[0], '測試書 A', '9780306406157'), (DAYS[1], 'PyTest 書 B', None)])
+    refresh_daily_counts(batch_size=3)
+    incremental = daily_counts()
+    assert len(incremental) == 2
+
+    total = db.session.execute(select(func.count()).select_from(Loan)).scalar()
+    assert rebuild_daily_counts() == total
+    assert daily_counts() == incremental
@@ -0,0 +1,180 @@
+import hashlib
+import urllib.parse
+
+import pytest
+from sqlalchemy import delete, select
+
+from project.extensions import db
+from project.models import ScrapePageState
+from project.services import catalog
+from project.services.catalog import crawl_keywords
+from project.services.ndhu_fetcher import PAGE_SIZE, NDHUFetcher, content_hash
+
+
+def results_page(count, prefix, noise=''):
+    items = ''.join(f'<li class="is_img"><ul><li class="reslt_item_head"><a>{prefix} {i}</a></li></ul></li>'
+                    for i in range(count))
+    # noise 放在 script 與 jsessionid 裡，正規化後的內容雜湊不受影響
+    return (f'<html><head><script>var t = "{noise}";</script></head><body>'
+            f'<a href="/toread/opac;jsessionid={noise or "0"}">首頁</a><ul>{items}</ul></body></html>')
+
+
+class _Response:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class ConditionalSession:
+    """
+    每頁的 HTML 由 pages[page] 決定；validators 為 True 時帶 ETag，收到相符的 If-None-Match 回 304。
+    noise 每次回應都不同 (模擬沒有驗證資訊、每次都有時間戳記的 OPAC)。
+    """
+
+    def __init__(self, pages, validators=True):
+        self.pages = pages
+        self.validators = validators
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['start'][0]) // PAGE_SIZE
+        headers = headers or {}
+        self.requests.append((page, dict(headers)))
+        count, prefix = self.pages.get(page, (0, ''))
+        body = results_page(count, prefix)
+        if not self.validators:
+            return _Response(200, results_page(count, prefix, noise=str(len(self.requests))))
+        etag = '"%s"' % hashlib.sha256(body.encode('utf-8')).hexdigest()[:16]
+        if headers.get('If-None-Match') == etag:
+            return _Response(304, headers={'ETag': etag})
+        return _Response(200, body, {'ETag': etag})
+
+
+def make_fetcher(session):
+    fetcher = NDHUFetcher('http://opac.test', max_concurrency=2, min_delay=0)
+    fetcher.session = session
+    return fetcher
+
+
+def test_content_hash_ignores_volatile_parts():
+    assert content_hash(results_page(3, '書', noise='a')) == content_hash(results_page(3, '書', noise='b'))
+    assert content_hash(results_page(3, '書')) != content_hash(results_page(4, '書'))
+
+
+def test_fetch_page_if_changed_uses_validators():
+    session = ConditionalSession({0: (PAGE_SIZE, '書')})
+    fetcher = make_fetcher(session)
+    books, validators = fetcher.fetch_page_if_changed('python', 0)
+    assert len(books) == PAGE_SIZE
+    assert validators['etag'] and validators['content_hash']
+
+    books, again = fetcher.fetch_page_if_changed('python', 0, dict(validators, last_modified='Mon, 01 Jan 2024'))
+    assert books is None
+    assert again['etag'] == validators['etag']
+    assert session.requests[-1][1] == {'If-None-Match': validators['etag'], 'If-Modified-Since': 'Mon, 01 Jan 2024'}
+
+
+def test_fetch_page_if_changed_compares_content_hash():
+    session = ConditionalSession({0: (PAGE_SIZE, '書')}, validators=False)
+    fetcher = make_fetcher(session)
+    books, validators = fetcher.fetch_page_if_changed('python', 0)
+    assert books is not None and validators['etag'] is None
+    # 內容只有 script / jsessionid 不同
+    assert fetcher.fetch_page_if_changed('python', 0, validators)[0] is None
+    session.pages[0] = (PAGE_SIZE, '新書')
+    assert len(fetcher.fetch_page_if_changed('python', 0, validators)[0]) == PAGE_SIZE
+
+
+def test_iter_page_changes_keeps_book_count_of_unchanged_pages():
+    session = ConditionalSession({0: (PAGE_SIZE, '一'), 1: (PAGE_SIZE, '二'), 2: (4, '三')})
+    fetcher = make_fetcher(session)
+    first = list(fetcher.iter_page_changes('python', 10))
+    # 不滿一頁就是最後一頁
+    assert [(page_no, len(books)) for page_no, books, _ in first] == [(1, PAGE_SIZE), (2, PAGE_SIZE), (3, 4)]
+
+    known = {page_no: validators for page_no, _, validators in first}
+    session.pages[1] = (PAGE_SIZE, '改')
+    second = list(fetcher.iter_page_changes('python', 10, known))
+    assert [(page_no, books is None, v['book_count']) for page_no, books, v in second] == [
+        (1, True, PAGE_SIZE), (2, False, PAGE_SIZE), (3, True, 4)]
+
+
+KEYWORD = 'pytest 條件式爬取'
+
+
+@pytest.fixture
+def crawl(app_context, monkeypatch):
+    """crawl_keywords，但 upsert_books 只記錄呼叫 (不寫入館藏目錄)"""
+    def clear():
+        db.session.execute(delete(ScrapePageState).where(ScrapePageState.keyword == KEYWORD))
+        db.session.commit()
+
+    upserts = []
+
+    def fake_upsert(rows):
+        upserts.append(len(rows))
+        return len(rows)
+
+    monkeypatch.setattr(catalog, 'upsert_books', fake_upsert)
+    monkeypatch.setattr(catalog, 'to_catalog_rows', lambda records: records)
+    clear()
+
+    def run(fetcher, full=False):
+        upserts.clear()
+        result = crawl_keywords(fetcher, [KEYWORD], 10, full=full)[KEYWORD]
+        return result, list(upserts)
+
+    yield run
+    clear()
+
+
+def _stored_states():
+    return {row.start: (row.etag, row.content_hash, row.book_count) for row in db.session.execute(
+        select(ScrapePageState).where(ScrapePageState.keyword == KEYWORD)).scalars()}
+
+
+def test_recrawl_skips_unchanged_pages(crawl):
+    session = ConditionalSession({0: (PAGE_SIZE, '一'), 1: (PAGE_SIZE, '二'), 2: (3, '三')})
+    fetcher = make_fetcher(session)
+    result, upserts = crawl(fetcher)
+    assert result == {'books': 23, 'changed': 3, 'unchanged': 0}
+    assert upserts == [PAGE_SIZE, PAGE_SIZE, 3]
+    states = _stored_states()
+    assert sorted(states) == [0, 10, 20]
+
+    # 全部回 304：不解析也不 upsert，只更新 checked_at
+    session.requests.clear()
+    result, upserts = crawl(fetcher)
+    assert result == {'books': 0, 'changed': 0, 'unchanged': 3}
+    assert upserts == []
+    # 最後一頁之後預先送出的頁面沒有驗證資訊
+    assert all('If-None-Match' in headers for page, headers in session.requests if page < 3)
+    assert _stored_states() == states
+
+    session.pages[1] = (PAGE_SIZE, '改')
+    result, upserts = crawl(fetcher)
+    assert result == {'books': PAGE_SIZE, 'changed': 1, 'unchanged': 2}
+    assert upserts == [PAGE_SIZE]
+
+
+def test_recrawl_without_validators_uses_content_hash(crawl):
+    fetcher = make_fetcher(ConditionalSession({0: (PAGE_SIZE, '一'), 1: (2, '二')}, validators=False))
+    assert crawl(fetcher)[0]['changed'] == 2
+    result, upserts = crawl(fetcher)
+    assert result == {'books': 0, 'changed': 0, 'unchanged': 2}
+    assert upserts == []
+
+
+def test_full_crawl_ignores_stored_validators(crawl):
+    session = ConditionalSession({0: (PAGE_SIZE, '一'), 1: (2, '二')})
+    fetcher = make_fetcher(session)
+    crawl(fetcher)
+    session.requests.clear()
+    result, upserts = crawl(fetcher, full=True)
+    assert result == {'books': PAGE_SIZE + 2, 'changed': 2, 'unchanged': 0}
+    assert upserts == [PAGE_SIZE, 2]
+    assert all(headers == {} for _, headers in session.requests)
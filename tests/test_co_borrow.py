@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from project.services.co_borrow import CoBorrowBuilder, sparse
+
+pytestmark = pytest.mark.skipif(sparse is None, reason='需要 numpy 與 scipy')
+
+
+def build(pairs, **kwargs):
+    builder = CoBorrowBuilder(**kwargs)
+    items = {title: builder._item(title, None) for _, title in pairs}
+    builder._apply([(user_id, items[title]) for user_id, title in pairs])
+    return builder, items
+
+
+def test_apply_counts_co_borrows():
+    builder, items = build([(1, 'A'), (1, 'B'), (2, 'A'), (2, 'B'), (2, 'C'), (3, 'A')])
+    counts = builder.co_counts.toarray()
+    a, b, c = items['A'], items['B'], items['C']
+    assert counts[a, a] == 3 and counts[b, b] == 2 and counts[c, c] == 1
+    assert counts[a, b] == counts[b, a] == 2
+    assert counts[a, c] == 1 and counts[b, c] == 1
+
+
+def test_apply_ignores_repeat_loans():
+    builder = CoBorrowBuilder()
+    a = builder._item('A', None)
+    assert builder._apply([(1, a), (1, a)]) == 1
+    assert builder._apply([(1, a)]) == 0
+    assert builder.co_counts[a, a] == 1
+
+
+def test_incremental_apply_matches_batch():
+    rng = random.Random(7)
+    pairs = [(rng.randrange(30), f"book-{rng.randrange(40)}") for _ in range(400)]
+    batch, _ = build(pairs)
+
+    incremental = CoBorrowBuilder()
+    for start in range(0, len(pairs), 37):
+        chunk = pairs[start:start + 37]
+        incremental._apply([(user_id, incremental._item(title, None)) for user_id, title in chunk])
+
+    order = [incremental.item_index[key] for key in batch.keys]
+    expected = batch.co_counts.toarray()
+    actual = incremental.co_counts.toarray()[order][:, order]
+    assert (actual == expected).all()
+
+
+def test_heavy_users_are_excluded():
+    builder, items = build([(1, 'A'), (1, 'B'), (1, 'C'), (2, 'A'), (2, 'B')], max_user_items=2)
+    counts = builder.co_counts.toarray()
+    # 使用者 1 借了 3 本 (> 2)，整列不計
+    assert counts[items['A'], items['B']] == 1
+    assert counts[items['C'], items['C']] == 0
+
+
+def test_similarity_applies_min_count_and_neighbors():
+    pairs = [(user, title) for user in range(3) for title in ('A', 'B')] + [(3, 'A'), (3, 'C'), (4, 'A'), (4, 'D')]
+    builder, items = build(pairs, min_co_count=2, neighbors=1)
+    similar = builder.similarity().toarray()
+    a, b, c = items['A'], items['B'], items['C']
+    assert similar[a, a] == 0
+    assert similar[a, b] == pytest.approx(3 / (5 * 3) ** 0.5)
+    assert similar[a, c] == 0  # 共同借閱只有 1 次
+    assert (similar > 0).sum(axis=1).max() <= 1
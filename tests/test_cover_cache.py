@@ -0,0 +1,171 @@
+import io
+import os
+
+import pytest
+
+from project.api import covers
+from project.config import DevelopmentConfig
+from project.services.cover_cache import CoverCache, CoverRejected, CoverUnavailable, Image
+
+HOST = 'covers.test'
+
+
+def png_bytes(color='red'):
+    if Image is None:
+        return b'\x89PNG\r\n\x1a\n' + color.encode()
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 60), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class _Raw:
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, n, decode_content=False):
+        return self._data.read(n)
+
+
+class _Response:
+    def __init__(self, status_code=200, data=b'', headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.raw = _Raw(data)
+        self.is_redirect = 'Location' in self.headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """routes: {url: _Response}；記錄請求過的網址"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return self.routes[url]
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(routes, max_bytes=10 << 20):
+        cache = CoverCache(str(tmp_path), max_bytes, [HOST])
+        cache.session = FakeSession(routes)
+        return cache
+
+    return make
+
+
+def image(data=None, mimetype='image/png'):
+    return _Response(200, data if data is not None else png_bytes(), {'Content-Type': mimetype})
+
+
+@pytest.mark.parametrize('url', [
+    'http://evil.test/a.png', f'ftp://{HOST}/a.png', f'http://{HOST}.evil.test/a.png', '', None,
+])
+def test_rejects_hosts_not_in_allowlist(make_cache, url):
+    cache = make_cache({})
+    with pytest.raises(CoverRejected):
+        cache.get(url)
+    assert cache.session.requested == []
+
+
+def test_rejects_unknown_size(make_cache):
+    with pytest.raises(CoverRejected):
+        make_cache({}).get(f'http://{HOST}/a.png', size='xl')
+
+
+def test_follows_redirects_only_on_allowed_hosts(make_cache):
+    url = f'http://{HOST}/a.png'
+    cache = make_cache({
+        url: _Response(302, headers={'Location': '/b.png'}),
+        f'http://{HOST}/b.png': image(),
+        f'http://{HOST}/c.png': _Response(302, headers={'Location': 'http://evil.test/c.png'}),
+    })
+    path, mimetype, _ = cache.get(url, size='orig')
+    assert mimetype == 'image/png'
+    with open(path, 'rb') as f:
+        assert f.read() == png_bytes()
+
+    with pytest.raises(CoverUnavailable):
+        cache.get(f'http://{HOST}/c.png', size='orig')
+    assert 'http://evil.test/c.png' not in cache.session.requested
+    # 失敗的網址 failure_ttl 內不會再次下載
+    with pytest.raises(CoverUnavailable):
+        cache.get(f'http://{HOST}/c.png', size='orig')
+    assert cache.session.requested.count(f'http://{HOST}/c.png') == 1
+
+
+@pytest.mark.parametrize('response', [
+    _Response(200, b'<svg onload="alert(1)"/>', {'Content-Type': 'image/svg+xml'}),
+    _Response(200, b'<html></html>', {'Content-Type': 'text/html; charset=utf-8'}),
+    _Response(200, b'data'),
+    _Response(404, b'', {'Content-Type': 'image/png'}),
+])
+def test_non_images_are_unavailable(make_cache, response):
+    cache = make_cache({f'http://{HOST}/a.png': response})
+    with pytest.raises(CoverUnavailable):
+        cache.get(f'http://{HOST}/a.png', size='orig')
+
+
+def test_api_returns_502_for_non_images(make_cache, monkeypatch):
+    from project import create_app
+
+    cache = make_cache({f'http://{HOST}/a.png': _Response(200, b'<html></html>', {'Content-Type': 'text/html'})})
+    monkeypatch.setattr(covers, 'get_cover_cache', lambda config: cache)
+    client = create_app(DevelopmentConfig).test_client()
+    response = client.get('/api/covers/', query_string={'url': f'http://{HOST}/a.png', 'size': 'orig'})
+    assert response.status_code == 502
+    response = client.get('/api/covers/', query_string={'url': 'http://evil.test/a.png'})
+    assert response.status_code == 400
+
+
+def test_same_content_is_stored_once(make_cache, tmp_path):
+    data = png_bytes()
+    cache = make_cache({f'http://{HOST}/{name}.png': image(data) for name in ('a', 'b')})
+    path_a, _, etag_a = cache.get(f'http://{HOST}/a.png', size='orig')
+    path_b, _, etag_b = cache.get(f'http://{HOST}/b.png', size='orig')
+    assert path_a == path_b and etag_a == etag_b
+    objects = [name for _, _, names in os.walk(tmp_path / 'objects') for name in names]
+    assert len(objects) == 1
+    assert len(os.listdir(tmp_path / 'sources')) == 2
+
+
+@pytest.mark.skipif(Image is None, reason="需要 Pillow")
+def test_thumbnail_fits_size(make_cache):
+    cache = make_cache({f'http://{HOST}/a.png': image(png_bytes())})
+    path, mimetype, etag = cache.get(f'http://{HOST}/a.png', size='s')
+    assert mimetype == 'image/jpeg' and etag.endswith('-s')
+    with Image.open(path) as img:
+        assert img.size[0] <= 96 and img.size[1] <= 144
+
+
+def test_account_evicts_least_recently_used(make_cache, tmp_path):
+    cache = make_cache({}, max_bytes=1000)
+    paths = []
+    for i in range(5):
+        path = tmp_path / 'objects' / f'{i:02d}' / f'{i:02d}object'
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b'x' * 200)
+        # 第 i 個檔案最後一次使用的時間是 i
+        os.utime(path, (i, i))
+        paths.append(path)
+    cache._account(0)
+    assert cache.stats()['bytes'] == 1000
+    assert all(path.exists() for path in paths)
+
+    extra = tmp_path / 'thumbs' / '99' / '99-m.jpg'
+    extra.parent.mkdir(parents=True)
+    extra.write_bytes(b'x' * 200)
+    os.utime(extra, (10, 10))
+    cache._account(200)
+    # 1200 > 1000：從最舊的開始刪，直到不超過 900
+    assert [path.exists() for path in paths] == [False, False, True, True, True]
+    assert extra.exists()
+    assert cache.stats()['bytes'] == 800
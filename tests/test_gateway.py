@@ -0,0 +1,205 @@
+import threading
+import time
+
+import pytest
+
+from project.services import gateway as gateway_module
+from project.services import ttl_cache
+from project.services.gateway import SingleFlight, UpstreamGateway
+
+
+class _InlineExecutor:
+    """把背景工作留到測試自己決定何時執行"""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args):
+        self.pending.append((fn, args))
+
+    def run(self):
+        pending, self.pending = self.pending, []
+        for fn, args in pending:
+            fn(*args)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # gateway 與 TTLCache 用的是同一個 time 模組
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = _InlineExecutor()
+    monkeypatch.setattr(gateway_module, '_revalidate_executor', executor)
+    return executor
+
+
+def test_warm_fills_cache_in_background(executor):
+    gateway = UpstreamGateway('test', ttl=60, stale_ttl=60)
+    calls = []
+
+    def slow_fetch():
+        calls.append('warm')
+        return {'books': ['A']}, 200
+
+    assert gateway.warm({'q': 'x'}, slow_fetch, scope=1)
+    # 同一個鍵正在預熱時不會重複送出
+    assert not gateway.warm({'q': 'x'}, slow_fetch, scope=1)
+    executor.run()
+    assert calls == ['warm']
+
+    def fetch():
+        raise AssertionError("快取應該命中")
+
+    assert gateway.call({'q': 'x'}, fetch, scope=1) == ({'books': ['A']}, 200)
+    assert gateway.stats()['warms'] == 1
+    # 預熱結束後同一個鍵可以再預熱
+    assert gateway.warm({'q': 'x'}, slow_fetch, scope=1)
+
+
+def test_warm_does_not_cache_errors(executor):
+    gateway = UpstreamGateway('test', ttl=60, stale_ttl=60)
+
+    def failing():
+        raise RuntimeError('boom')
+
+    gateway.warm({'q': 'x'}, failing)
+    gateway.warm({'q': 'y'}, lambda: ({'error': 'bad'}, 502))
+    executor.run()
+    assert len(gateway.cache) == 0
+    assert gateway.stats()['errors'] == 1
+    assert gateway.warm({'q': 'x'}, failing)
+
+
+def _concurrently(n, fn):
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def run():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'result'
+
+    results, errors = _concurrently(8, lambda: flight.do('key', fetch))
+    assert not errors
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 7
+    assert all(result == 'result' for result, _ in results)
+    # 結束後同一個 key 會重新執行
+    assert flight.do('key', fetch) == ('result', False)
+
+
+def test_single_flight_propagates_leader_error():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        raise ValueError('upstream down')
+
+    results, errors = _concurrently(5, lambda: flight.do('key', fetch))
+    assert not results
+    assert len(calls) == 1
+    assert len(errors) == 5
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_gateway_makes_one_upstream_call_for_identical_queries():
+    gateway = UpstreamGateway('test', ttl=60, stale_ttl=60)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'books': []}, 200
+
+    # 大小寫、全形與空白不同，正規化後是同一個查詢
+    payloads = [{'q': 'Python 入門'}, {'q': 'python  入門'}, {'q': 'ＰＹＴＨＯＮ 入門'}, {'q': ' python 入門 '}]
+    results, errors = _concurrently(4, lambda: gateway.call(payloads.pop(), fetch))
+    assert not errors
+    assert len(calls) == 1
+    assert gateway.call({'q': 'python 入門'}, fetch) == ({'books': []}, 200)
+    stats = gateway.stats()
+    assert (stats['upstream_calls'], stats['coalesced'], stats['hits']) == (1, 3, 1)
+
+
+def test_gateway_does_not_cache_errors():
+    gateway = UpstreamGateway('test', ttl=60, stale_ttl=60)
+    statuses = [502, 200]
+
+    def fetch():
+        return {}, statuses.pop(0)
+
+    assert gateway.call({'q': 'x'}, fetch)[1] == 502
+    assert gateway.call({'q': 'x'}, fetch)[1] == 200
+    assert gateway.call({'q': 'x'}, fetch)[1] == 200
+
+
+def test_gateway_serves_stale_while_revalidating(executor, clock):
+    gateway = UpstreamGateway('test', ttl=60, stale_ttl=300)
+    versions = iter(['v1', 'v2'])
+    foreground = []
+
+    def fetch():
+        foreground.append(1)
+        return next(versions), 200
+
+    revalidated = []
+
+    def revalidate():
+        revalidated.append(1)
+        return fetch()
+
+    assert gateway.call({'q': 'x'}, fetch, revalidate=revalidate) == ('v1', 200)
+    clock[0] += 61
+    # 過期但仍在 stale_ttl 內：先回舊資料，背景重新取得
+    assert gateway.call({'q': 'x'}, fetch, revalidate=revalidate) == ('v1', 200)
+    assert executor.pending and not revalidated
+    executor.run()
+    assert revalidated == [1]
+    assert gateway.call({'q': 'x'}, fetch, revalidate=revalidate) == ('v2', 200)
+    assert gateway.stats()['stale_hits'] == 1
+    # 超過 ttl + stale_ttl 就是未命中
+    clock[0] += 361
+    with pytest.raises(StopIteration):
+        gateway.call({'q': 'x'}, fetch)
+
+
+def test_gateway_invalidate_scope():
+    gateway = UpstreamGateway('test', ttl=60, stale_ttl=60)
+    gateway.call({'q': 'x'}, lambda: ('user 1', 200), scope=1)
+    gateway.call({'q': 'y'}, lambda: ('user 1', 200), scope=1)
+    gateway.call({'q': 'x'}, lambda: ('user 2', 200), scope=2)
+    gateway.call({'q': 'x'}, lambda: ('global', 200))
+    assert gateway.invalidate(1) == 2
+
+    def fetch():
+        raise AssertionError("快取應該命中")
+
+    assert gateway.call({'q': 'x'}, fetch, scope=2) == ('user 2', 200)
+    assert gateway.call({'q': 'x'}, fetch) == ('global', 200)
+    assert gateway.call({'q': 'x'}, lambda: ('fresh', 200), scope=1) == ('fresh', 200)
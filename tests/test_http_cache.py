@@ -0,0 +1,86 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify
+from werkzeug.http import parse_accept_header
+
+from project.services import compression
+from project.services.compression import choose_encoding, init_compression
+from project.services.http_cache import etag_matches, make_etag
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(COMPRESS_MIN_SIZE=100, COMPRESS_GZIP_LEVEL=6, COMPRESS_BROTLI_QUALITY=5)
+    return app
+
+
+def test_make_etag_is_stable_and_part_sensitive():
+    assert make_etag('loans', 1, 3) == make_etag('loans', 1, 3)
+    assert make_etag('loans', 1, 3) != make_etag('loans', 1, 4)
+    # 分隔字元避免 ('ab', 'c') 與 ('a', 'bc') 撞在一起
+    assert make_etag('ab', 'c') != make_etag('a', 'bc')
+
+
+@pytest.mark.parametrize('header, matches', [
+    (None, False),
+    ('"abc"', True),
+    ('"abc-gzip"', True),
+    ('"abc-br"', True),
+    ('"other", "abc-br"', True),
+    ('*', True),
+    ('"abc-deflate"', False),
+    ('W/"abc"', True),
+    ('"abcd"', False),
+])
+def test_etag_matches_encoded_variants(app, header, matches):
+    headers = {'If-None-Match': header} if header else {}
+    with app.test_request_context(headers=headers):
+        assert etag_matches('abc') is matches
+
+
+def _accept(value):
+    return parse_accept_header(value)
+
+
+def test_choose_encoding_prefers_br(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', object())
+    assert choose_encoding(_accept('gzip, deflate, br')) == 'br'
+    assert choose_encoding(_accept('gzip;q=1.0, br;q=0.5')) == 'gzip'
+    assert choose_encoding(_accept('identity')) is None
+    assert choose_encoding(_accept('*')) == 'br'
+    assert choose_encoding(_accept('br;q=0, gzip;q=0')) is None
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert choose_encoding(_accept('br')) is None
+    assert choose_encoding(_accept('br, gzip')) == 'gzip'
+
+
+def test_compression_suffixes_strong_etag(app, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    init_compression(app)
+
+    @app.route('/big')
+    def big():
+        response = jsonify(items=['x' * 50] * 10)
+        response.set_etag('abc')
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify(ok=True)
+
+    client = app.test_client()
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('abc-gzip', False)
+    assert 'Accept-Encoding' in response.vary
+    assert gzip.decompress(response.get_data()).startswith(b'{')
+
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    response = client.get('/big')
+    assert 'Content-Encoding' not in response.headers
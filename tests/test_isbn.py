@@ -0,0 +1,37 @@
+import pytest
+
+from project.services.isbn import isbn10_to_13, normalize_isbn, split_isbns, to_isbn13
+
+
+def test_isbn10_to_13():
+    assert isbn10_to_13('0306406152') == '9780306406157'
+    assert isbn10_to_13('080442957X') == '9780804429573'
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('9780306406157', '9780306406157'),
+    ('978-0-306-40615-7', '9780306406157'),
+    ('0-306-40615-2', '9780306406157'),
+    ('ISBN 978 0 306 40615 7 (平裝)', '9780306406157'),
+    ('080442957x', '9780804429573'),
+    ('ＩＳＢＮ：９７８０３０６４０６１５７', '9780306406157'),
+])
+def test_normalize_isbn(raw, expected):
+    assert normalize_isbn(raw) == expected
+
+
+@pytest.mark.parametrize('raw', [
+    None, '', '無 ISBN', '9780306406158', '0306406153', '1234567890123', '97803064061',
+])
+def test_normalize_isbn_rejects_invalid(raw):
+    assert normalize_isbn(raw) is None
+
+
+def test_to_isbn13_requires_bookland_prefix():
+    # 檢查碼正確但不是 978 / 979 開頭的 EAN-13 不是書籍
+    assert to_isbn13('4006381333931') is None
+
+
+def test_split_isbns_dedupes_in_order():
+    raw = '978-0-306-40615-7 (平裝) ; 0-306-40615-2 ; 無效 986-476-123-X ; 9789864761234'
+    assert split_isbns(raw) == ['9780306406157', '9789864761234']
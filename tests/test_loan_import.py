@@ -0,0 +1,94 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from project.services.loan_import import iter_records, validate_record
+
+
+def _records(text, fmt):
+    return list(iter_records(io.BytesIO(text.encode('utf-8')), fmt))
+
+
+def test_iter_records_csv_maps_header_to_columns():
+    # 欄位順序與 COLUMNS 不同、缺 return_date、多一個無關欄位，且有 BOM
+    text = ('\ufeffloan_date,extra,user_id,book_isbn,book_title\n'
+            '2024-01-02T10:00:00,x,1,9780306406157,書名\n'
+            '\n'
+            '2024-01-03,y,2,,另一本\n')
+    assert _records(text, 'csv') == [
+        (2, ('1', '書名', '9780306406157', '2024-01-02T10:00:00', None)),
+        (4, ('2', '另一本', '', '2024-01-03', None)),
+    ]
+
+
+def test_iter_records_csv_rejects_wrong_row_width():
+    text = ('user_id,book_title,loan_date\n'
+            '1,書名\n'
+            '2,書名,2024-01-02,多的\n'
+            '3,書名,2024-01-02\n')
+    assert _records(text, 'csv') == [
+        (2, None),
+        (3, None),
+        (4, ('3', '書名', None, '2024-01-02', None)),
+    ]
+
+
+def test_iter_records_ndjson_yields_none_for_bad_json():
+    text = ('{"user_id": 1, "book_title": "書名", "loan_date": "2024-01-02"}\n'
+            '{not json\n'
+            '\n'
+            '[1, 2]\n'
+            '{"user_id": 2, "book_isbn": 9789864761234}\n')
+    assert _records(text, 'ndjson') == [
+        (1, (1, '書名', None, '2024-01-02', None)),
+        (2, None),
+        (4, None),
+        (5, (2, None, 9789864761234, None, None)),
+    ]
+
+
+def test_iter_records_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        _records('', 'xml')
+
+
+def test_validate_record_converts_values():
+    row = validate_record(('7', ' 書名 ', '0-306-40615-2', '2024-01-02T10:00:00+08:00', '2024-01-09Z'))
+    assert row == (7, '書名', '0-306-40615-2', datetime(2024, 1, 2, 2, 0),
+                   datetime(2024, 1, 9, 0, 0), '9780306406157')
+
+
+def test_validate_record_accepts_numeric_isbn():
+    # NDJSON 裡未加引號的 ISBN 會被 json 解析成整數
+    row = validate_record((1, '書名', 9789864761234, '2024-01-02', None))
+    assert row[2] == '9789864761234'
+    assert row[5] == '9789864761234'
+
+
+def test_validate_record_keeps_invalid_isbn_without_isbn13():
+    row = validate_record((1, '書名', '無 ISBN', '2024-01-02', ''))
+    assert row[2] == '無 ISBN'
+    assert row[4] is None
+    assert row[5] is None
+
+
+@pytest.mark.parametrize('values', [
+    None,
+    ('abc', '書名', None, '2024-01-02', None),
+    (None, '書名', None, '2024-01-02', None),
+    (1, '', None, '2024-01-02', None),
+    (1, None, None, '2024-01-02', None),
+    (1, ['書名'], None, '2024-01-02', None),
+    (1, {'title': '書名'}, None, '2024-01-02', None),
+    (1, '書名', True, '2024-01-02', None),
+    (1, '書' * 256, None, '2024-01-02', None),
+    (1, '書名', '9' * 21, '2024-01-02', None),
+    (1, '書名', None, None, None),
+    (1, '書名', None, '2024/01/02', None),
+    (1, '書名', None, '2024-01-02', 'not a date'),
+    (1, '書名', None, '2024-01-02', '2024-01-01'),
+])
+def test_validate_record_rejects_bad_values(values):
+    with pytest.raises(ValueError):
+        validate_record(values)
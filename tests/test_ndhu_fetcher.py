@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from project.services.ndhu_fetcher import PAGE_SIZE, NDHUFetcher
+
+
+def results_page(count, prefix='書'):
+    items = ''.join(f'<li class="is_img"><ul><li class="reslt_item_head"><a>{prefix} {i}</a></li></ul></li>'
+                    for i in range(count))
+    return f'<html><body><ul>{items}</ul></body></html>'
+
+
+class _Response:
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """依 start 參數回傳每頁的筆數，記錄請求順序與同時進行中的請求數"""
+
+    def __init__(self, counts, latency=0.0):
+        self.counts = counts
+        self.latency = latency
+        self.requested = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['start'][0]) // PAGE_SIZE
+        with self._lock:
+            self.requested.append(page)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            if self.latency:
+                # 每頁的延遲不同，完成順序會和頁碼順序不一樣
+                time.sleep(random.uniform(0, self.latency))
+            return _Response(results_page(self.counts.get(page, 0), f'第{page + 1}頁'))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def make_fetcher():
+    fetchers = []
+
+    def make(counts, latency=0.0, max_concurrency=4, max_workers=16):
+        fetcher = NDHUFetcher('http://opac.test', max_concurrency=max_concurrency, min_delay=0,
+                              max_workers=max_workers)
+        fetcher.session = FakeSession(counts, latency)
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield make
+    for fetcher in fetchers:
+        fetcher.executor.shutdown(wait=True)
+
+
+def test_ordered_yields_in_page_order(make_fetcher):
+    fetcher = make_fetcher({})
+
+    def fn(page):
+        time.sleep(random.uniform(0, 0.02))
+        return page * 10
+
+    assert list(fetcher._ordered(fn, range(12))) == [(page, page * 10) for page in range(12)]
+
+
+def test_ordered_close_cancels_pages_not_started(make_fetcher):
+    fetcher = make_fetcher({}, max_concurrency=2, max_workers=1)
+    started = []
+
+    def fn(page):
+        started.append(page)
+        return page
+
+    ordered = fetcher._ordered(fn, range(20))
+    assert next(ordered) == (0, 0)
+    ordered.close()
+    fetcher.executor.shutdown(wait=True)
+    # 只預先送出 prefetch 頁，關閉時還沒開始的頁面被取消
+    assert len(started) <= fetcher.prefetch + 1
+    assert started == sorted(started)
+
+
+def test_iter_pages_in_order(make_fetcher):
+    fetcher = make_fetcher({page: PAGE_SIZE for page in range(6)}, latency=0.02)
+    pages = list(fetcher.iter_pages('python', 6))
+    assert [page_no for page_no, _ in pages] == [1, 2, 3, 4, 5, 6]
+    assert all(books[0]['title'] == f'第{page_no}頁 0' for page_no, books in pages)
+    assert all(books[0]['source_page'] == page_no for page_no, books in pages)
+
+
+def test_iter_pages_stops_at_empty_page(make_fetcher):
+    fetcher = make_fetcher({0: PAGE_SIZE, 1: PAGE_SIZE})
+    assert [page_no for page_no, _ in fetcher.iter_pages('python', 10)] == [1, 2]
+
+
+def test_iter_pages_stops_after_short_page(make_fetcher):
+    fetcher = make_fetcher({0: PAGE_SIZE, 1: 3, 2: PAGE_SIZE})
+    pages = list(fetcher.iter_pages('python', 10))
+    assert [(page_no, len(books)) for page_no, books in pages] == [(1, PAGE_SIZE), (2, 3)]
+
+
+def test_iter_pages_skips_pages_after_cached_last_page(make_fetcher):
+    class Cache:
+        def __init__(self):
+            self.stored = {}
+
+        def get_many(self, keyword, page_nos):
+            return {2: [{'title': '快取'}] * 4}
+
+        def set(self, keyword, page_no, books):
+            self.stored[page_no] = books
+
+    fetcher = make_fetcher({page: PAGE_SIZE for page in range(10)})
+    cache = Cache()
+    pages = list(fetcher.iter_pages('python', 10, cache=cache))
+    assert [page_no for page_no, _ in pages] == [1, 2]
+    assert fetcher.session.requested == [0]
+    assert list(cache.stored) == [1]
+
+
+def test_iter_pages_respects_concurrency_cap(make_fetcher):
+    fetcher = make_fetcher({page: PAGE_SIZE for page in range(12)}, latency=0.03, max_concurrency=2)
+    assert len(list(fetcher.iter_pages('python', 12))) == 12
+    assert fetcher.session.peak <= 2
+    assert sorted(fetcher.session.requested) == list(range(12))
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+import pytest
+
+from project.services.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    loan_date = datetime(2026, 3, 1, 12, 30, 5, 123456)
+    cursor = encode_cursor(loan_date, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (loan_date, 42)
+
+
+@pytest.mark.parametrize('cursor', [
+    '', 'not-a-cursor', '!!!!', encode_cursor(datetime(2026, 1, 1), 1)[:-3],
+    'WzFd',  # [1]
+    'eyJhIjoxLCJiIjoyfQ',  # {"a":1,"b":2}
+    'WyJ4IiwxXQ',  # ["x",1]
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from project.api import auth
+from project.extensions import db
+from project.models import User
+from project.services.password_hasher import HasherBusy, PasswordHasher, hash_rounds
+
+
+def test_full_pool_raises_hasher_busy():
+    hasher = PasswordHasher(max_workers=1, max_queue=1, rounds=4)
+    started = threading.Semaphore(0)
+    release = threading.Event()
+
+    def slow():
+        started.release()
+        release.wait(5)
+        return True
+
+    # 一個在算、一個在排隊，佇列就滿了
+    threads = [threading.Thread(target=hasher._submit, args=('check', slow)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.acquire(timeout=5)
+    try:
+        deadline = time.monotonic() + 5
+        while hasher.stats()['pending'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with pytest.raises(HasherBusy) as excinfo:
+            hasher.hash('secret')
+        assert excinfo.value.pending == 2
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+    assert hasher.stats()['pending'] == 0
+    assert hasher.check(hasher.hash('secret'), 'secret')
+
+
+def test_needs_rehash():
+    hasher = PasswordHasher(max_workers=1, max_queue=0, rounds=5)
+    password_hash = hasher.hash('secret')
+    assert hash_rounds(password_hash) == 5
+    assert not hasher.needs_rehash(password_hash)
+    assert PasswordHasher(max_workers=1, max_queue=0, rounds=6).needs_rehash(password_hash)
+    assert hash_rounds('not a bcrypt hash') is None
+
+
+class FakeHasher:
+    """check / hash 的結果由測試決定；busy 裡的操作拋出 HasherBusy"""
+
+    def __init__(self, busy=(), rounds=12):
+        self.busy = set(busy)
+        self.rounds = rounds
+        self.hashed = []
+
+    def check(self, password_hash, password):
+        if 'check' in self.busy:
+            raise HasherBusy(8)
+        return password == 'secret'
+
+    def hash(self, password):
+        if 'hash' in self.busy:
+            raise HasherBusy(8)
+        self.hashed.append(password)
+        return f'$2b${self.rounds}$new'
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+
+USERNAME = 'pytest-hasher'
+
+
+@pytest.fixture
+def client(app_context, monkeypatch):
+    def clear():
+        User.query.filter(User.username.in_([USERNAME, USERNAME + '-new'])).delete(synchronize_session=False)
+        db.session.commit()
+
+    clear()
+    db.session.add(User(username=USERNAME, email=f'{USERNAME}@example.com', password_hash='$2b$04$old'))
+    db.session.commit()
+    yield app_context.test_client()
+    clear()
+
+
+def use_hasher(monkeypatch, hasher):
+    monkeypatch.setattr(auth, 'get_password_hasher', lambda config: hasher)
+    return hasher
+
+
+def test_register_returns_503_when_busy(client, monkeypatch):
+    use_hasher(monkeypatch, FakeHasher(busy={'hash'}))
+    response = client.post('/api/auth/register', json={
+        'username': USERNAME + '-new', 'email': f'{USERNAME}-new@example.com', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert User.query.filter_by(username=USERNAME + '-new').first() is None
+
+
+def test_login_returns_503_when_busy(client, monkeypatch):
+    use_hasher(monkeypatch, FakeHasher(busy={'check'}))
+    response = client.post('/api/auth/login', json={'username': USERNAME, 'password': 'secret'})
+    assert response.status_code == 503
+
+
+def test_login_succeeds_when_rehash_is_skipped(client, monkeypatch):
+    use_hasher(monkeypatch, FakeHasher(busy={'hash'}))
+    response = client.post('/api/auth/login', json={'username': USERNAME, 'password': 'secret'})
+    assert response.status_code == 200
+    assert response.json['access_token']
+    # 沒換成新的雜湊，下次登入再換
+    assert User.query.filter_by(username=USERNAME).one().password_hash == '$2b$04$old'
+
+
+def test_login_rehashes_with_new_rounds(client, monkeypatch):
+    hasher = use_hasher(monkeypatch, FakeHasher())
+    response = client.post('/api/auth/login', json={'username': USERNAME, 'password': 'secret'})
+    assert response.status_code == 200
+    assert hasher.hashed == ['secret']
+    assert User.query.filter_by(username=USERNAME).one().password_hash == '$2b$12$new'
+
+
+def test_login_rejects_wrong_password(client, monkeypatch):
+    use_hasher(monkeypatch, FakeHasher())
+    response = client.post('/api/auth/login', json={'username': USERNAME, 'password': 'wrong'})
+    assert response.status_code == 401
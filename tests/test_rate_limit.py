@@ -0,0 +1,85 @@
+import pytest
+from flask import Flask
+
+from project.services import rate_limit
+from project.services.rate_limit import TokenBucketLimiter, request_cost
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_bucket_starts_full_and_drains(clock):
+    limiter = TokenBucketLimiter(rate=2, burst=10)
+    assert limiter.hit('user:1', 4) == (True, 0.0, 6)
+    assert limiter.hit('user:1', 6) == (True, 0.0, 0)
+    allowed, wait, remaining = limiter.hit('user:1', 1)
+    assert not allowed and wait == pytest.approx(0.5) and remaining == 0
+
+
+def test_bucket_refills_up_to_burst(clock):
+    limiter = TokenBucketLimiter(rate=2, burst=10)
+    limiter.hit('user:1', 10)
+    clock[0] += 1.5
+    assert limiter.hit('user:1', 3) == (True, 0.0, 0)
+    clock[0] += 60
+    assert limiter.hit('user:1', 1) == (True, 0.0, 9)
+
+
+def test_denied_request_does_not_consume(clock):
+    limiter = TokenBucketLimiter(rate=1, burst=5)
+    limiter.hit('user:1', 4)
+    allowed, wait, _ = limiter.hit('user:1', 3)
+    assert not allowed and wait == pytest.approx(2)
+    assert limiter.hit('user:1', 1) == (True, 0.0, 0)
+
+
+def test_cost_is_clamped_to_burst(clock):
+    limiter = TokenBucketLimiter(rate=1, burst=5)
+    assert limiter.hit('user:1', 50)[0]
+    allowed, wait, _ = limiter.hit('user:1', 50)
+    assert not allowed and wait == pytest.approx(5)
+
+
+def test_keys_are_independent(clock):
+    limiter = TokenBucketLimiter(rate=1, burst=2)
+    limiter.hit('user:1', 2)
+    assert not limiter.hit('user:1', 1)[0]
+    assert limiter.hit('ip:10.0.0.1', 1)[0]
+
+
+def test_local_only_without_redis_url():
+    assert not TokenBucketLimiter(rate=1, burst=2).shared
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(
+        RATE_LIMIT_DEFAULT_COST=1, SCRAPE_MAX_PAGES=50,
+        RATE_LIMIT_COSTS={'POST /api/recommend/': 10, 'GET /api/scraper/scrape': 3, 'POST /api/scraper/jobs': 3,
+                          'GET /api/health': 0},
+        RATE_LIMIT_PAGE_COSTS={'GET /api/scraper/scrape': 1, 'POST /api/scraper/jobs': 1},
+    )
+    for rule, method in [('/api/recommend/', 'POST'), ('/api/scraper/scrape', 'GET'), ('/api/scraper/jobs', 'POST'),
+                         ('/api/health', 'GET'), ('/api/loans/my', 'GET')]:
+        app.add_url_rule(rule, rule, lambda: '', methods=[method])
+    return app
+
+
+@pytest.mark.parametrize('method, path, kwargs, cost', [
+    ('POST', '/api/recommend/', {}, 10),
+    ('GET', '/api/loans/my', {}, 1),
+    ('GET', '/api/health', {}, 0),
+    ('GET', '/api/scraper/scrape?q=x', {}, 6),
+    ('GET', '/api/scraper/scrape?q=x&pages=20', {}, 23),
+    ('GET', '/api/scraper/scrape?q=x&pages=999', {}, 53),
+    ('GET', '/api/scraper/scrape?q=x&pages=abc', {}, 4),
+    ('POST', '/api/scraper/jobs', {'json': {'q': 'x', 'pages': 10}}, 13),
+])
+def test_request_cost(app, method, path, kwargs, cost):
+    with app.test_request_context(path, method=method, **kwargs):
+        assert request_cost(app.config) == cost
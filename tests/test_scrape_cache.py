@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from project.extensions import db
+from project.models import ScrapeCacheEntry
+from project.services import ttl_cache
+from project.services.scrape_cache import ScrapeCache, normalize_keyword
+from project.services.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=5)
+    clock[0] += 5
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    clock[0] += 55
+    assert cache.get('a', 'missing') == 'missing'
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=3, ttl=60)
+    for key in 'abc':
+        cache.set(key, key)
+    # 讀取 a 之後，最久沒用的是 b
+    assert cache.get('a') == 'a'
+    cache.set('d', 'd')
+    assert len(cache) == 3
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['a', 'c', 'd']
+
+
+def test_ttl_cache_delete_where():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(('x', 1), 1)
+    cache.set(('x', 2), 2)
+    cache.set(('y', 1), 3)
+    assert cache.delete_where(lambda key: key[0] == 'x') == 2
+    assert cache.get(('y', 1)) == 3
+
+
+@pytest.mark.parametrize('raw', ['Python 入門', '  python   入門 ', 'ＰＹＴＨＯＮ　入門', 'PYTHON\t入門'])
+def test_normalize_keyword(raw):
+    assert normalize_keyword(raw) == 'python 入門'
+
+
+KEYWORD = 'pytest 快取測試'
+
+
+@pytest.fixture
+def shared_table(app_context):
+    def clear():
+        with db.engine.begin() as conn:
+            conn.execute(delete(ScrapeCacheEntry).where(ScrapeCacheEntry.keyword == KEYWORD))
+
+    clear()
+    yield
+    clear()
+
+
+def _shared_rows():
+    with db.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(ScrapeCacheEntry)
+                            .where(ScrapeCacheEntry.keyword == KEYWORD)).scalar()
+
+
+def test_falls_through_to_shared_tier(shared_table, clock):
+    books = [{'title': '書'}]
+    ScrapeCache(maxsize=10, ttl=600, local_ttl=60).set('  PYTEST  快取測試', 1, books)
+
+    # 另一個副本：第一層是空的，從 Postgres 取得後放進第一層
+    other = ScrapeCache(maxsize=10, ttl=600, local_ttl=60)
+    assert other.get_many(KEYWORD, [1, 2]) == {1: books}
+    assert other.get_many(KEYWORD, [1]) == {1: books}
+    stats = other.stats()
+    assert (stats['shared_hits'], stats['local_hits'], stats['misses']) == (1, 1, 1)
+
+    # 第一層過期後再回到第二層
+    clock[0] += 60
+    assert other.get_many(KEYWORD, [1]) == {1: books}
+    assert other.stats()['shared_hits'] == 2
+
+
+def test_expired_shared_entries_are_misses(shared_table):
+    with db.engine.begin() as conn:
+        conn.execute(ScrapeCacheEntry.__table__.insert().values(
+            keyword=KEYWORD, page=1, books=[], expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    cache = ScrapeCache(maxsize=10, ttl=600, local_ttl=60)
+    assert cache.get_many(KEYWORD, [1]) == {}
+    assert cache.stats()['misses'] == 1
+
+
+def test_invalidate_normalizes_keyword(shared_table):
+    cache = ScrapeCache(maxsize=10, ttl=600, local_ttl=60)
+    cache.set(KEYWORD, 1, [{'title': '一'}])
+    cache.set(KEYWORD, 2, [{'title': '二'}])
+    cache.set('另一個關鍵字', 1, [])
+    assert _shared_rows() == 2
+
+    assert cache.invalidate('ＰＹＴＥＳＴ　 快取測試 ') == 2
+    assert _shared_rows() == 0
+    assert cache.get_many(KEYWORD, [1, 2]) == {}
+    assert len(cache.local) == 1
+    cache.invalidate('另一個關鍵字')
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from project.extensions import db
+from project.models import ScrapeJob, ScrapeJobPage
+from project.services.scrape_jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, claim_job, job_pages, submit_job
+
+PREFIX = 'pytest 佇列'
+
+
+@pytest.fixture
+def jobs(app_context):
+    def clear():
+        db.session.execute(delete(ScrapeJob).where(ScrapeJob.keyword.startswith(PREFIX)))
+        db.session.commit()
+
+    clear()
+    yield
+    clear()
+
+
+def add_job(suffix, created_at, status=QUEUED, attempts=0, heartbeat_at=None):
+    # created_at 在很久以前，領取時會排在資料庫裡其他工作的前面
+    job = ScrapeJob(id=f'pytest{suffix}'.ljust(32, '0'), keyword=f'{PREFIX} {suffix}', query=f'{PREFIX} {suffix}',
+                    pages=3, status=status, attempts=attempts, created_at=created_at, heartbeat_at=heartbeat_at)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_submit_job_dedupes_active_jobs(jobs):
+    job, created = submit_job('Pytest 佇列  A', 3)
+    assert created and job.keyword == f'{PREFIX} a' and job.query == 'Pytest 佇列  A'
+    again, created = submit_job(' ＰＹＴＥＳＴ 佇列 a ', 3)
+    assert not created and again.id == job.id
+
+    # 頁數不同是不同的工作
+    other, created = submit_job('pytest 佇列 a', 5)
+    assert created and other.id != job.id
+
+    # 執行中的工作也會被重用，完成之後才會建立新的
+    job.status = RUNNING
+    db.session.commit()
+    assert submit_job('pytest 佇列 a', 3)[0].id == job.id
+    job.status = SUCCEEDED
+    db.session.commit()
+    new, created = submit_job('pytest 佇列 a', 3)
+    assert created and new.id != job.id
+
+
+def test_claim_job_fails_jobs_at_max_attempts(jobs):
+    base = datetime(2001, 1, 1)
+    exhausted = add_job('exhausted', base, attempts=3)
+    queued = add_job('queued', base + timedelta(days=1))
+    stale = add_job('stale', base + timedelta(days=2), status=RUNNING, attempts=1,
+                    heartbeat_at=datetime.utcnow() - timedelta(seconds=600))
+    alive = add_job('alive', base + timedelta(days=3), status=RUNNING, attempts=1,
+                    heartbeat_at=datetime.utcnow())
+
+    assert claim_job(stale_after=300, max_attempts=3) == queued
+    job = db.session.get(ScrapeJob, exhausted)
+    assert job.status == FAILED and job.finished_at is not None
+    assert '3' in job.error
+    job = db.session.get(ScrapeJob, queued)
+    assert (job.status, job.attempts) == (RUNNING, 1)
+
+    # 沒有進度的執行中工作會被重新領取，還有心跳的不會
+    assert claim_job(stale_after=300, max_attempts=3) == stale
+    assert db.session.get(ScrapeJob, stale).attempts == 2
+    assert claim_job(stale_after=300, max_attempts=3) != alive
+    assert db.session.get(ScrapeJob, alive).attempts == 1
+
+
+def test_job_pages_after_cursor(jobs):
+    job_id = add_job('pages', datetime.utcnow(), status=SUCCEEDED)
+    for page in range(1, 6):
+        db.session.add(ScrapeJobPage(job_id=job_id, page=page, books=[{'title': f'第{page}頁'}]))
+    db.session.commit()
+
+    assert [page for page, _ in job_pages(job_id, limit=2)] == [1, 2]
+    assert [page for page, _ in job_pages(job_id, after=2, limit=2)] == [3, 4]
+    rows = job_pages(job_id, after=4, limit=2)
+    assert rows == [(5, [{'title': '第5頁'}])]
+    assert job_pages(job_id, after=5) == []
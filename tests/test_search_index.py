@@ -0,0 +1,39 @@
+import pytest
+
+from project.services.search_index import build_tsquery, isbn_query, tokenize
+
+
+def test_tokenize_cjk_bigrams():
+    assert tokenize('資料結構') == ['資料', '料結', '結構', '資', '料', '結', '構']
+    assert tokenize('資料結構', for_query=True) == ['資料', '料結', '結構']
+    assert tokenize('資', for_query=True) == ['資']
+
+
+def test_tokenize_normalizes_width_and_case():
+    assert tokenize('ＰＹＴＨＯＮ 3') == ['python', '3']
+
+
+def test_build_tsquery_prefix_on_last_word():
+    assert build_tsquery('python prog') == "'python' & 'prog':*"
+    assert build_tsquery('python prog ') == "'python' & 'prog'"
+    assert build_tsquery('Python 程式') == "'python' & '程式'"
+
+
+def test_build_tsquery_dedupes_and_skips_punctuation():
+    assert build_tsquery('C C++') == "'c':*"
+    assert build_tsquery('!!!') is None
+
+
+@pytest.mark.parametrize('query', [
+    '9780306406157', '978-0-306-40615-7', '0306406152', '0-306-40615-2',
+    ' ISBN 978 0 306 40615 7 ', 'isbn-10: 0306406152', '９７８０３０６４０６１５７',
+])
+def test_isbn_query_normalizes(query):
+    assert isbn_query(query) == '9780306406157'
+
+
+@pytest.mark.parametrize('query', [
+    '9780306406158', '978', 'Python 9780306406157', 'C語言', '',
+])
+def test_isbn_query_rejects_non_isbn(query):
+    assert isbn_query(query) is None
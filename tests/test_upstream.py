@@ -0,0 +1,111 @@
+import pytest
+
+from project.services import upstream
+from project.services.upstream import CircuitBreaker, UpstreamClient
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(upstream.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+
+
+def test_half_open_probe_result(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    clock[0] += 30
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_lost_probe_is_replaced_after_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    # 試探請求被中止，沒有回報結果
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+
+
+def test_breakers_are_per_path():
+    client = UpstreamClient(1, 10, 0, 0.1, 5, 30, 4)
+    recommend, recommend_breaker = client.breaker_for('http://n8n:5678/webhook/recommend')
+    search, search_breaker = client.breaker_for('http://n8n:5678/webhook/search?x=1')
+    assert recommend == 'n8n:5678/webhook/recommend'
+    assert search == 'n8n:5678/webhook/search'
+    assert recommend_breaker is not search_breaker
+    assert client.breaker_for('http://n8n:5678/webhook/recommend')[1] is recommend_breaker
+
+
+@pytest.mark.parametrize('timeout, shortened', [
+    ((1, 3), True), (3, True), ((1, 10), False), ((1, 30), False), (None, False),
+])
+def test_caller_shortened_timeout(timeout, shortened):
+    client = UpstreamClient(1, 10, 0, 0.1, 5, 30, 4)
+    assert client._shortened(timeout) is shortened
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_5xx_response_is_closed_before_retry(monkeypatch):
+    client = UpstreamClient(1, 10, 2, 0.1, 5, 30, 4)
+    monkeypatch.setattr(client, '_sleep_before_retry', lambda attempt: None)
+    responses = [_Response(502), _Response(200)]
+    sent = []
+
+    def fake_request(method, url, **kwargs):
+        sent.append(url)
+        return responses[len(sent) - 1]
+
+    monkeypatch.setattr(client.session, 'request', fake_request)
+    result = client.request('GET', 'http://n8n:5678/webhook/search', idempotent=True)
+    assert result is responses[1]
+    assert len(sent) == 2
+    assert responses[0].closed
+    assert not responses[1].closed